@@ -1,5 +1,5 @@
+import io
 import logging
-import ollama
 import sys
 import os
 from dotenv import load_dotenv
@@ -7,18 +7,53 @@ from dotenv import load_dotenv
 load_dotenv()
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from data_processing import DataHandler
 from mapping import productline_mapping
+from streaming import MappedStreamWriter
+from llm_backends import ollama_chat, get_backend
+from pre_analysis import format_pre_analysis
+from validation import fast_validate
+from prompt_serialization import serialize_block, estimate_tokens
+from chunking import block_budget, row_budget, split_frame, map_chunks, reduce_texts
+from usage_ledger import get_ledger
+from model_router import route_model
+from templates import is_trivial, template_summary
+from fingerprints import config_fingerprint, frame_fingerprint
+from job_journal import get_journal
+from summary_store import get_store, default_period
+from scheduler import get_deadline
+from semantic_cache import get_cache
+from structured_output import structured_output, json_options, parse_summary, JSON_INSTRUCTIONS
 
-#file_path = os.getenv("ORDER_INTAKE_PATH")
-file_path = os.getenv("NET_SALES_PATH")
-
-
-
-dataset = DataHandler(file_path)
 
 llama_8b = 'llama3.1:8b'
 
+# Set STREAM_RESPONSES=1 to consume tokens as they are produced and write the summary progressively
+stream_responses = os.getenv("STREAM_RESPONSES", "0") == "1"
+# MODEL_ROUTING=1 picks the model per stage from input size and recorded latency (see model_router)
+# PIPELINE_MODE=computed replaces the natural_language and analysis_of_data LLM calls with a pandas pre-analysis
+pipeline_mode = os.getenv("PIPELINE_MODE", "llm")
+# VALIDATION_MODE=llm always sends the summary to the LLM validator
+validation_mode = os.getenv("VALIDATION_MODE", "fast")
+# PROMPT_FORMAT=compact|bucket serializes data blocks without padding and with rounded values, PROMPT_PIVOT=1 as a Product Line x Region pivot
+prompt_format = os.getenv("PROMPT_FORMAT", "table")
+prompt_pivot = os.getenv("PROMPT_PIVOT", "0") == "1"
+# TEMPLATE_FAST_PATH=0 sends trivial areas through the LLM chain as well
+template_fast_path = os.getenv("TEMPLATE_FAST_PATH", "1") == "1"
+# SUMMARY_FORMAT=json asks for the summary as JSON with the product lines, regions and direction of every sentence
+summary_json = structured_output()
+# Finished stages are kept in the job journal, a rerun continues where the last one stopped (RESUME=0 starts over).
+# The journal is opened by the first area; results of areas whose input did not change are only
+# reused under the same prompts, models and settings
+journal_config = config_fingerprint(
+    __file__, pipeline_mode=pipeline_mode, validation_mode=validation_mode, prompt_format=prompt_format,
+    prompt_pivot=prompt_pivot, template_fast_path=template_fast_path, summary_json=summary_json,
+    backend=os.getenv("LLM_BACKEND"), model_routing=os.getenv("MODEL_ROUTING"),
+    routing_rules=os.getenv("MODEL_ROUTING_RULES"), stage_budgets=os.getenv("STAGE_BUDGETS"),
+    stage_budgets_path=os.getenv("STAGE_BUDGETS_PATH")
+)
+# Period the summaries are stored under (REPORT_PERIOD, default the current month)
+report_period = default_period()
+
 
 logging.basicConfig(
     level=logging.INFO,  # Set to DEBUG for more detailed output
@@ -40,7 +75,8 @@ def natural_language(analysis):
     """Summary in natural language of the given"""
 
     analysis = analysis.reset_index(drop=True)
-    string_analysis = analysis.to_string(index=False)
+    string_analysis = serialize_block(analysis, prompt_format, pivot=prompt_pivot)
+    logging.info('----- Prompt block ----- %s format, ~%s tokens', prompt_format, estimate_tokens(string_analysis))
 
     print(string_analysis)
     prompt = f"""
@@ -71,14 +107,16 @@ def natural_language(analysis):
 """
 
 
-    response3 = ollama.chat(model=llama_8b, 
+    final_summary, _ = ollama_chat(model=route_model('natural_language', prompt, rows=len(analysis)), 
                             messages=[
                                 {"role": "system", "content": natural_language_interpreter},
                                 {"role": "user", "content": prompt}],
-                            options={"temperature":0}
+                            options={"temperature": 0},
+                            stream=stream_responses,
+                            stage='natural_language',
+                            rows=len(analysis)
                             )
 
-    final_summary = response3['message']['content'].strip()
     return final_summary
 
 
@@ -116,18 +154,19 @@ def analysis_of_data(natural_language_report):
         - "[Product Line] saw a minor decrease across all [Region(s)]
 """
 
-    response3 = ollama.chat(model=llama_8b, 
+    final_summary, _ = ollama_chat(model=route_model('analysis_of_data', prompt), 
 
                             messages=[{"role": "system", "content": analysis_role},
                                 {"role": "user", "content": prompt}],
-                            options={"temperature":0}
+                            options={"temperature": 0},
+                            stream=stream_responses,
+                            stage='analysis_of_data'
                             )
 
-    final_summary = response3['message']['content'].strip()
     return final_summary
 
 
-def summary(analysis):
+def summary(analysis, on_token=None):
     """Summarizing analysis given by the previous LLM call"""
 
     prompt = f"""
@@ -162,21 +201,55 @@ def summary(analysis):
         
     """
 
-    response3 = ollama.chat(model=llama_8b,
+    options = {"temperature": 0}
+    if summary_json:
+        prompt += JSON_INSTRUCTIONS
+        options = json_options(options)
+
+    model = route_model('summary', prompt)
+    final_summary, _ = ollama_chat(model=model,
                             messages=[{"role": "system", "content":summary_role},
                                     {"role": "user", "content": prompt}],
-                            options={"temperature":0}
+                            options=options,
+                            stream=stream_responses, on_token=None if summary_json else on_token,
+                            stage='summary'
                             )
 
-    final_summary = response3['message']['content'].strip()
-    return final_summary
+    if not summary_json:
+        return final_summary, model, None
+    # The streamed tokens are JSON, the report gets the sentences once they are parsed
+    final_summary, sentences = parse_summary(final_summary)
+    if on_token is not None:
+        on_token(final_summary)
+    return final_summary, model, sentences
 
 
 # Sanity check
 
-def validate_summary(summary, raw_data):
+def validate_summary(summary, raw_data, part=False, sentences=None):
     """Ensure summary does not introduce errors or hallucinations."""
-    raw_data_string = raw_data.to_string()
+    if validation_mode == "fast" and not part:
+        # Deterministic check first, the LLM validator is only asked when it cannot confirm the summary
+        fast_result = fast_validate(summary, raw_data, sentences=sentences)
+        if not fast_result["needs_llm"]:
+            return fast_result["report"]
+        logging.info('----- Fast validation escalated to LLM -----\n%s', fast_result["report"])
+
+    def render(frame):
+        if prompt_format == "table":
+            return frame.to_string()
+        return serialize_block(frame, prompt_format, pivot=prompt_pivot)
+
+    raw_data_string = render(raw_data)
+    budget = block_budget('validate_summary')
+    if not part and estimate_tokens(raw_data_string) > budget:
+        # Too large for one prompt, the chunks of the data are checked side by side
+        chunks = split_frame(raw_data, render, budget)
+        logging.info('----- Validating %s rows in %s chunks -----', len(raw_data), len(chunks))
+        return "\n".join(map_chunks(chunks, lambda index, chunk: validate_summary(summary, chunk, part=True)))
+    if part:
+        raw_data_string = "(Part of the data, only check the statements about these product lines)\n" + raw_data_string
+    logging.info('----- Prompt block ----- %s format, ~%s tokens', prompt_format, estimate_tokens(raw_data_string))
     
     prompt = f"""
         ### **Context:**
@@ -201,72 +274,192 @@ def validate_summary(summary, raw_data):
         - "Corrected Summary:......
     """
     
-    response = ollama.chat(
-        model=llama_8b,
+    validation_report, _ = ollama_chat(
+        model=route_model('validate_summary', prompt, rows=len(raw_data)),
         messages=[{"role": "system", "content": validator},
                   {"role": "user", "content": prompt}],
-        options={"temperature": 0}
+        options={"temperature": 0},
+        stream=stream_responses,
+        stage='validate_summary'
     )
-    
-    return response['message']['content'].strip()
 
+    return validation_report
 
 
-def all_prompts_together(dataset, business_area):
-    # Preprocess data
-    data = dataset.drivers_in_business_area_region_relative(business_area)
 
-    # Step 1: Natural language generation
-    natural_language_result = natural_language(data)
-    logging.info('----- Natural Language -----\n%s', natural_language_result)
+def data_block(frame):
+    """Data block of the natural_language prompt."""
+    return serialize_block(frame.reset_index(drop=True), prompt_format, pivot=prompt_pivot)
+
+
+def chunked_analysis(data, step):
+    """
+    Steps 1 and 2 for an area whose data block does not fit in the context window.
+    The data is split by product line (and region), the chunks are analysed side by
+    side and their analyses merged until they fit in the summary prompt.
+    """
+    budget = block_budget('natural_language')
+    chunks = split_frame(data, data_block, budget, row_tokens=row_budget('natural_language'))
+    logging.info('----- %s rows split in %s chunks of ~%s tokens -----', len(data), len(chunks), budget)
 
-    # Step 2: Analysis
-    analysis_result = analysis_of_data(natural_language_result)
-    logging.info('----- Analysis -----\n%s', analysis_result)
+    def analyse(index, chunk):
+        # Chunks whose rows did not change keep their analysis
+        fingerprint = frame_fingerprint(chunk)
+        chunk_language = step(f'natural_language:{index}', lambda: natural_language(chunk), fingerprint)
+        return step(f'analysis_of_data:{index}', lambda: analysis_of_data(chunk_language), fingerprint)
 
-    # Step 3: Summary
-    summary_result = summary(analysis_result)
-    logging.info('----- Summary -----\n%s', summary_result)
+    analyses = map_chunks(chunks, analyse)
+    return reduce_texts(analyses, lambda index, group: analysis_of_data("\n\n".join(group)), block_budget('summary'))
+
+
+def all_prompts_together(dataset, business_area, on_token=None):
+    get_ledger().set_area(business_area)
+    # Results of finished stages, and of areas whose input did not change, come from the journal
+    journal = get_journal("lifescience", journal_config)
+    unit = (dataset.source_fingerprint, business_area, None)
+
+    # Preprocess data
+    data = dataset.drivers_in_business_area_region_relative(business_area)
+    input_fingerprint = frame_fingerprint(data)
+
+    def step(stage, compute, fingerprint=None):
+        return journal.step(*unit, stage, compute, fingerprint=fingerprint or input_fingerprint)
+
+    # Summarised before with this input: the summary comes from the journal, steps 1 and 2 are skipped
+    resumed = journal.reusable(*unit, 'summary', input_fingerprint)
+
+    # Past the run deadline (RUN_DEADLINE), areas without a finished summary get the template as well
+    deadline_passed = get_deadline().expired() and not resumed
+    if deadline_passed:
+        logging.warning('----- Run deadline passed, template summary for %s -----', business_area)
+
+    use_template = deadline_passed or (template_fast_path and is_trivial(data))
+    # An area with the same qualitative shape as one summarised before reuses that summary (SEMANTIC_CACHE=0 disables)
+    cached = None
+    if not use_template and not resumed:
+        cached = get_cache().get("lifescience", 'net_sales', data)
+
+    # Fields of a summary written as JSON, checked directly by the fast validation
+    sentences = None
+    if use_template:
+        # Small or one-directional areas are written from the house-style template without any LLM call
+        summary_result, summary_model = template_summary(data), "template"
+        logging.info('----- Template Summary -----\n%s', summary_result)
+        if on_token is not None:
+            on_token(summary_result)
+    elif cached is not None:
+        summary_result, summary_model = step('summary', lambda: cached)
+        logging.info('----- Summary reused from semantic cache -----\n%s', summary_result)
+        if on_token is not None:
+            on_token(summary_result)
+    else:
+        if resumed:
+            # Only the summary stage reads the analysis, and its result is journaled
+            analysis_result = None
+        elif pipeline_mode == "computed":
+            # Steps 1 and 2 are derived in pandas, only summary and validation call the LLM
+            analysis_result = format_pre_analysis(dataset.computed_pre_analysis(business_area))
+            logging.info('----- Computed Pre-Analysis -----\n%s', analysis_result)
+        elif estimate_tokens(data_block(data)) > block_budget('natural_language', rows=len(data)):
+            # Too large for the context window, summarised chunk by chunk and merged
+            analysis_result = chunked_analysis(data, step)
+            logging.info('----- Analysis -----\n%s', analysis_result)
+        else:
+            # Step 1: Natural language generation
+            natural_language_result = step('natural_language', lambda: natural_language(data))
+            logging.info('----- Natural Language -----\n%s', natural_language_result)
+
+            # Step 2: Analysis
+            analysis_result = step('analysis_of_data', lambda: analysis_of_data(natural_language_result))
+            logging.info('----- Analysis -----\n%s', analysis_result)
+
+        # Step 3: Summary
+        result = step('summary', lambda: summary(analysis_result, on_token=on_token))
+        # Summaries journaled before the model was stored are plain text, and before SUMMARY_FORMAT have no sentence fields
+        if isinstance(result, str):
+            result = (result, None)
+        summary_result, summary_model, *fields = result
+        sentences = fields[0] if fields else None
+        if resumed and on_token is not None:
+            on_token(summary_result)
+        logging.info('----- Summary -----\n%s', summary_result)
+        get_cache().put("lifescience", 'net_sales', data, summary_result, summary_model)
 
     # Step 4: Sanity Check
-    sanity_check = validate_summary(summary_result, data)
+    if deadline_passed:
+        # Not journaled, so the next run still summarises the area with the LLM
+        sanity_check = fast_validate(summary_result, data)["report"]
+    else:
+        sanity_check = step('validate_summary', lambda: validate_summary(summary_result, data, sentences=sentences))
     logging.info('----- Sanity Check -----\n%s', sanity_check)
 
-    return summary_result, sanity_check
+    return summary_result, sanity_check, summary_model
+
+
 
+def export_report(period=None):
+    """Renders LISC_test.txt from the summary store, reruns replace the report instead of appending it."""
+    get_store().export_txt("LISC_test.txt", render_report, report="lifescience", period=period or report_period)
 
 
 def compilation(dataset, business_area):
-    # Loop through the product area (only LISC here)
-    with open("LISC_test.txt", "a", encoding="utf-8") as file:
-        print(dataset)
-        answer, sanity_check = all_prompts_together(dataset, business_area)
-        answer_mapped = productline_mapping(answer)
-        sanity_check_mapped = productline_mapping(sanity_check)
+    # Load the model once before the first stage so load time is not counted as generation time
+    get_backend("ollama").warm_up(llama_8b)
+
+    # Only LISC here
+    print(dataset)
+
+    if stream_responses:
+        # The summary is written token by token while it is generated, the export below replaces it
+        with open("LISC_test.txt", "a", encoding="utf-8") as file:
+            write_structured_header(file, product_area="LISC")
+            writer = MappedStreamWriter(file)
+            answer, sanity_check, model = all_prompts_together(dataset, business_area, on_token=writer)
+            writer.close()
+    else:
+        answer, sanity_check, model = all_prompts_together(dataset, business_area)
+
+    get_store().upsert("lifescience", dataset.file_path, dataset.period or report_period, business_area, "LISC", "net_sales",
+                       model, answer, sanity_check, dataset.source_fingerprint)
+    export_report(dataset.period)
+
+    print("Response for LISC saved to LISC_test.txt!")
+
+    get_ledger().log_run_summary()
+    return
 
+
+def render_report(summaries):
+    """Text report of the stored summaries in the structured output format."""
+    file = io.StringIO()
+    for _, row in summaries.iterrows():
         # Use the improved output format
         write_structured_output(
             file=file,
-            product_area="LISC",
-            summary=answer_mapped,
-            validation=sanity_check_mapped
+            product_area=row["Product Area"],
+            summary=productline_mapping(row["Summary"]),
+            validation=productline_mapping(row["Validation"] or "")
         )
+    return file.getvalue()
 
-        print("Response for LISC saved to LISC_test.txt!")
-
-    return
 
+def write_structured_output(file, product_area, summary, validation):
+    write_structured_header(file, product_area)
+    file.write(summary.strip() + "\n\n")
+    write_structured_validation(file, validation)
 
 
-def write_structured_output(file, product_area, summary, validation):
+def write_structured_header(file, product_area):
     file.write(f"\n{'=' * 60}\n")
     file.write(f"Product Area: {product_area}\n")
     file.write(f"{'=' * 60}\n\n")
 
     file.write("🔍 Summary of Key Trends:\n")
     file.write("-" * 60 + "\n")
-    file.write(summary.strip() + "\n\n")
+    file.flush()
 
+
+def write_structured_validation(file, validation):
     file.write("✅ Validation Report:\n")
     file.write("-" * 60 + "\n")
     file.write(validation.strip() + "\n")
@@ -274,4 +467,8 @@ def write_structured_output(file, product_area, summary, validation):
 
 
 
-compilation(dataset, 'LISC')
\ No newline at end of file
+if __name__ == "__main__":
+    from data_processing import DataHandler
+
+    dataset = DataHandler(os.getenv("NET_SALES_PATH"))
+    compilation(dataset, 'LISC')
@@ -1,19 +1,41 @@
 import sys
 import os
-import pandas as pd
 import re
 from dotenv import load_dotenv
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from data_processing import DataHandler
 from mapping import map_productlines_in_dataframe, productline_mapping
-from openai import OpenAI
+from llm_backends import openai_chat
+from prompt_serialization import serialize_block
+from usage_ledger import get_ledger
+from job_journal import get_journal
+from fingerprints import config_fingerprint, frame_fingerprint
+from summary_store import get_store, default_period
+from templates import template_summary
+from scheduler import get_deadline, impact_order
+from semantic_cache import get_cache
 
 #LESS STRICT SUMMARY
 
+# API_KEY is read by the OpenAI backend when the first summary is requested
 load_dotenv()
-api_key = os.getenv("API_KEY")
-client = OpenAI(api_key=api_key)
+
+# Set STREAM_RESPONSES=1 to print tokens as they are produced and record time-to-first-token
+stream_responses = os.getenv("STREAM_RESPONSES", "0") == "1"
+# PROMPT_FORMAT=compact|bucket serializes data blocks without padding and with rounded values, PROMPT_PIVOT=1 as a Product Line x Region pivot
+prompt_format = os.getenv("PROMPT_FORMAT", "table")
+prompt_pivot = os.getenv("PROMPT_PIVOT", "0") == "1"
+# Finished areas are kept in the job journal, a rerun continues where the last one stopped (RESUME=0 starts over).
+# The journal is opened by the first area; results of areas whose input did not change are only
+# reused under the same prompts, models and settings
+journal_config = config_fingerprint(
+    __file__, prompt_format=prompt_format, prompt_pivot=prompt_pivot, backend=os.getenv("LLM_BACKEND")
+)
+# Period the summaries are stored under (REPORT_PERIOD, default the current month)
+report_period = default_period()
+# transform_data rescales [Difference] randomly on every run, so change detection only
+# looks at the scale-free part of an area: its rows and their relative contributions
+SUMMARY_INPUT_COLUMNS = ["Product Line", "Region", "Product Area Contribution %", "Business Area Contribution %"]
 
 
 SYSTEM_PROMPT = """
@@ -64,34 +86,79 @@ Data:
 """
 }
 
-def summarize_data_block(data_block: str, summary_type: str, overall_change: str) -> dict:
+def summarize_data_block(data_block: str, summary_type: str, overall_change: str, stream=None) -> dict:
     user_prompt = PROMPT_TEMPLATES[summary_type].format(
     data_block=data_block.strip(),
     overall_change=overall_change
 )
 
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT.strip()},
-            {"role": "user", "content": user_prompt.strip()}
-        ],
+    if stream is None:
+        stream = stream_responses
+
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT.strip()},
+        {"role": "user", "content": user_prompt.strip()}
+    ]
+
+    # Tokens are echoed as they arrive so long runs show progress
+    content, metrics = openai_chat(
+        "gpt-4o",
+        messages,
+        stream=stream,
+        on_token=lambda token: print(token, end="", flush=True),
+        stage=summary_type,
         temperature=0.2,
         max_tokens=150
     )
+    if stream:
+        print()
 
-    content = response.choices[0].message.content
-    usage = response.usage
-    cost = (usage.prompt_tokens / 1000 * 0.005) + (usage.completion_tokens / 1000 * 0.015)
+    cost = get_ledger().cost("gpt-4o", metrics["prompt_tokens"], metrics["completion_tokens"])
 
     return {
         "summary": content,
-        "input_tokens": usage.prompt_tokens,
-        "output_tokens": usage.completion_tokens,
-        "total_tokens": usage.total_tokens,
-        "estimated_cost": round(cost, 4)
+        "input_tokens": metrics["prompt_tokens"],
+        "output_tokens": metrics["completion_tokens"],
+        "total_tokens": metrics["prompt_tokens"] + metrics["completion_tokens"],
+        "estimated_cost": round(cost, 4),
+        "model": "gpt-4o",
+        "metrics": metrics
+    }
+
+def template_result(df):
+    """House-style template summary of an area, used for the areas left when the run deadline has passed."""
+    return {
+        "summary": template_summary(df),
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "total_tokens": 0,
+        "estimated_cost": 0.0,
+        "model": "template",
+        "metrics": None
     }
 
+
+def summarize_frame(df, summary_type):
+    # An area with the same qualitative shape as one summarised before reuses that summary (SEMANTIC_CACHE=0 disables)
+    cached = get_cache().get("free_summary_writer", summary_type, df)
+    if cached is not None:
+        print("Summary reused from the semantic cache")
+        return {
+            "summary": cached[0],
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "total_tokens": 0,
+            "estimated_cost": 0.0,
+            "model": cached[1],
+            "metrics": None
+        }
+
+    block_str = serialize_block(df, prompt_format, pivot=prompt_pivot)
+    overall_change = df['Total Difference'].sum()
+    result = summarize_data_block(block_str, summary_type, overall_change)
+    get_cache().put("free_summary_writer", summary_type, df, result["summary"], result["model"])
+    return result
+
 def format_summary(result, business_area, product_area, summary_type):
     return {
         "Business Area": business_area,
@@ -101,9 +168,29 @@ def format_summary(result, business_area, product_area, summary_type):
         "Output Tokens": result["output_tokens"],
         "Total Tokens": result["total_tokens"],
         "Estimated Cost ($)": result["estimated_cost"],
-        "Summary Type": summary_type
+        "Summary Type": summary_type,
+        "Model": result["model"]
     }
 
+def summarize_area(dataset, business_area, product_area, df, summary_type):
+    """Journaled summary of one area. Past the run deadline, an area without one gets the template summary."""
+    get_ledger().set_area(business_area, product_area)
+    unit = (dataset.source_fingerprint, business_area, product_area, summary_type)
+    fingerprint = frame_fingerprint(df, SUMMARY_INPUT_COLUMNS)
+    journal = get_journal("free_summary_writer", journal_config)
+
+    if get_deadline().expired() and not journal.reusable(*unit, fingerprint):
+        # Not journaled, so the next run still summarises the area with GPT-4o
+        print(f"Run deadline passed, template summary for {product_area or business_area}")
+        return format_summary(template_result(df), business_area, product_area or "All", summary_type)
+
+    return journal.step(
+        *unit,
+        lambda: format_summary(summarize_frame(df, summary_type), business_area, product_area or "All", summary_type),
+        fingerprint=fingerprint
+    )
+
+
 def data_summarizer(dataset, business_area, product_area_list, summary_type):
     dataset.transform_data(['[Difference]'])
     summaries = []
@@ -112,20 +199,15 @@ def data_summarizer(dataset, business_area, product_area_list, summary_type):
         df = dataset.drivers_in_business_area_region_relative(business_area)
         map_productlines_in_dataframe(df, 'Product Line')
         if not df.empty:
-            block_str = df.to_string(index=False)
-            overall_change = df['Total Difference'].sum()
-            result = summarize_data_block(block_str, summary_type, overall_change)
-            summaries.append(format_summary(result, business_area, "All", summary_type))
+            summaries.append(summarize_area(dataset, business_area, None, df, summary_type))
     else:
-        for pa in product_area_list:
+        # Biggest movers first, so they are summarised by GPT-4o before a run deadline
+        for pa in impact_order(dataset, business_area, product_area_list):
             df = dataset.drivers_in_product_area_region_relative(business_area, pa)
             map_productlines_in_dataframe(df, 'Product Line')
             if df.empty:
                 continue
-            block_str = df.to_string(index=False)
-            overall_change = df['Total Difference'].sum()
-            result = summarize_data_block(block_str, summary_type, overall_change)
-            summaries.append(format_summary(result, business_area, pa, summary_type))
+            summaries.append(summarize_area(dataset, business_area, pa, df, summary_type))
 
     return summaries
 
@@ -146,14 +228,40 @@ def format_summaries_for_txt(summaries):
         output.append(section)
     return "\n\n".join(output)
 
-def create_summary(file_path, summary_type):
-    dataset = DataHandler(file_path)
+CSV_COLUMNS = ["Business Area", "Product Area", "Summary", "Input Tokens", "Output Tokens", "Total Tokens",
+               "Estimated Cost ($)", "Summary Type"]
 
-    business_area_product_map = {
-        "ACTH": ['ACAT', 'ACCA', 'ACCC', 'ACCP', 'ACCP', 'ACG3', 'ACTC', 'ACVI'],
-        "SWIC": ['ARJO', 'SWA3', 'SWIN', 'SWIW', 'SWWP'],
-        "LISC": None
-    }
+def render_txt(summaries):
+    output = []
+    for summary_type, group in summaries.groupby("Summary Type", sort=False):
+        output.append(f"\n=== {summary_type.upper()} SUMMARY ===\n\n")
+        output.append(format_summaries_for_txt(group.to_dict("records")) + "\n")
+    return "".join(output)
+
+def render_csv(summaries):
+    summaries = summaries.assign(**{"Product Area": summaries["Product Area"].map(productline_mapping)})
+    return summaries[CSV_COLUMNS]
+
+def export_report(period=None):
+    """
+    Renders summaries_free.txt and summaries_free.csv from the summary store, so a rerun replaces
+    the summaries of the period instead of appending duplicates.
+    """
+    get_store().export_txt("summaries_free.txt", render_txt, report="free_summary_writer", period=period or report_period)
+    get_store().export_csv("summaries_free.csv", render_csv, report="free_summary_writer", period=period or report_period)
+
+def create_summary(file_path, summary_type, dataset=None, business_area_product_map=None):
+    from data_processing import DataHandler
+
+    # transform_data rescales the data in place, so a dataset shared by the caller is anonymized on a copy
+    dataset = DataHandler(file_path) if dataset is None else dataset.copy()
+
+    if business_area_product_map is None:
+        business_area_product_map = {
+            "ACTH": ['ACAT', 'ACCA', 'ACCC', 'ACCP', 'ACCP', 'ACG3', 'ACTC', 'ACVI'],
+            "SWIC": ['ARJO', 'SWA3', 'SWIN', 'SWIW', 'SWWP'],
+            "LISC": None
+        }
 
     all_summaries = []
 
@@ -162,27 +270,21 @@ def create_summary(file_path, summary_type):
         summaries = data_summarizer(dataset, business_area, product_list, summary_type)
         all_summaries.extend(summaries)
 
-    formatted_text = format_summaries_for_txt(all_summaries)
-
-    txt_path = "summaries_free.txt"
-    csv_path = "summaries_free.csv"
-
-    with open(txt_path, "a", encoding="utf-8") as f:
-        f.write(f"\n=== {summary_type.upper()} SUMMARY ===\n\n")
-        f.write(formatted_text + "\n")
-
+    # Comparisons of a MultiPeriodDataHandler are stored under their own period
+    period = dataset.period or report_period
+    store = get_store()
     for item in all_summaries:
-        item["Product Area"] = productline_mapping(item["Product Area"])
+        store.upsert("free_summary_writer", file_path, period, item["Business Area"], item["Product Area"], summary_type,
+                     item.get("Model"), item["Summary"], source_fingerprint=dataset.source_fingerprint,
+                     input_tokens=item["Input Tokens"], output_tokens=item["Output Tokens"],
+                     estimated_cost=item.get("Estimated Cost ($)"))
 
-    df = pd.DataFrame(all_summaries)
-    if os.path.exists(csv_path):
-        df.to_csv(csv_path, mode='a', header=False, index=False, sep=';', encoding='utf-8-sig')
-    else:
-        df.to_csv(csv_path, index=False, sep=';', encoding='utf-8-sig')
+    export_report(period)
 
-    print(f"Appended {summary_type} summary to summaries_free.txt and summaries_free.csv")
+    print(f"Updated {summary_type} summary in summaries_free.txt and summaries_free.csv")
+    print(get_ledger().summarise(by=("Stage",), current_run_only=True).to_string(index=False))
 
-    return formatted_text
+    return format_summaries_for_txt(all_summaries)
 
 if __name__ == "__main__":
     create_summary(
@@ -1,18 +1,46 @@
 import sys
 import os
-import pandas as pd
-import re
 from dotenv import load_dotenv
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from data_processing import DataHandler
 from mapping import map_productlines_in_dataframe, productline_mapping
-from openai import OpenAI
-
-
+from llm_backends import openai_chat
+from prompt_serialization import serialize_block
+from usage_ledger import get_ledger
+from job_journal import get_journal
+from fingerprints import config_fingerprint, frame_fingerprint
+from summary_store import get_store, default_period
+from templates import is_trivial, template_summary
+from scheduler import get_deadline, impact_order
+from semantic_cache import get_cache
+from structured_output import structured_output, openai_response_format, parse_summary, split_sentences, \
+    JSON_INSTRUCTIONS, JSON_NUM_PREDICT
+
+
+# API_KEY is read by the OpenAI backend when the first summary is requested
 load_dotenv()
-api_key = os.getenv("API_KEY")
-client = OpenAI(api_key=api_key)
+
+# Set STREAM_RESPONSES=1 to print tokens as they are produced and record time-to-first-token
+stream_responses = os.getenv("STREAM_RESPONSES", "0") == "1"
+# PROMPT_FORMAT=compact|bucket serializes data blocks without padding and with rounded values, PROMPT_PIVOT=1 as a Product Line x Region pivot
+prompt_format = os.getenv("PROMPT_FORMAT", "table")
+prompt_pivot = os.getenv("PROMPT_PIVOT", "0") == "1"
+# TEMPLATE_FAST_PATH=0 sends trivial areas to GPT-4o as well
+template_fast_path = os.getenv("TEMPLATE_FAST_PATH", "1") == "1"
+# SUMMARY_FORMAT=json asks GPT-4o for the summary as JSON with the product lines, regions and direction of every sentence
+summary_json = structured_output()
+# Finished areas are kept in the job journal, a rerun continues where the last one stopped (RESUME=0 starts over).
+# The journal is opened by the first area; results of areas whose input did not change are only
+# reused under the same prompts, models and settings
+journal_config = config_fingerprint(
+    __file__, prompt_format=prompt_format, prompt_pivot=prompt_pivot, template_fast_path=template_fast_path,
+    summary_json=summary_json, backend=os.getenv("LLM_BACKEND")
+)
+# Period the summaries are stored under (REPORT_PERIOD, default the current month)
+report_period = default_period()
+# transform_data rescales [Difference] randomly on every run, so change detection only
+# looks at the scale-free part of an area: its rows and their relative contributions
+SUMMARY_INPUT_COLUMNS = ["Product Line", "Region", "Product Area Contribution %", "Business Area Contribution %"]
 
 
 SYSTEM_PROMPT = """
@@ -81,37 +109,114 @@ Data:
 }
 
 
-def summarize_block(data_block: str, summary_type: str, overall_change:str) -> dict:
+def summarize_block(data_block: str, summary_type: str, overall_change: str, stream=None) -> dict:
     user_prompt = PROMPT_TEMPLATES[summary_type].format(
     data_block=data_block.strip(),
     overall_change=overall_change
 )
 
-
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT.strip()},
-            {"role": "user", "content": user_prompt.strip()}
-        ],
-        temperature=0.2,
-        max_tokens=150,
-        
+    if stream is None:
+        stream = stream_responses
+
+    options = {"temperature": 0.2, "max_tokens": 150}
+    if summary_json:
+        user_prompt = user_prompt.strip() + "\n" + JSON_INSTRUCTIONS
+        options.update(response_format=openai_response_format(), max_tokens=JSON_NUM_PREDICT)
+
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT.strip()},
+        {"role": "user", "content": user_prompt.strip()}
+    ]
+
+    # Tokens are echoed as they arrive so long runs show progress, the JSON is printed once parsed
+    content, metrics = openai_chat(
+        "gpt-4o",
+        messages,
+        stream=stream,
+        on_token=None if summary_json else lambda token: print(token, end="", flush=True),
+        stage=summary_type,
+        **options
     )
+    sentences = None
+    if summary_json:
+        content, sentences = parse_summary(content)
+        if stream:
+            print(content, end="")
+    if stream:
+        print()
 
-    content = response.choices[0].message.content
-    usage = response.usage
-    cost = (usage.prompt_tokens / 1000 * 0.005) + (usage.completion_tokens / 1000 * 0.015)
+    cost = get_ledger().cost("gpt-4o", metrics["prompt_tokens"], metrics["completion_tokens"])
 
     return {
         "summary": content,
-        "input_tokens": usage.prompt_tokens,
-        "output_tokens": usage.completion_tokens,
-        "total_tokens": usage.total_tokens,
-        "estimated_cost": round(cost, 4)
+        "input_tokens": metrics["prompt_tokens"],
+        "output_tokens": metrics["completion_tokens"],
+        "total_tokens": metrics["prompt_tokens"] + metrics["completion_tokens"],
+        "estimated_cost": round(cost, 4),
+        "model": "gpt-4o",
+        "metrics": metrics,
+        "format": "json" if sentences else "text"
+    }
+
+
+def template_result(df):
+    """House-style template summary of an area, without any GPT-4o call."""
+    return {
+        "summary": template_summary(df),
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "total_tokens": 0,
+        "estimated_cost": 0.0,
+        "model": "template",
+        "metrics": None
     }
 
 
+def summarize_frame(df, summary_type):
+    """Summary of one area, from the house-style template for trivial areas and from GPT-4o otherwise."""
+    if template_fast_path and is_trivial(df):
+        return template_result(df)
+
+    # An area with the same qualitative shape as one summarised before reuses that summary (SEMANTIC_CACHE=0 disables)
+    cached = get_cache().get("summary_writer", summary_type, df)
+    if cached is not None:
+        print("Summary reused from the semantic cache")
+        return {
+            "summary": cached[0],
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "total_tokens": 0,
+            "estimated_cost": 0.0,
+            "model": cached[1],
+            "metrics": None
+        }
+
+    block_str = serialize_block(df, prompt_format, pivot=prompt_pivot)
+    overall_change = df['Total Difference'].sum()
+    result = summarize_block(block_str, summary_type, overall_change)
+    get_cache().put("summary_writer", summary_type, df, result["summary"], result["model"])
+    return result
+
+
+def summarize_area(dataset, business_area, product_area, df, summary_type):
+    """Journaled summary of one area. Past the run deadline, an area without one gets the template summary."""
+    get_ledger().set_area(business_area, product_area)
+    unit = (dataset.source_fingerprint, business_area, product_area, summary_type)
+    fingerprint = frame_fingerprint(df, SUMMARY_INPUT_COLUMNS)
+    journal = get_journal("summary_writer", journal_config)
+
+    if get_deadline().expired() and not journal.reusable(*unit, fingerprint):
+        # Not journaled, so the next run still summarises the area with GPT-4o
+        print(f"Run deadline passed, template summary for {product_area or business_area}")
+        return format_summary(template_result(df), business_area, product_area or "All")
+
+    return journal.step(
+        *unit,
+        lambda: format_summary(summarize_frame(df, summary_type), business_area, product_area or "All"),
+        fingerprint=fingerprint
+    )
+
+
 def data_summarizer(dataset, business_area, product_area_list, summary_type):
     dataset.transform_data(['[Difference]'])
     summaries = []
@@ -120,20 +225,15 @@ def data_summarizer(dataset, business_area, product_area_list, summary_type):
         df = dataset.drivers_in_business_area_region_relative(business_area)
         map_productlines_in_dataframe(df, 'Product Line')
         if not df.empty:
-            block_str = df.to_string(index=False)
-            overall_change = df['Total Difference'].sum()
-            result = summarize_block(block_str, summary_type, overall_change)
-            summaries.append(format_summary(result, business_area, "All"))
+            summaries.append(summarize_area(dataset, business_area, None, df, summary_type))
     else:
-        for pa in product_area_list:
+        # Biggest movers first, so they are summarised by GPT-4o before a run deadline
+        for pa in impact_order(dataset, business_area, product_area_list):
             df = dataset.drivers_in_product_area_region_relative(business_area, pa)
             map_productlines_in_dataframe(df, 'Product Line')
             if df.empty:
                 continue
-            block_str = df.to_string(index=False)
-            overall_change = df['Total Difference'].sum()
-            result = summarize_block(block_str, summary_type, overall_change)
-            summaries.append(format_summary(result, business_area, pa))
+            summaries.append(summarize_area(dataset, business_area, pa, df, summary_type))
 
     return summaries
 
@@ -146,13 +246,16 @@ def format_summary(result, business_area, product_area):
         "Input Tokens": result["input_tokens"],
         "Output Tokens": result["output_tokens"],
         "Total Tokens": result["total_tokens"],
+        "Estimated Cost ($)": result["estimated_cost"],
+        "Model": result["model"],
+        "Summary Format": result.get("format", "text")
     }
 
 
 def format_summaries_for_txt(summaries):
     output = []
     for item in summaries:
-        sentences = re.split(r'(?<=[.!?])\s+', item['Summary'].strip())
+        sentences = split_sentences(item['Summary'], item.get('Summary Format') == "json")
         mapped_product_area = productline_mapping(item['Product Area'])
         formatted_summary = "\n".join(sentences)
 
@@ -166,14 +269,44 @@ def format_summaries_for_txt(summaries):
     return "\n\n".join(output)
 
 
-def create_summary(file_path, summary_type):
-    dataset = DataHandler(file_path)
+CSV_COLUMNS = ["Business Area", "Product Area", "Summary", "Input Tokens", "Output Tokens", "Total Tokens",
+               "Estimated Cost ($)", "Summary Type"]
 
-    business_area_product_map = {
-        "ACTH": ['ACAT', 'ACCA', 'ACCC', 'ACCP', 'ACG3', 'ACTC', 'ACVI'],
-        "SWIC": ['ARJO', 'SWA3', 'SWIN', 'SWIW', 'SWWP'],
-        "LISC": None
-    }
+
+def render_txt(summaries):
+    output = []
+    for summary_type, group in summaries.groupby("Summary Type", sort=False):
+        output.append(f"\n=== {summary_type.upper()} SUMMARY ===\n\n")
+        output.append(format_summaries_for_txt(group.to_dict("records")) + "\n")
+    return "".join(output)
+
+
+def render_csv(summaries):
+    summaries = summaries.assign(**{"Product Area": summaries["Product Area"].map(productline_mapping)})
+    return summaries[CSV_COLUMNS]
+
+
+def export_report(period=None):
+    """
+    Renders summaries.txt and summaries.csv from the summary store, so a rerun replaces
+    the summaries of the period instead of appending duplicates.
+    """
+    get_store().export_txt("summaries.txt", render_txt, report="summary_writer", period=period or report_period)
+    get_store().export_csv("summaries.csv", render_csv, report="summary_writer", period=period or report_period)
+
+
+def create_summary(file_path, summary_type, dataset=None, business_area_product_map=None):
+    from data_processing import DataHandler
+
+    # transform_data rescales the data in place, so a dataset shared by the caller is anonymized on a copy
+    dataset = DataHandler(file_path) if dataset is None else dataset.copy()
+
+    if business_area_product_map is None:
+        business_area_product_map = {
+            "ACTH": ['ACAT', 'ACCA', 'ACCC', 'ACCP', 'ACG3', 'ACTC', 'ACVI'],
+            "SWIC": ['ARJO', 'SWA3', 'SWIN', 'SWIW', 'SWWP'],
+            "LISC": None
+        }
 
     all_summaries = []
 
@@ -182,31 +315,23 @@ def create_summary(file_path, summary_type):
         summaries = data_summarizer(dataset, business_area, product_list, summary_type)
         all_summaries.extend(summaries)
 
-    formatted_text = format_summaries_for_txt(all_summaries)
-
-    txt_path = "summaries.txt"
-    csv_path = "summaries.csv"
-
-    with open(txt_path, "a", encoding="utf-8") as f:
-        f.write(f"\n=== {summary_type.upper()} SUMMARY ===\n\n")
-        f.write(formatted_text + "\n")
-
+    # Comparisons of a MultiPeriodDataHandler are stored under their own period
+    period = dataset.period or report_period
+    store = get_store()
     for item in all_summaries:
-        item["Product Area"] = productline_mapping(item["Product Area"])
-        item["Summary Type"] = summary_type
+        store.upsert("summary_writer", file_path, period, item["Business Area"], item["Product Area"], summary_type,
+                     item.get("Model"), item["Summary"], source_fingerprint=dataset.source_fingerprint,
+                     input_tokens=item["Input Tokens"], output_tokens=item["Output Tokens"],
+                     estimated_cost=item.get("Estimated Cost ($)"), summary_format=item.get("Summary Format"))
 
-    df = pd.DataFrame(all_summaries)
-    if os.path.exists(csv_path):
-        df.to_csv(csv_path, mode='a', header=False, index=False, sep=';', encoding='utf-8-sig')
-    else:
-        df.to_csv(csv_path, index=False, sep=';', encoding='utf-8-sig')
+    export_report(period)
 
-    print(f" Appended {summary_type} summary to summaries.txt and summaries.csv")
+    print(f"Updated {summary_type} summary in summaries.txt and summaries.csv")
+    print(get_ledger().summarise(by=("Stage",), current_run_only=True).to_string(index=False))
 
-    return formatted_text
+    return format_summaries_for_txt(all_summaries)
 
 
-# Run both types
 if __name__ == "__main__":
     create_summary(
         os.getenv("NET_SALES_PATH"),
@@ -0,0 +1,102 @@
+"""
+Throughput of the Ollama host pool over 1, 2 and 4 stand-in servers, and a failover run.
+
+    python benchmarks/host_pool_benchmark.py
+    python benchmarks/host_pool_benchmark.py --hosts 1 --hosts 3 --areas 24 --workers 8
+
+Every area runs the four stages of a Local workflow one after the other with the same
+system prompt; --workers areas run side by side, as with run_reports.py --workers.
+"Pinned" is the share of stages that ran on the host of the first stage of their area,
+"Cache hits" the share of requests whose system prompt the server still had. The
+failover run stops one server while the areas are running; every area has to finish.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ollama_standin import start_servers
+from host_pool import HostPool
+from llm_backends import PooledOllamaBackend
+from usage_ledger import get_ledger
+
+STAGES = ["natural_language", "analysis_of_data", "summary", "validate_summary"]
+MODEL = "llama3.1:8b"
+
+
+def area_messages(area, stage):
+    system = f"You are a financial data analyst. Rules and context of product area {area}: " + "rule " * 300
+    return [{"role": "system", "content": system}, {"role": "user", "content": f"{stage} of {area}: " + "row " * 80}]
+
+
+def run_areas(backend, areas, workers, stop=None):
+    """Runs the stage chains, returns the seconds taken and the hosts per area."""
+    def chain(area):
+        get_ledger().set_area("BENCH", area)
+        hosts = []
+        for stage in STAGES:
+            _, metrics = backend.chat(MODEL, area_messages(area, stage), stream=True, on_token=lambda token: None)
+            hosts.append(metrics["host"])
+            if stop is not None:
+                stop()
+        return hosts
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        hosts = list(executor.map(chain, areas))
+    return time.perf_counter() - start, hosts
+
+
+def measure(host_count, areas, workers, port, failover=False):
+    servers = start_servers(host_count, port, load_time=0.2)
+    try:
+        backend = PooledOllamaBackend(HostPool([server.url for server in servers], check_interval=3600))
+        backend.warm_up(MODEL)
+
+        stop = None
+        if failover:
+            calls = []
+
+            def stop():
+                # The last server goes down after a quarter of the requests
+                calls.append(1)
+                if len(calls) == areas * len(STAGES) // 4:
+                    servers[-1].stop()
+
+        seconds, hosts = run_areas(backend, [f"PA{i:02d}" for i in range(areas)], workers, stop)
+        requests = sum(server.requests for server in servers)
+        return {
+            "Hosts": host_count,
+            "Failover": failover,
+            "Seconds": round(seconds, 2),
+            "Stages/s": round(areas * len(STAGES) / seconds, 2),
+            "Pinned %": round(100 * sum(h == area_hosts[0] for area_hosts in hosts for h in area_hosts)
+                              / (areas * len(STAGES)), 1),
+            "Cache hits %": round(100 * sum(server.cache_hits for server in servers) / requests, 1),
+            "Requests per host": "/".join(str(server.requests) for server in servers),
+        }
+    finally:
+        for server in servers[:-1] if failover else servers:
+            server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hosts", action="append", type=int, help="host counts, repeatable (default 1, 2, 4)")
+    parser.add_argument("--areas", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--port", type=int, default=11601, help="first port of the stand-in servers")
+    args = parser.parse_args()
+
+    os.environ.setdefault("USAGE_LEDGER_PATH", os.devnull)
+    counts = args.hosts or [1, 2, 4]
+    rows = [measure(count, args.areas, args.workers, args.port + 10 * i) for i, count in enumerate(counts)]
+    rows.append(measure(max(counts), args.areas, args.workers, args.port + 10 * len(counts), failover=True))
+
+    pd.set_option("display.width", 200)
+    print(pd.DataFrame(rows).to_string(index=False))
@@ -0,0 +1,163 @@
+"""
+Stand-in Ollama servers for trying out OLLAMA_HOSTS without inference boxes.
+
+    python benchmarks/ollama_standin.py --hosts 3
+    OLLAMA_HOSTS=http://127.0.0.1:11501,http://127.0.0.1:11502,http://127.0.0.1:11503 python run_reports.py
+
+Every server answers /api/tags, /api/generate (model loads) and /api/chat, streamed or
+not, with the fixed reply the FakeBackend uses (as JSON when a format is requested). A request takes the time of its prompt
+evaluation plus its generation at the given token rates, and a server handles one
+request per model at a time, as Ollama does with OLLAMA_NUM_PARALLEL=1. A system prompt
+the server saw last for the model is not evaluated again, like the prompt cache of Ollama,
+so requests pinned to a host are faster there.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from prompt_serialization import estimate_tokens
+
+
+REPLY = "[Product Line] up in all regions."
+
+
+class StandInServer:
+    """One stand-in server on 127.0.0.1:`port`, started in a background thread."""
+
+    def __init__(self, port, prompt_rate=400.0, eval_rate=20.0, load_time=0.5, reply=REPLY):
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}"
+        self.prompt_rate = prompt_rate
+        self.eval_rate = eval_rate
+        self.load_time = load_time
+        self.reply = reply
+        self.requests = 0
+        self.cache_hits = 0
+        self.loaded = set()
+        # Last system prompt per model, the prefix the next request can reuse
+        self.prefix = {}
+        self.slots = defaultdict(threading.Lock)
+        self._lock = threading.Lock()
+        self._server = None
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _json(self, payload):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    self._json({"models": [{"name": model, "model": model} for model in sorted(server.loaded)]})
+                else:
+                    self._json({"status": "Ollama is running"})
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if self.path == "/api/generate":
+                    self._json({"model": request.get("model"), "response": "", "done": True,
+                                "load_duration": int(server.load(request.get("model")) * 1e9)})
+                elif self.path == "/api/chat":
+                    server.chat(self, request)
+                else:
+                    self.send_error(404)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        """Stops answering, requests in flight are cut off like on a host that goes down."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def load(self, model):
+        with self._lock:
+            if model in self.loaded:
+                return 0.0
+            self.loaded.add(model)
+        time.sleep(self.load_time)
+        return self.load_time
+
+    def chat(self, handler, request):
+        model = request.get("model")
+        messages = request.get("messages", [])
+        system = next((m["content"] for m in messages if m["role"] == "system"), "")
+        load_time = self.load(model)
+
+        with self.slots[model]:
+            with self._lock:
+                self.requests += 1
+                cached = self.prefix.get(model) == system
+                self.cache_hits += cached
+                self.prefix[model] = system
+            prompt_tokens = sum(estimate_tokens(m["content"]) for m in messages)
+            evaluated = prompt_tokens - (estimate_tokens(system) if cached else 0)
+            prompt_s = evaluated / self.prompt_rate
+            time.sleep(prompt_s)
+
+            reply = self.reply
+            if request.get("format"):
+                reply = json.dumps({"sentences": [{"text": reply, "product_lines": [], "regions": ["all"],
+                                                   "direction": "up"}]})
+            tokens = reply.split(" ")
+            done = {"model": model, "done": True, "done_reason": "stop", "prompt_eval_count": prompt_tokens,
+                    "prompt_eval_duration": int(prompt_s * 1e9), "eval_count": len(tokens),
+                    "eval_duration": int(len(tokens) / self.eval_rate * 1e9), "load_duration": int(load_time * 1e9)}
+
+            if request.get("stream", True):
+                handler.send_response(200)
+                handler.send_header("Content-Type", "application/x-ndjson")
+                handler.end_headers()
+                for i, token in enumerate(tokens):
+                    time.sleep(1 / self.eval_rate)
+                    text = token if i == len(tokens) - 1 else token + " "
+                    handler.wfile.write((json.dumps({"model": model, "message": {"role": "assistant", "content": text},
+                                                     "done": False}) + "\n").encode("utf-8"))
+                    handler.wfile.flush()
+                handler.wfile.write((json.dumps({**done, "message": {"role": "assistant", "content": ""}}) + "\n")
+                                    .encode("utf-8"))
+            else:
+                time.sleep(len(tokens) / self.eval_rate)
+                handler._json({**done, "message": {"role": "assistant", "content": " ".join(tokens)}})
+
+
+def start_servers(count, first_port=11501, **kwargs):
+    return [StandInServer(first_port + i, **kwargs).start() for i in range(count)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hosts", type=int, default=2)
+    parser.add_argument("--port", type=int, default=11501, help="port of the first server")
+    parser.add_argument("--prompt-rate", type=float, default=400.0, help="prompt tokens per second")
+    parser.add_argument("--eval-rate", type=float, default=20.0, help="generated tokens per second")
+    parser.add_argument("--load-time", type=float, default=0.5, help="seconds a model takes to load")
+    args = parser.parse_args()
+
+    servers = start_servers(args.hosts, args.port, prompt_rate=args.prompt_rate, eval_rate=args.eval_rate,
+                            load_time=args.load_time)
+    print(f"OLLAMA_HOSTS={','.join(server.url for server in servers)}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        for server in servers:
+            print(f"{server.url}: {server.requests} requests, {server.cache_hits} prompt cache hits")
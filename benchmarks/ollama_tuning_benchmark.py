@@ -0,0 +1,120 @@
+"""
+Picks num_thread and num_batch for the Ollama models on this host and stores them for later runs.
+
+    python benchmarks/ollama_tuning_benchmark.py --model llama3.1:8b
+    python benchmarks/ollama_tuning_benchmark.py --model llama3.1:8b --model qwen2.5:7b \\
+        --threads 4 --threads 8 --batch 128 --batch 512 --repeats 3
+
+Every combination runs the same prompt, a data block of the size the workflows send,
+with a short fixed output. The time of a request is the prompt evaluation plus the
+generation reported by Ollama; model load time is left out, every combination is loaded
+once before it is measured. The fastest combination per model is written to
+OLLAMA_TUNING_PATH (default ollama_tuning.json), which runtime_options adds to every
+request of that model.
+"""
+import argparse
+import itertools
+import json
+import os
+import statistics
+import sys
+from datetime import datetime
+
+import pandas as pd
+from dotenv import load_dotenv
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ollama_client import get_client
+
+
+def default_threads():
+    """A quarter, half and all of the logical CPUs; Ollama is usually fastest at the physical core count."""
+    cpus = os.cpu_count() or 4
+    return sorted({max(1, cpus // 4), max(1, cpus // 2), cpus})
+
+
+def benchmark_prompt(rows=60):
+    lines = [f"PL{i:03d} | Region {i % 8} | {(i * 1379) % 50000 * (-1) ** i} | {(i * 7) % 100}.{i % 10} | "
+             f"{'Major' if i % 4 == 0 else 'Minor'} {'Increase' if i % 2 == 0 else 'Decrease'}" for i in range(rows)]
+    block = "\n".join(["Product Line | Region | Total Difference | Contribution % | Change Type"] + lines)
+    return [{"role": "system", "content": "You are a financial data analyst summarizing trends."},
+            {"role": "user", "content": f"Summarize the changes per product line:\n{block}"}]
+
+
+def measure(model, options, messages, repeats):
+    client = get_client().client
+    # Loads the model with these options, a changed num_thread or num_batch reloads it
+    client.generate(model=model, prompt="", options=options, keep_alive="5m")
+
+    runs = []
+    for _ in range(repeats):
+        response = client.chat(model=model, messages=messages, options=options, keep_alive="5m")
+        prompt_s = (response.get("prompt_eval_duration") or 0) / 1e9
+        eval_s = (response.get("eval_duration") or 0) / 1e9
+        runs.append({
+            "Prompt tok/s": (response.get("prompt_eval_count") or 0) / prompt_s if prompt_s else 0.0,
+            "Eval tok/s": (response.get("eval_count") or 0) / eval_s if eval_s else 0.0,
+            "Request s": prompt_s + eval_s,
+        })
+    return {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+
+
+def tune(models, threads, batches, num_ctx=4096, num_predict=64, repeats=3):
+    messages = benchmark_prompt()
+    rows = []
+    for model, num_thread, num_batch in itertools.product(models, threads, batches):
+        options = {"num_thread": num_thread, "num_batch": num_batch, "num_ctx": num_ctx,
+                   "num_predict": num_predict, "temperature": 0}
+        result = measure(model, options, messages, repeats)
+        rows.append({"Model": model, "num_thread": num_thread, "num_batch": num_batch, **result})
+        print(f"{model} num_thread={num_thread} num_batch={num_batch}: {result['Request s']:.2f}s "
+              f"prompt {result['Prompt tok/s']:.1f} tok/s, eval {result['Eval tok/s']:.1f} tok/s")
+    return pd.DataFrame(rows)
+
+
+def store(results, path):
+    """Writes the fastest options per model, keeping the stored options of models that were not tuned."""
+    tuned = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            tuned = json.load(f)
+
+    for model, group in results.groupby("Model"):
+        best = group.sort_values("Request s").iloc[0]
+        tuned[model] = {
+            "options": {"num_thread": int(best["num_thread"]), "num_batch": int(best["num_batch"])},
+            "Request s": round(float(best["Request s"]), 3),
+            "Prompt tok/s": round(float(best["Prompt tok/s"]), 1),
+            "Eval tok/s": round(float(best["Eval tok/s"]), 1),
+            "Host CPUs": os.cpu_count(),
+            "Tuned": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(tuned, f, indent=2)
+    return tuned
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", action="append", help="repeatable (default llama3.1:8b)")
+    parser.add_argument("--threads", action="append", type=int, help="num_thread candidates (default a quarter, "
+                                                                     "half and all of the CPUs)")
+    parser.add_argument("--batch", action="append", type=int, help="num_batch candidates (default 128, 256, 512)")
+    parser.add_argument("--num-ctx", type=int, default=4096)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--dry-run", action="store_true", help="print the results without storing them")
+    args = parser.parse_args()
+
+    load_dotenv()
+    results = tune(args.model or ["llama3.1:8b"], args.threads or default_threads(), args.batch or [128, 256, 512],
+                   args.num_ctx, repeats=args.repeats)
+    pd.set_option("display.width", 200)
+    print()
+    print(results.round(2).sort_values(["Model", "Request s"]).to_string(index=False))
+
+    if not args.dry_run:
+        path = os.getenv("OLLAMA_TUNING_PATH", "ollama_tuning.json")
+        tuned = store(results, path)
+        print(f"\n----- Stored in {path} -----\n{json.dumps(tuned, indent=2)}")
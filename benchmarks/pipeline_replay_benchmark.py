@@ -0,0 +1,131 @@
+"""
+Replays recorded LLM exchanges through the full pipelines to measure the time they spend outside the model
+(data preparation, prompt building, mapping, validation, file and store I/O), without any model server.
+
+Record a cassette once where Ollama and OpenAI are reachable:
+
+    LLM_BACKEND=record LLM_CASSETTE=cassette.jsonl python Local/netsales_workflow.py
+    LLM_BACKEND=record LLM_CASSETTE=cassette.jsonl python OpenAI/summary_writer.py
+
+Then replay it anywhere:
+
+    python benchmarks/pipeline_replay_benchmark.py --cassette cassette.jsonl
+    python benchmarks/pipeline_replay_benchmark.py --cassette cassette.jsonl \\
+        --latency zero --latency recorded --latency lognormal:2,0.6 \\
+        --variant hedged:LLM_HEDGE_PERCENTILE=90,LLM_DEADLINE=30
+    python benchmarks/pipeline_replay_benchmark.py --cassette cassette.jsonl --profile
+
+Every run starts from an empty job journal, summary store and usage ledger in a
+temporary directory. Overhead is the wall time of the script minus the model time
+recorded in its usage ledger.
+"""
+import argparse
+import os
+import pstats
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+from dotenv import load_dotenv
+
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+scripts = {
+    "netsales_workflow": os.path.join(ROOT, "Local", "netsales_workflow.py"),
+    "orderintake_workflow": os.path.join(ROOT, "Local", "orderintake_workflow.py"),
+    "lifescience": os.path.join(ROOT, "Local", "lifescience.py"),
+    "summary_writer": os.path.join(ROOT, "OpenAI", "summary_writer.py"),
+    "free_summary_writer": os.path.join(ROOT, "OpenAI", "free_summary_writer.py"),
+}
+
+
+def parse_variant(text):
+    """'name:KEY=VALUE,KEY=VALUE' -> (name, {KEY: VALUE})"""
+    name, _, settings = text.partition(":")
+    return name, dict(setting.split("=", 1) for setting in settings.split(",") if setting)
+
+
+def replay(script, cassette, latency, settings, profile=False):
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ)
+        # Data paths from .env are relative to where the benchmark was started
+        for var in ("NET_SALES_PATH", "ORDER_INTAKE_PATH"):
+            if env.get(var):
+                env[var] = os.path.abspath(env[var])
+        env.update({
+            "LLM_BACKEND": "replay",
+            "LLM_CASSETTE": os.path.abspath(cassette),
+            "LLM_REPLAY_LATENCY": latency,
+            "USAGE_LEDGER_PATH": os.path.join(workdir, "usage_ledger.csv"),
+            "JOB_JOURNAL_PATH": os.path.join(workdir, "job_journal.jsonl"),
+            "SUMMARY_STORE_PATH": os.path.join(workdir, "summaries.db"),
+            "API_KEY": env.get("API_KEY") or "replay",
+        })
+        env.update(settings)
+
+        command = [sys.executable, script]
+        profile_path = os.path.join(workdir, "profile.out")
+        if profile:
+            command = [sys.executable, "-m", "cProfile", "-o", profile_path, script]
+
+        start = time.perf_counter()
+        completed = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True)
+        wall = time.perf_counter() - start
+        if completed.returncode != 0:
+            raise RuntimeError(f"{script} failed:\n{completed.stderr[-2000:]}")
+
+        ledger = pd.read_csv(env["USAGE_LEDGER_PATH"], sep=';')
+        ledger = ledger[ledger["Stage"] != "warm_up"]
+        model_s = ledger["Latency s"].sum()
+
+        stats = None
+        if profile:
+            stats = pstats.Stats(profile_path)
+            stats.sort_stats("cumulative")
+
+        return {"Calls": len(ledger), "Wall s": wall, "Model s": model_s,
+                "Overhead s": wall - model_s, "Overhead %": (wall - model_s) / wall * 100}, stats
+
+
+def run(names, cassette, latencies, variants, repeats=3, profile=False):
+    rows = []
+    for name in names:
+        for latency in latencies:
+            for variant, settings in variants:
+                for repeat in range(repeats):
+                    result, stats = replay(scripts[name], cassette, latency, settings, profile and repeat == 0)
+                    rows.append({"Script": name, "Latency": latency, "Variant": variant, **result})
+                    if stats is not None:
+                        print(f"\n----- {name} / {latency} / {variant}: top functions by cumulative time -----")
+                        stats.print_stats(20)
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cassette", default="cassette.jsonl")
+    parser.add_argument("--script", action="append", choices=sorted(scripts),
+                        help="pipeline to replay, repeatable (default netsales_workflow and summary_writer)")
+    parser.add_argument("--latency", action="append",
+                        help="simulated latency: zero, recorded, scale:F, fixed:S, uniform:A,B, normal:MEAN,SD, "
+                             "lognormal:MEDIAN,SIGMA; repeatable (default zero and recorded)")
+    parser.add_argument("--variant", action="append", default=[], type=parse_variant,
+                        help="name:KEY=VALUE,... environment settings compared against the baseline, repeatable")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--profile", action="store_true", help="print a cProfile of the first run of each setting")
+    args = parser.parse_args()
+
+    load_dotenv()
+    latencies = [("fixed:0" if latency == "zero" else latency) for latency in (args.latency or ["zero", "recorded"])]
+    variants = [("baseline", {})] + args.variant
+
+    results = run(args.script or ["netsales_workflow", "summary_writer"], args.cassette, latencies, variants,
+                  args.repeats, args.profile)
+    pd.set_option("display.width", 200)
+    print(results.round(3).to_string(index=False))
+    print()
+    print(results.groupby(["Script", "Latency", "Variant"])[["Calls", "Wall s", "Model s", "Overhead s", "Overhead %"]]
+          .median().round(3).to_string())
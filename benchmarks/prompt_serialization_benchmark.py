@@ -0,0 +1,104 @@
+"""
+Measures token savings and latency of the compact prompt serialization on the real product areas.
+
+    python benchmarks/prompt_serialization_benchmark.py
+    python benchmarks/prompt_serialization_benchmark.py --llm llama3.1:8b
+
+Without --llm only the estimated prompt tokens and the serialization time are reported.
+With --llm every block is also sent to Ollama in each format and the prompt
+evaluation and total latency are measured.
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+from dotenv import load_dotenv
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from data_processing import DataHandler
+from prompt_serialization import serialize_block, estimate_tokens
+
+
+business_area_product_map = {
+    "ACTH": ['ACAT', 'ACCA', 'ACCC', 'ACCP', 'ACG3', 'ACTC', 'ACVI'],
+    "SWIC": ['ARJO', 'SWA3', 'SWIN', 'SWIW', 'SWWP'],
+    "LISC": None
+}
+
+formats = {
+    "table": dict(prompt_format="table"),
+    "compact": dict(prompt_format="compact"),
+    "bucket": dict(prompt_format="bucket"),
+    "compact_pivot": dict(prompt_format="compact", pivot=True),
+}
+
+
+def blocks(dataset):
+    for business_area, product_list in business_area_product_map.items():
+        if product_list is None:
+            yield business_area, "All", dataset.drivers_in_business_area_region_relative(business_area)
+            continue
+        for product_area in product_list:
+            yield business_area, product_area, dataset.preprocess_orderintake_by_product_area(business_area, product_area)
+
+
+def llm_latency(model, block):
+    import ollama
+
+    prompt = f"Summarize the changes per row of the data in natural language.\n\n{block}"
+    start = time.perf_counter()
+    response = ollama.chat(model=model, messages=[{"role": "user", "content": prompt}],
+                           options={"temperature": 0, "num_predict": 1})
+    total = time.perf_counter() - start
+    return response.get('prompt_eval_count'), (response.get('prompt_eval_duration') or 0) / 1e9, total
+
+
+def run(paths, model=None, repeats=20):
+    rows = []
+    for name, path in paths.items():
+        dataset = DataHandler(path)
+        for business_area, product_area, df in blocks(dataset):
+            if df.empty:
+                continue
+            for fmt, kwargs in formats.items():
+                start = time.perf_counter()
+                for _ in range(repeats):
+                    text = serialize_block(df, **kwargs)
+                serialize_ms = (time.perf_counter() - start) / repeats * 1000
+
+                row = {"Dataset": name, "Business Area": business_area, "Product Area": product_area,
+                       "Rows": len(df), "Format": fmt, "Est. Tokens": estimate_tokens(text),
+                       "Serialize ms": round(serialize_ms, 3)}
+                if model:
+                    prompt_tokens, prompt_eval_s, total_s = llm_latency(model, text)
+                    row.update({"Prompt Tokens": prompt_tokens, "Prompt Eval s": round(prompt_eval_s, 3),
+                                "LLM Total s": round(total_s, 3)})
+                rows.append(row)
+
+    results = pd.DataFrame(rows)
+    table_tokens = results[results["Format"] == "table"].set_index(["Dataset", "Product Area"])["Est. Tokens"]
+    results["Saved %"] = [
+        round((1 - tokens / table_tokens[(dataset, pa)]) * 100, 1)
+        for dataset, pa, tokens in zip(results["Dataset"], results["Product Area"], results["Est. Tokens"])
+    ]
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--llm", metavar="MODEL", help="also measure Ollama latency with this model")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    load_dotenv()
+    paths = {name: os.getenv(var) for name, var in [("net_sales", "NET_SALES_PATH"),
+                                                      ("order_intake", "ORDER_INTAKE_PATH")] if os.getenv(var)}
+
+    results = run(paths, args.llm, args.repeats)
+    print(results.to_string(index=False))
+    print()
+    print(results.groupby("Format")[[c for c in results.columns if c in
+                                     ("Est. Tokens", "Saved %", "Serialize ms", "Prompt Eval s", "LLM Total s")]]
+          .mean().round(2).to_string())
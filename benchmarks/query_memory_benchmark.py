@@ -0,0 +1,114 @@
+"""
+Peak memory of the DataHandler queries, measured with tracemalloc.
+
+    python benchmarks/query_memory_benchmark.py
+    python benchmarks/query_memory_benchmark.py --area-rows 5000 --growth 20 --check
+
+A synthetic export in the layout of the wide exports holds product area ACAT with
+--area-rows rows in business area ACTH. The other product areas of ACTH get the same
+number of rows, and then --growth times as many. Every query runs on both exports. A
+product area query should only copy the rows of its product area, so its peak should
+not grow with the rest of the business area. --check exits with 1 when one grows by
+more than 25%.
+"""
+import argparse
+import os
+import sys
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from data_processing import DataHandler
+
+
+REGIONS = [("Europe", "DE"), ("Europe", "FR"), ("Americas", "US"), ("Asia", "CN"), ("Asia", "JP"), ("Americas", "BR")]
+
+
+def synthetic_export(area_rows, other_rows, seed=0):
+    """ACTH with ACAT (`area_rows` rows) and six other product areas (`other_rows` rows together), and SWIC."""
+    rng = np.random.default_rng(seed)
+    others = ['ACCA', 'ACCC', 'ACCP', 'ACG3', 'ACTC', 'ACVI']
+    areas = [("ACTH", "ACAT", area_rows)] + [("ACTH", pa, other_rows // len(others)) for pa in others] + \
+        [("SWIC", "ARJO", area_rows)]
+
+    frames = []
+    for business_area, product_area, rows in areas:
+        region = rng.integers(len(REGIONS), size=rows)
+        frames.append(pd.DataFrame({
+            "DimProduct[Business Area Code]": business_area,
+            "DimProduct[Product Area Code]": product_area,
+            "DimProduct[Product Line Code]": [f"{product_area[:2]}{i:02d}" for i in rng.integers(12, size=rows)],
+            "DimMarketGeo[Region Label Geo]": [REGIONS[r][0] for r in region],
+            "DimMarketGeo[Country Code Geo]": [REGIONS[r][1] for r in region],
+            "[Value_cper]": rng.uniform(1e3, 5e4, size=rows),
+            "[Value_mper]": rng.uniform(1e3, 5e4, size=rows),
+            "[v_Value_cper_FormatString]": "#",
+            "[v_Value_mper_FormatString]": "#",
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+QUERIES = [
+    ("drivers_in_product_area_region", ("ACTH", "ACAT")),
+    ("drivers_in_product_area_region_relative", ("ACTH", "ACAT")),
+    ("preprocess_orderintake_by_product_area", ("ACTH", "ACAT")),
+    ("computed_pre_analysis", ("ACTH", "ACAT")),
+    ("drivers_per_product_area", ("ACTH",)),
+    ("drivers_in_business_area_region_relative", ("ACTH",)),
+]
+PRODUCT_AREA_QUERIES = {name for name, args in QUERIES if len(args) == 2}
+
+
+def peak(call):
+    """(result, peak bytes allocated while `call` ran)"""
+    tracemalloc.start()
+    try:
+        result = call()
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def result_bytes(result):
+    frames = result.values() if isinstance(result, dict) else [result]
+    return sum(int(frame.memory_usage(deep=True).sum()) for frame in frames)
+
+
+def measure(area_rows, other_rows):
+    dataset = DataHandler.from_frame(synthetic_export(area_rows, other_rows))
+    # The first query computes the aggregates of the dataset, once per dataset
+    _, index_peak = peak(lambda: dataset.drivers_per_product_area("SWIC"))
+    rows = {"Aggregates build": (index_peak, 0)}
+    for name, args in QUERIES:
+        result, query_peak = peak(lambda: getattr(dataset, name)(*args))
+        rows[name] = (query_peak, result_bytes(result))
+    return rows, len(dataset.df)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--area-rows", type=int, default=2000, help="rows of the measured product area")
+    parser.add_argument("--growth", type=int, default=10, help="factor the rest of the business area grows by")
+    parser.add_argument("--check", action="store_true", help="exit 1 when a product area query grows with the "
+                                                             "business area")
+    args = parser.parse_args()
+
+    small, small_rows = measure(args.area_rows, args.area_rows)
+    large, large_rows = measure(args.area_rows, args.area_rows * args.growth)
+
+    table = pd.DataFrame([
+        {"Query": name, "Peak KiB": small[name][0] / 1024, f"Peak KiB x{args.growth}": large[name][0] / 1024,
+         "Growth": large[name][0] / small[name][0], "Result KiB": large[name][1] / 1024,
+         "Product area": name in PRODUCT_AREA_QUERIES}
+        for name in small
+    ])
+    pd.set_option("display.width", 200)
+    print(f"Dataset rows: {small_rows} and {large_rows}, product area ACAT: {args.area_rows}\n")
+    print(table.round(2).to_string(index=False))
+
+    grown = table[table["Product area"] & (table["Growth"] > 1.25)]
+    if args.check and not grown.empty:
+        print(f"\n----- Peak grows with the business area: {', '.join(grown['Query'])} -----")
+        sys.exit(1)
@@ -0,0 +1,66 @@
+"""
+Time to a first answer of a new process, from the CSV and from an aggregate snapshot.
+
+    python benchmarks/snapshot_benchmark.py
+    python benchmarks/snapshot_benchmark.py --rows 500000 --repeat 3
+
+A synthetic export (see query_memory_benchmark) is written to a temporary directory.
+Every run opens a DataHandler in a fresh Python process and answers the product area
+queries of ACTH: "CSV" with AGGREGATE_SNAPSHOTS=0, "Snapshot" after a first run wrote
+the snapshot. The seconds include the imports of the process.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from query_memory_benchmark import synthetic_export
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+QUERY = """
+import sys
+sys.path.insert(0, {root!r})
+from data_processing import DataHandler
+dataset = DataHandler({path!r})
+for product_area in dataset.drivers_per_product_area("ACTH")["Product Area"]:
+    dataset.computed_pre_analysis("ACTH", product_area)
+print(dataset._df is not None)
+"""
+
+
+def run(path, snapshots, directory):
+    env = {**os.environ, "AGGREGATE_SNAPSHOTS": "1" if snapshots else "0", "AGGREGATE_SNAPSHOT_DIR": directory}
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", QUERY.format(root=ROOT, path=path)], env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return time.perf_counter() - start, output.strip() == "True"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000, help="rows of the synthetic export")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "export.csv")
+        synthetic_export(args.rows // 8, args.rows * 6 // 8).to_csv(path, sep=';', index=False)
+        snapshot_dir = os.path.join(directory, "snapshots")
+        write_seconds, _ = run(path, True, snapshot_dir)
+
+        rows = []
+        for label, snapshots in [("CSV", False), ("Snapshot", True)]:
+            runs = [run(path, snapshots, snapshot_dir) for _ in range(args.repeat)]
+            rows.append({"Source": label, "Seconds": round(min(seconds for seconds, _ in runs), 3),
+                         "Rows parsed": runs[0][1]})
+        rows.append({"Source": "CSV + snapshot write", "Seconds": round(write_seconds, 3), "Rows parsed": True})
+        snapshot_kib = sum(os.path.getsize(os.path.join(snapshot_dir, name)) for name in os.listdir(snapshot_dir)) / 1024
+
+    print(f"Export rows: {args.rows}, snapshot: {snapshot_kib:.0f} KiB\n")
+    print(pd.DataFrame(rows).to_string(index=False))
@@ -0,0 +1,116 @@
+"""
+Measures how long the workflow modules and commands take to start, before any data is read or model called.
+
+    python benchmarks/startup_benchmark.py
+    python benchmarks/startup_benchmark.py --repeats 10 --top 15
+    python benchmarks/startup_benchmark.py --budget benchmarks/startup_budget.json
+
+Every module is imported in a fresh interpreter with `-X importtime`; the table shows the
+median import time and whether pandas, numpy, openai or ollama were loaded on the way.
+Commands are timed end to end. With --budget, the script exits with status 1 when a
+median is over its budget in milliseconds, so a heavy import at module level fails CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+modules = [
+    "run_reports", "netsales_workflow", "orderintake_workflow", "lifescience",
+    "summary_writer", "free_summary_writer", "usage_ledger", "summary_store",
+]
+
+commands = {
+    "run_reports --help": [os.path.join(ROOT, "run_reports.py"), "--help"],
+    "run_reports --list-areas": [os.path.join(ROOT, "run_reports.py"), "--list-areas"],
+}
+
+# Imports that belong to a run, not to startup
+HEAVY = ["pandas", "numpy", "openai", "ollama"]
+
+
+def importtime(module):
+    """
+    (import seconds, {imported name: cumulative seconds}) of importing `module` in a fresh interpreter.
+    The imports are the direct imports of `module`, plus every heavy package loaded on the way.
+    """
+    path = [ROOT, os.path.join(ROOT, "Local"), os.path.join(ROOT, "OpenAI")]
+    code = f"import sys; sys.path[:0] = {path!r}; import {module}"
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                               capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+
+    # import time: self [us] | cumulative | imported package, two more spaces per nesting level;
+    # a package is listed after everything it imports
+    seconds, children, imports = 0.0, {}, {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        if name.split(".")[0] in HEAVY and name.split(".")[0] not in imports:
+            imports[name.split(".")[0]] = int(cumulative) / 1e6
+        if depth == 0:
+            if name == module:
+                seconds = int(cumulative) / 1e6
+                imports.update(children)
+            children = {}
+        elif depth == 1:
+            children[name] = int(cumulative) / 1e6
+    return seconds, imports
+
+
+def timed(command):
+    start = time.perf_counter()
+    subprocess.run([sys.executable] + command, cwd=ROOT, capture_output=True, check=True)
+    return time.perf_counter() - start
+
+
+def run(repeats=5, top=10):
+    results = {}
+    for module in modules:
+        # Breakdown of the median run
+        seconds, imports = sorted((importtime(module) for _ in range(repeats)), key=lambda r: r[0])[repeats // 2]
+        heavy = [name for name in HEAVY if name in imports]
+        results[f"import {module}"] = seconds * 1000
+        print(f"import {module:<22} {results[f'import {module}']:8.1f} ms   heavy: {', '.join(heavy) or '-'}")
+        for name, cumulative in sorted(imports.items(), key=lambda item: -item[1])[:top]:
+            print(f"    {name:<30} {cumulative * 1000:8.1f} ms")
+
+    print()
+    for name, command in commands.items():
+        results[name] = statistics.median(timed(command) for _ in range(repeats)) * 1000
+        print(f"{name:<29} {results[name]:8.1f} ms")
+    return results
+
+
+def check(results, budget_path):
+    with open(budget_path, encoding="utf-8") as f:
+        budget = json.load(f)
+    over = {name: (results[name], limit) for name, limit in budget.items() if results.get(name, 0) > limit}
+    print()
+    for name, (ms, limit) in over.items():
+        print(f"----- Over budget: {name} {ms:.1f} ms > {limit} ms -----")
+    if not over:
+        print(f"----- Startup within budget ({len(budget)} checks) -----")
+    return not over
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="slowest imports listed per module")
+    parser.add_argument("--budget", default=None, help="JSON of {name: milliseconds}, exit 1 when a median is over")
+    args = parser.parse_args()
+
+    results = run(args.repeats, args.top)
+    if args.budget and not check(results, args.budget):
+        sys.exit(1)
@@ -0,0 +1,108 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from generation_budgets import stage_budget, stage_options
+from prompt_serialization import estimate_tokens
+from runtime_options import context_tokens
+from usage_ledger import get_ledger
+
+
+# Tokens of the prompt around the data block (role, context, task, rules and examples)
+PROMPT_OVERHEAD = 450
+
+
+def block_budget(stage, model=None, rows=None):
+    """
+    Tokens left for the data block of a stage once the prompt and the output budget
+    for a block of `rows` rows are taken off the context.
+    """
+    output_budget = (stage_options(model, stage, rows=rows) or {}).get("num_predict", 0)
+    return max(1, context_tokens() - PROMPT_OVERHEAD - output_budget)
+
+
+def row_budget(stage, model=None):
+    """Output tokens a stage is given for every row of its data block."""
+    return stage_budget(model, stage).get("num_predict_per_row", 0)
+
+
+def split_frame(df, render, max_tokens, keys=("Product Line", "Region"), row_tokens=0):
+    """
+    Splits `df` into frames whose block `render(frame)`, plus `row_tokens` per row,
+    fits in `max_tokens`.
+
+    Rows of one product line stay in one chunk; a product line too large on its own
+    is split by region, and a region too large on its own by rows.
+    """
+    import pandas as pd
+
+    def size(frame):
+        return estimate_tokens(render(frame)) + row_tokens * len(frame)
+
+    key = next((k for k in keys if k in df.columns), None)
+    if key is not None:
+        groups = [group for _, group in df.groupby(key, sort=False)]
+        rest = keys[keys.index(key) + 1:]
+    else:
+        groups = [df.iloc[[i]] for i in range(len(df))]
+        rest = ()
+
+    chunks, current = [], []
+    for group in groups:
+        if len(group) > 1 and size(group) > max_tokens:
+            if current:
+                chunks.append(pd.concat(current))
+                current = []
+            chunks.extend(split_frame(group, render, max_tokens, rest, row_tokens))
+            continue
+        if current and size(pd.concat(current + [group])) > max_tokens:
+            chunks.append(pd.concat(current))
+            current = []
+        current.append(group)
+    if current:
+        chunks.append(pd.concat(current))
+
+    for chunk in chunks:
+        if size(chunk) > max_tokens:
+            logging.warning('----- Chunk of %s rows does not fit in ~%s tokens -----', len(chunk), max_tokens)
+    return chunks
+
+
+def map_chunks(chunks, compute, workers=None):
+    """
+    `compute(index, chunk)` over every chunk side by side, results in chunk order.
+    CHUNK_WORKERS (default 4) limits the calls running at once.
+    """
+    ledger = get_ledger()
+    area = (ledger.business_area, ledger.product_area)
+
+    def run(index, chunk):
+        # The area of the ledger is per thread
+        ledger.set_area(*area)
+        return compute(index, chunk)
+
+    workers = workers or int(os.getenv("CHUNK_WORKERS", "4"))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chunk") as executor:
+        return list(executor.map(run, range(len(chunks)), chunks))
+
+
+def reduce_texts(texts, combine, max_tokens, sep="\n\n"):
+    """
+    Joins the chunk results, merging groups of them with `combine(index, texts) -> text`
+    side by side until the joined text fits in `max_tokens`.
+    """
+    while len(texts) > 1 and estimate_tokens(sep.join(texts)) > max_tokens:
+        groups, current = [], []
+        for text in texts:
+            if current and estimate_tokens(sep.join(current + [text])) > max_tokens:
+                groups.append(current)
+                current = []
+            current.append(text)
+        groups.append(current)
+        if len(groups) == len(texts):
+            # Every result fills the budget on its own, merging cannot make it shorter
+            logging.warning('----- %s chunk results do not fit in ~%s tokens -----', len(texts), max_tokens)
+            break
+        logging.info('----- Reducing %s chunk results in %s groups -----', len(texts), len(groups))
+        texts = map_chunks(groups, combine)
+    return sep.join(texts)
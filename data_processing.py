@@ -1,25 +1,207 @@
+import copy
+import logging
 import pandas as pd
 import numpy as np
+from fingerprints import file_fingerprint
+from snapshots import enabled as snapshots_enabled, snapshot_path, read_snapshot, write_snapshot
+
+BUSINESS_AREA = "DimProduct[Business Area Code]"
+PRODUCT_AREA = "DimProduct[Product Area Code]"
+PRODUCT_LINE = "DimProduct[Product Line Code]"
+REGION = "DimMarketGeo[Region Label Geo]"
+COUNTRY = "DimMarketGeo[Country Code Geo]"
+
+DROPPED_COLUMNS = ['[v_Value_cper_FormatString]', '[v_Value_mper_FormatString]', '[Book_to_Bill_mper]',
+                   '[Value___Share_mper]', '[Value___Share_diff]']
+# Country codes reported as their own region (compared in lower case)
+CHINA_CODES = ['china', 'cn']
+US_CODES = ['USA', 'us', 'US']
+
+# Groupings the drivers_* queries sum [Difference] over: (keys, with China and US as their own regions)
+GRAINS = {
+    "product_area": ([BUSINESS_AREA, PRODUCT_AREA], False),
+    "product_area_region": ([BUSINESS_AREA, PRODUCT_AREA, REGION], False),
+    "product_line_region": ([BUSINESS_AREA, PRODUCT_AREA, PRODUCT_LINE, REGION], False),
+    "product_line_region_substituted": ([BUSINESS_AREA, PRODUCT_AREA, PRODUCT_LINE, REGION], True),
+    "business_area_product_line_region_substituted": ([BUSINESS_AREA, PRODUCT_LINE, REGION], True),
+}
+AGGREGATE_KEYS = {BUSINESS_AREA: "Business Area", PRODUCT_AREA: "Product Area", PRODUCT_LINE: "Product Line",
+                  REGION: "Region"}
+
+# Everything the aggregates depend on besides the file; a snapshot computed with another
+# configuration is not used. Bump the version when the aggregation itself changes.
+SNAPSHOT_CONFIG = {"version": 2, "dropped": DROPPED_COLUMNS, "fill": 0, "china": CHINA_CODES, "us": US_CODES,
+                   "grains": GRAINS}
+
+
+def substituted_regions(df):
+    """The region column of `df` with China and US as their own regions."""
+    country = df[COUNTRY].astype(str).str.strip().str.lower()
+    return np.where(country.isin(CHINA_CODES), 'China', np.where(country.isin(US_CODES), 'US', df[REGION]))
+
 
 class DataHandler:
     """Class for handling preprocessing."""
 
+    # Set by _load, or left unset when the aggregates come from a snapshot and no query needed the rows yet
+    _df = None
+    _positions = None
+    _aggregates = None
+    # Memory-mapped Arrow table of the aggregates when they come from a snapshot
+    _table = None
+    # Grains computed, and (grain, business area, product area) -> (start, stop) of its aggregate rows
+    _grains = ()
+    _ranges = None
+    # Columns of the cleaned rows, from the snapshot metadata until the rows are read
+    _columns = None
+    # (column, factor) applied by transform_data, also to rows read after it
+    _scaling = ()
+
     def __init__(self, file_path):
-        """Loads the dataset and cleans it upon initialization."""
-        self.df = pd.read_csv(file_path, sep=';')
+        """
+        Loads the dataset and cleans it upon initialization. With an aggregate snapshot of
+        the same file (see snapshots), the file is only read when a query needs its rows.
+        """
+        self.file_path = file_path
+        # Identifies the export in the job journal, independent of the file name
+        self.source_fingerprint = file_fingerprint(file_path)
+        # Period the summaries are stored under, None uses the REPORT_PERIOD of the workflow
+        self.period = None
+
+        path = snapshot_path(self.source_fingerprint, SNAPSHOT_CONFIG) if snapshots_enabled() else None
+        snapshot = read_snapshot(path) if path else None
+        if snapshot is not None:
+            self._table, metadata = snapshot
+            self._grains = metadata["grains"]
+            self._ranges = {(grain, business_area, product_area): (start, stop)
+                            for grain, business_area, product_area, start, stop in metadata["ranges"]}
+            self.cper_total = metadata["cper_total"]
+            self.mper_total = metadata["mper_total"]
+            self._columns = metadata["columns"]
+            logging.info('----- Aggregates of %s from snapshot %s -----', file_path, path)
+            return
+
+        self._load(pd.read_csv(file_path, sep=';'))
+        if path:
+            metadata = {"source_fingerprint": self.source_fingerprint, "cper_total": float(self.cper_total),
+                        "mper_total": float(self.mper_total), "columns": list(self.df.columns)}
+            aggregates = self.aggregates()
+            metadata["grains"] = list(self._grains)
+            metadata["ranges"] = [[*key, start, stop] for key, (start, stop) in self._ranges.items()]
+            if write_snapshot(path, aggregates, metadata):
+                logging.info('----- Aggregates of %s stored in snapshot %s -----', file_path, path)
+
+    @classmethod
+    def from_frame(cls, df, file_path=None, source_fingerprint=None, period=None):
+        """Handler over a frame in the layout of the wide exports, e.g. one comparison of a MultiPeriodDataHandler."""
+        handler = cls.__new__(cls)
+        handler.file_path = file_path
+        handler.source_fingerprint = source_fingerprint
+        handler.period = period
+        handler._load(df)
+        return handler
+
+    def _load(self, df):
+        self.df = df
         self.cper_total = self.df['[Value_cper]'].sum()
         self.mper_total = self.df['[Value_mper]'].sum()
         self._clean_data()
 
+    @property
+    def df(self):
+        """Cleaned rows of the export, read on first use when the handler was opened from a snapshot."""
+        if self._df is None:
+            self._df = pd.read_csv(self.file_path, sep=';')
+            self._clean_data()
+            for col, factor in self._scaling:
+                self._df[col] = self._df[col] * factor + factor * self._df[col]
+        return self._df
+
+    @df.setter
+    def df(self, df):
+        self._df = df
+
+    def _column_names(self):
+        return list(self._df.columns) if self._df is not None else self._columns
+
+    def copy(self):
+        """Handler over a copy of the cleaned data, for callers that modify it (e.g. transform_data)."""
+        handler = copy.copy(self)
+        if self._df is not None:
+            handler.df = self._df.copy()
+        return handler
+
     def _clean_data(self):
         """Private method: Cleans the dataset by removing unnecessary columns and filling missing values."""
-        self.df.drop(columns=['[v_Value_cper_FormatString]', '[v_Value_mper_FormatString]', '[Book_to_Bill_mper]',
-                              '[Value___Share_mper]', '[Value___Share_diff]'], errors='ignore', inplace=True)
+        self.df.drop(columns=DROPPED_COLUMNS, errors='ignore', inplace=True)
         self.df.fillna(0, inplace=True)
         self.df['[Difference]'] = self.df['[Value_mper]'] - self.df['[Value_cper]']
         self.df['[Delta]'] = (1 - self.df['[Difference]'] / self.df['[Value_cper]']) * 100
         self.df = self.df.drop(columns=['[Value_cper]', '[Value_mper]'], errors='ignore')
 
+    def aggregates(self):
+        """
+        [Difference] summed per grain (see GRAINS) over the whole dataset, in one long frame with
+        'Grain', 'Business Area', 'Product Area', 'Product Line', 'Region' and 'Total Difference'.
+        Keys a grain does not group by are empty, the rows are sorted by grain and keys. Computed
+        once, the drivers_* queries read from it (or from the snapshot table, see _aggregate_rows).
+        """
+        if self._aggregates is None and self._table is not None:
+            self._aggregates = self._table.to_pandas()
+        elif self._aggregates is None:
+            df = self.df
+            regions = substituted_regions(df) if {REGION, COUNTRY} <= set(df.columns) else None
+            frames = []
+            for grain, (keys, substituted) in GRAINS.items():
+                if not set(keys + ['[Difference]']) <= set(df.columns) or (substituted and regions is None):
+                    continue  # the query answers with an empty frame, as it did on the rows
+                rows = df[keys + ['[Difference]']]
+                if substituted:
+                    rows = rows.assign(**{REGION: regions})
+                grouped = rows.groupby(keys)['[Difference]'].sum().reset_index()
+                frames.append(grouped.rename(columns={**AGGREGATE_KEYS, '[Difference]': "Total Difference"})
+                              .assign(Grain=grain))
+            aggregates = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+            aggregates = aggregates.reindex(columns=["Grain"] + list(AGGREGATE_KEYS.values()) + ["Total Difference"])
+            aggregates[list(AGGREGATE_KEYS.values())] = aggregates[list(AGGREGATE_KEYS.values())].fillna("")
+            self._aggregates = aggregates
+            self._grains = list(dict.fromkeys(aggregates["Grain"]))
+            # Sorted by grain, business area and product area, so the rows of each are one run
+            positions = aggregates.groupby(["Grain", "Business Area", "Product Area"], sort=False).indices
+            self._ranges = {tuple(part.item() if isinstance(part, np.generic) else part for part in key):
+                            (int(rows[0]), int(rows[-1]) + 1) for key, rows in positions.items()}
+        return self._aggregates
+
+    def _aggregate_rows(self, start, stop):
+        """Aggregate rows start:stop; from a snapshot only these rows are converted from the memory map."""
+        if self._aggregates is None and self._table is not None:
+            return self._table.slice(start, stop - start).to_pandas()
+        return self.aggregates().iloc[start:stop]
+
+    def _sums(self, grain, business_area, product_area=None):
+        """
+        Rows of `grain` for a business area (and product area) with the key columns under their
+        dataset names and the sum as '[Difference]', as the groupby over the rows would give them.
+        None when the dataset lacks a column of the grain.
+        """
+        if self._ranges is None:
+            self.aggregates()
+        if grain not in self._grains:
+            return None
+        if product_area is None:
+            # The product areas of a business area follow each other
+            ranges = [bounds for (name, area, _), bounds in self._ranges.items()
+                      if name == grain and area == business_area]
+            start, stop = (min(r[0] for r in ranges), max(r[1] for r in ranges)) if ranges else (0, 0)
+        else:
+            start, stop = self._ranges.get((grain, business_area, product_area), (0, 0))
+
+        keys = [key for key in GRAINS[grain][0] if key != BUSINESS_AREA and not (key == PRODUCT_AREA and product_area)]
+        names = {AGGREGATE_KEYS[key]: key for key in keys}
+        return (self._aggregate_rows(start, stop)[list(names) + ["Total Difference"]]
+                .rename(columns={**names, "Total Difference": '[Difference]'})
+                .reset_index(drop=True))
+
     def get_dataset(self    ):
         return self.df
 
@@ -30,13 +212,46 @@ class DataHandler:
         return self.mper_total
 
     def filter_mper_cper(self):
+        # _clean_data already dropped them
         return self.df.drop(columns=['[Value_mper]', '[Value_cper]'], errors='ignore')
 
+    def _row_positions(self, business_area, product_area=None):
+        """
+        Positions of the rows of an area, from an index of every area built once per dataset.
+        transform_data only rescales values, so the index stays valid for copies of the handler.
+        """
+        if self._positions is None:
+            by_area = {}
+            if PRODUCT_AREA in self.df.columns:
+                by_area = self.df.groupby([BUSINESS_AREA, PRODUCT_AREA], sort=False).indices
+            self._positions = (self.df.groupby(BUSINESS_AREA, sort=False).indices, by_area)
+
+        by_business_area, by_area = self._positions
+        empty = np.array([], dtype=np.intp)
+        if product_area is None:
+            return by_business_area.get(business_area, empty)
+        if business_area is None:
+            # The product area in every business area, in the order of the dataset
+            parts = [positions for (_, area), positions in by_area.items() if area == product_area]
+            return np.sort(np.concatenate(parts)) if parts else empty
+        return by_area.get((business_area, product_area), empty)
+
+    def _rows(self, business_area, product_area=None, columns=None):
+        """
+        Rows of a business area (and product area) with only `columns`. The rows are taken by
+        position column by column, so a query copies the rows it returns and nothing else:
+        no mask over the whole dataset and no columns it does not read.
+        """
+        positions = self._row_positions(business_area, product_area)
+        columns = [col for col in columns if col in self.df.columns] if columns is not None else self.df.columns
+        return pd.DataFrame({col: self.df[col].take(positions) for col in columns}, index=self.df.index[positions],
+                            columns=columns)
+
     def filter_by_business_area(self, business_code):
-        return self.df[self.df['DimProduct[Business Area Code]'] == business_code]
+        return self._rows(business_code)
 
     def filter_by_product_area(self, product_area):
-        return self.df[self.df['DimProduct[Product Area Code]'] == product_area]
+        return self._rows(None, product_area)
 
     def get_unique_business_areas(self):
         return self.df['DimProduct[Business Area Code]'].unique()
@@ -44,16 +259,14 @@ class DataHandler:
     def drivers_per_product_area(self, business_area):
         """Returns a DataFrame with two columns: 'Product Area' and 'Total Difference'."""
         
-        filtered_df = self.filter_by_business_area(business_area)
+        # Sums per Product Area, from the aggregates of the dataset
+        grouped = self._sums("product_area", business_area)
         
     
-        if "DimProduct[Product Area Code]" in filtered_df.columns:
+        if grouped is not None:
             
-          # Group by Product Area and sum the differences
             df_grouped = (
-                filtered_df.groupby("DimProduct[Product Area Code]")['[Difference]']
-                .sum()
-                .reset_index() 
+                grouped
                 .rename(columns={"DimProduct[Product Area Code]": "Product Area", "[Difference]": "Total Difference"})  
                 .sort_values(by="Total Difference", ascending=False)  
             )
@@ -65,18 +278,14 @@ class DataHandler:
     def drivers_per_product_area_regions(self, business_area):
         """Returns a DataFrame with three columns: 'Product Area', 'Region', and 'Total Difference'."""
         
-        # Filter the dataset for the given business area
-        filtered_df = self.filter_by_business_area(business_area)
-        
-        # Check if required columns exist
-        required_columns = ["DimProduct[Product Area Code]", "DimMarketGeo[Region Label Geo]", "[Difference]"]
-        if all(col in filtered_df.columns for col in required_columns):
+        # Sums per Product Area and Region, from the aggregates of the dataset
+        grouped = self._sums("product_area_region", business_area)
+
+        # None when the dataset lacks one of the columns
+        if grouped is not None:
             
-            # Group by Product Area and Region, then sum the differences
             df_grouped = (
-                filtered_df.groupby(["DimProduct[Product Area Code]", "DimMarketGeo[Region Label Geo]"])['[Difference]']
-                .sum()
-                .reset_index() 
+                grouped
                 .rename(columns={
                     "DimProduct[Product Area Code]": "Product Area",
                     "DimMarketGeo[Region Label Geo]": "Region",
@@ -89,24 +298,20 @@ class DataHandler:
         
         return pd.DataFrame(columns=["Product Area", "Region", "Total Difference"])  
     
-    def region_substitute(self, business_area):
-
-        df = self.filter_by_business_area(business_area).copy()
-
-        # Get relevant columns
-        region_col = 'DimMarketGeo[Region Label Geo]'
-        country_code_col = 'DimMarketGeo[Country Code Geo]'
+    def region_substitute(self, business_area, product_area=None, columns=None):
+        """
+        Rows of a business area (and product area) with China and US as their own regions.
+        Only `columns` (default all) are taken; the region is replaced in the taken rows,
+        the dataset itself is not modified.
+        """
+        if columns is not None:
+            columns = list(dict.fromkeys(list(columns) + [REGION, COUNTRY]))
+        df = self._rows(business_area, product_area, columns)
+        if REGION not in df.columns or COUNTRY not in df.columns:
+            return df
 
-        df[region_col] = df.apply(
-        lambda row: 'China' if str(row[country_code_col]).strip().lower() in ['china', 'cn']
-        else row[region_col],
-        axis=1
-    )
-        df[region_col] = df.apply(
-        lambda row: 'US' if str(row[country_code_col]).strip().lower() in ['USA', 'us', 'US']
-        else row[region_col],
-        axis=1
-    )
+        df = df.copy()
+        df[REGION] = substituted_regions(df)
 
         return df
 
@@ -117,18 +322,14 @@ class DataHandler:
         'Business Area Contribution %' for a specific Business Area, without filtering on Product Area.
         """
 
-        # Filter the dataset for the given business area
-        filtered_df = self.region_substitute(business_area)
+        # Sums per Product Line and Region with China and US as regions, from the aggregates of the dataset
+        grouped = self._sums("business_area_product_line_region_substituted", business_area)
 
-        # Check if required columns exist
-        required_columns = ["DimProduct[Product Line Code]", "DimMarketGeo[Region Label Geo]", "[Difference]"]
-        if all(col in filtered_df.columns for col in required_columns):
+        # None when the dataset lacks one of the columns
+        if grouped is not None:
 
-            # Group by Product Line and Region, then sum the differences
             df_grouped = (
-                filtered_df.groupby(["DimProduct[Product Line Code]", "DimMarketGeo[Region Label Geo]"])['[Difference]']
-                .sum()
-                .reset_index()
+                grouped
                 .rename(columns={
                     "DimProduct[Product Line Code]": "Product Line",
                     "DimMarketGeo[Region Label Geo]": "Region",
@@ -170,18 +371,14 @@ class DataHandler:
         'Business Area Contribution %' for a specific Business Area, without filtering on Product Area.
         """
 
-        # Filter the dataset for the given business area
-        filtered_df = self.region_substitute(business_area)
+        # Sums per Product Line and Region with China and US as regions, from the aggregates of the dataset
+        grouped = self._sums("business_area_product_line_region_substituted", business_area)
 
-        # Check if required columns exist
-        required_columns = ["DimProduct[Product Line Code]", "DimMarketGeo[Region Label Geo]", "[Difference]"]
-        if all(col in filtered_df.columns for col in required_columns):
+        # None when the dataset lacks one of the columns
+        if grouped is not None:
 
-            # Group by Product Line and Region, then sum the differences
             df_grouped = (
-                filtered_df.groupby(["DimProduct[Product Line Code]", "DimMarketGeo[Region Label Geo]"])['[Difference]']
-                .sum()
-                .reset_index()
+                grouped
                 .rename(columns={
                     "DimProduct[Product Line Code]": "Product Line",
                     "DimMarketGeo[Region Label Geo]": "Region",
@@ -211,21 +408,14 @@ class DataHandler:
         """Returns a DataFrame with 'Product Line', 'Region', and 'Total Difference' 
         for a specific Business Area and Product Area."""
         
-        # Filter the dataset for the given business area
-        filtered_df = self.filter_by_business_area(business_area)
-        
-        # Further filter by product area
-        filtered_df = filtered_df[filtered_df["DimProduct[Product Area Code]"] == product_area]
-        
-        # Check if required columns exist
-        required_columns = ["DimProduct[Product Line Code]", "DimMarketGeo[Region Label Geo]", "[Difference]"]
-        if all(col in filtered_df.columns for col in required_columns):
+        # Sums per Product Line and Region of the product area, from the aggregates of the dataset
+        grouped = self._sums("product_line_region", business_area, product_area)
+
+        # None when the dataset lacks one of the columns
+        if grouped is not None:
             
-            # Group by Product Line and Region, then sum the differences
             df_grouped = (
-                filtered_df.groupby(["DimProduct[Product Line Code]", "DimMarketGeo[Region Label Geo]"])['[Difference]']
-                .sum()
-                .reset_index()  
+                grouped
                 .rename(columns={
                     "DimProduct[Product Line Code]": "Product Line",
                     "DimMarketGeo[Region Label Geo]": "Region",
@@ -244,20 +434,15 @@ class DataHandler:
         for a specific Business Area and Product Area."""
         
         
-        filtered_df = self.region_substitute(business_area)
-        
-        # Further filter by product area
-        filtered_df = filtered_df[filtered_df["DimProduct[Product Area Code]"] == product_area]
-        
-        # Check if required columns exist
-        required_columns = ["DimProduct[Product Line Code]", "DimMarketGeo[Region Label Geo]", "[Difference]"]
-        if all(col in filtered_df.columns for col in required_columns):
+        # Sums per Product Line and Region of the product area with China and US as regions,
+        # from the aggregates of the dataset
+        grouped = self._sums("product_line_region_substituted", business_area, product_area)
+
+        # None when the dataset lacks one of the columns
+        if grouped is not None:
             
-            # Group by Product Line and Region, then sum the differences
             df_grouped = (
-                filtered_df.groupby(["DimProduct[Product Line Code]", "DimMarketGeo[Region Label Geo]"])['[Difference]']
-                .sum()
-                .reset_index()  
+                grouped
                 .rename(columns={
                     "DimProduct[Product Line Code]": "Product Line",
                     "DimMarketGeo[Region Label Geo]": "Region",
@@ -315,6 +500,73 @@ class DataHandler:
         return df
 
 
+    def computed_pre_analysis(self, business_area, product_area=None, top_n=3):
+        """
+        Derives in pandas what the natural_language and analysis_of_data LLM stages work out:
+        - direction of change per Product Line and Region
+        - whether a product line moved in the same direction in all its regions
+        - the top positive and negative Product Line + Region drivers
+        Without a product area the whole business area is analysed (as for LISC).
+        """
+        if product_area is None:
+            df = self.drivers_in_business_area_region_relative(business_area)
+        else:
+            df = self.preprocess_orderintake_by_product_area(business_area, product_area)
+
+        if df.empty or "Change Type" not in df.columns:
+            return {
+                "directions": pd.DataFrame(columns=["Product Line", "Region", "Direction", "Change Type"]),
+                "consistency": pd.DataFrame(columns=["Product Line", "Regions", "Consistency", "Consistent"]),
+                "top_positive": pd.DataFrame(columns=["Product Line", "Region", "Change Type"]),
+                "top_negative": pd.DataFrame(columns=["Product Line", "Region", "Change Type"]),
+            }
+
+        df = df.copy()
+        df["Direction"] = np.select(
+            [df["Total Difference"] > 0, df["Total Difference"] < 0], ["up", "down"], default="flat"
+        )
+
+        # Product lines with the largest absolute movement first
+        pl_impact = df.groupby("Product Line")["Total Difference"].apply(lambda x: x.abs().sum())
+        consistency = (
+            df.groupby("Product Line")
+            .agg(
+                Regions=("Region", "nunique"),
+                Up=("Direction", lambda d: (d == "up").sum()),
+                Down=("Direction", lambda d: (d == "down").sum()),
+            )
+            .loc[pl_impact.sort_values(ascending=False).index]
+            .reset_index()
+        )
+        consistency["Consistency"] = np.select(
+            [
+                consistency["Regions"] == 1,
+                consistency["Up"] == consistency["Regions"],
+                consistency["Down"] == consistency["Regions"],
+            ],
+            ["single region", "up in all regions", "down in all regions"],
+            default="mixed",
+        )
+        consistency["Consistent"] = consistency["Consistency"] != "mixed"
+
+        columns = ["Product Line", "Region", "Change Type"]
+        top_positive = df[df["Total Difference"] > 0].nlargest(top_n, "Total Difference")[columns]
+        top_negative = df[df["Total Difference"] < 0].nsmallest(top_n, "Total Difference")[columns]
+
+        directions = (
+            df.assign(_impact=df["Total Difference"].abs())
+            .sort_values(by=["Product Line", "_impact"], ascending=[True, False])
+            [["Product Line", "Region", "Direction", "Change Type"]]
+        )
+
+        return {
+            "directions": directions.reset_index(drop=True),
+            "consistency": consistency[["Product Line", "Regions", "Consistency", "Consistent"]],
+            "top_positive": top_positive.reset_index(drop=True),
+            "top_negative": top_negative.reset_index(drop=True),
+        }
+
+
     def get_largest_driver(self):
         """Finds the product area with the largest impact."""
         drivers = self.drivers_per_product_area()
@@ -325,10 +577,18 @@ class DataHandler:
         scaling_factors = {}
 
         for col in columns_to_anonymize:
-            if col in self.df.columns:
+            if col in self._column_names():
                 factor = np.random.uniform(*scaling_range)
                 print(factor)
-                self.df[col] = self.df[col] * factor + factor * self.df[col]
+                if self._df is not None:
+                    self.df[col] = self.df[col] * factor + factor * self.df[col]
+                else:
+                    # Applied when a query reads the rows
+                    self._scaling = self._scaling + ((col, factor),)
+                if col == '[Difference]' and self._ranges is not None:
+                    # Sums of the rescaled rows, on a new frame: copies of the handler share the aggregates
+                    total = self.aggregates()["Total Difference"]
+                    self._aggregates = self._aggregates.assign(**{"Total Difference": total * factor + factor * total})
                 scaling_factors[col] = factor
             else:
                 print(f"Warning: Column '{col}' not found in the dataset.")
@@ -337,3 +597,79 @@ class DataHandler:
            print(f"  {col}: {factor:.3f}")
 
         return 
+
+
+class MultiPeriodDataHandler:
+    """
+    Long-format export with the period as a dimension: one row per period and dimension
+    values, with a single value column instead of [Value_cper] and [Value_mper].
+
+    The file is read once and pivoted to one value column per period, so every comparison
+    is a column operation. `compare` gives the DataHandler of one pair of periods for the
+    workflows, `differences` and `contributions` compute many pairs at once.
+    """
+
+    def __init__(self, file_path, period_column="[Period]", value_column="[Value]"):
+        self.file_path = file_path
+        self.source_fingerprint = file_fingerprint(file_path)
+        df = pd.read_csv(file_path, sep=';', dtype={period_column: str})
+        df = df.drop(columns=[col for col in df.columns if col.endswith('_FormatString]')])
+
+        self.dimensions = [col for col in df.columns if col not in (period_column, value_column)]
+        # Rows with an empty dimension would be dropped by the groupby
+        df[self.dimensions] = df[self.dimensions].fillna("")
+        self.values = (
+            df.groupby(self.dimensions + [period_column])[value_column]
+            .sum()
+            .unstack(period_column, fill_value=0.0)
+        )
+        self.periods = sorted(self.values.columns)
+
+    def rolling_pairs(self, window=1):
+        """(base, target) for every period against the one `window` periods before, e.g. 12 for year over year."""
+        return [(self.periods[i - window], self.periods[i]) for i in range(window, len(self.periods))]
+
+    def compare(self, base, target):
+        """DataHandler of the change from `base` to `target`, as if it had been read from a wide export."""
+        frame = self.values[[base, target]].set_axis(['[Value_cper]', '[Value_mper]'], axis=1).reset_index()
+        return DataHandler.from_frame(frame, self.file_path, f"{self.source_fingerprint}:{base}:{target}",
+                                      period=f"{target} vs {base}")
+
+    def differences(self, pairs):
+        """
+        Every comparison in one long frame: the dimensions, 'Comparison', '[Value_cper]',
+        '[Value_mper]', '[Difference]' and '[Delta]', computed for all pairs in one array operation.
+        """
+        columns = pd.Index([f"{target} vs {base}" for base, target in pairs], name="Comparison")
+        base = pd.DataFrame(self.values[[base for base, _ in pairs]].to_numpy(), index=self.values.index, columns=columns)
+        target = pd.DataFrame(self.values[[target for _, target in pairs]].to_numpy(), index=self.values.index,
+                              columns=columns)
+
+        long = pd.DataFrame({'[Value_cper]': base.stack(), '[Value_mper]': target.stack()})
+        long['[Difference]'] = long['[Value_mper]'] - long['[Value_cper]']
+        long['[Delta]'] = (1 - long['[Difference]'] / long['[Value_cper]']) * 100
+        return long.reset_index()
+
+    def contributions(self, pairs, area="DimProduct[Product Area Code]"):
+        """
+        'Total Difference' and 'Contribution %' per comparison, business area, `area`, product line
+        and region for all pairs in one groupby. Contributions are relative to the total of the area
+        in the comparison, with the sign rule and region substitution of DataHandler.
+        """
+        long = self.differences(pairs)
+
+        long[REGION] = substituted_regions(long)
+
+        area_keys = list(dict.fromkeys(["Comparison", "DimProduct[Business Area Code]", area]))
+        keys = area_keys + ["DimProduct[Product Line Code]", "DimMarketGeo[Region Label Geo]"]
+        grouped = long.groupby(keys)['[Difference]'].sum().rename("Total Difference").reset_index()
+
+        totals = grouped.groupby(area_keys)["Total Difference"].transform("sum")
+        grouped["Contribution %"] = grouped["Total Difference"] / totals * np.where(totals < 0, -100, 100)
+
+        return grouped.rename(columns={
+            "DimProduct[Business Area Code]": "Business Area",
+            "DimProduct[Product Area Code]": "Product Area",
+            "DimProduct[Product Line Code]": "Product Line",
+            "DimMarketGeo[Region Label Geo]": "Region",
+        })
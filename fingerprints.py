@@ -0,0 +1,74 @@
+import hashlib
+
+
+def file_fingerprint(path, chunk_size=1 << 20):
+    """SHA-1 of the file contents, identifies one export independent of its file name."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def config_fingerprint(source, **settings):
+    """
+    SHA-1 of what the results of a report depend on besides their input: the `source`
+    file holding its prompts and model names, and the `settings` that change them.
+    """
+    digest = hashlib.sha1(file_fingerprint(source).encode("utf-8"))
+    for name, value in sorted(settings.items()):
+        digest.update(f"{name}={value}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def frame_fingerprint(df, columns=None, decimals=6):
+    """
+    SHA-1 of an aggregated frame such as the drivers_in_*_relative output.
+
+    Rows are sorted first so the fingerprint does not depend on row order, and
+    floats are rounded to `decimals` so recomputing the same aggregate gives the
+    same fingerprint. `columns` limits the fingerprint to the columns a summary
+    depends on.
+    """
+    import pandas as pd
+
+    if columns is not None:
+        df = df[[col for col in columns if col in df.columns]]
+    df = df.round(decimals)
+    df = df.sort_values(by=list(df.columns)).reset_index(drop=True)
+
+    digest = hashlib.sha1("|".join(map(str, df.columns)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+def change_types(values):
+    """Major/Minor Increase/Decrease per value, the top quarter of absolute changes being major."""
+    threshold_major = values.abs().quantile(0.75)
+    return values.apply(lambda x:
+        "Major Increase" if x > threshold_major else
+        "Minor Increase" if x > 0 else
+        "Major Decrease" if x < -threshold_major else
+        "Minor Decrease"
+    )
+
+
+def shape_fingerprint(df, value_column="Total Difference"):
+    """
+    SHA-1 of the qualitative shape of an area: the direction of its overall change and
+    its (product line, region, change type, rank) rows, ranked by absolute change.
+
+    The prompts ask for summaries without numbers, so two frames with the same shape get
+    the same summary even when every value differs, e.g. after transform_data rescaled them.
+    """
+    keys = [col for col in ("Product Line", "Region") if col in df.columns]
+    ranked = df.assign(_abs=df[value_column].abs()).sort_values(by=["_abs"] + keys, ascending=[False] + [True] * len(keys))
+    kinds = ranked["Change Type"] if "Change Type" in ranked.columns else change_types(ranked[value_column])
+
+    overall = df[value_column].sum()
+    direction = "increase" if overall > 0 else "decrease" if overall < 0 else "unchanged"
+
+    digest = hashlib.sha1(f"{'|'.join(keys)}|{direction}\n".encode("utf-8"))
+    for rank, (row, kind) in enumerate(zip(ranked[keys].itertuples(index=False), kinds), start=1):
+        digest.update(f"{'|'.join(map(str, row))}|{kind}|{rank}\n".encode("utf-8"))
+    return digest.hexdigest()
@@ -0,0 +1,133 @@
+import copy
+import json
+import os
+import re
+
+
+# Ollama options per stage: num_predict caps the output tokens, generation ends at a stop sequence.
+# natural_language writes a sentence for every row of its data block, so num_predict_per_row is
+# added to its num_predict for each row. The summary rules ask for at most 4 sentences and no
+# code, so it stops at a code fence or a run of blank lines.
+DEFAULT_BUDGETS = {
+    "stages": {
+        "natural_language": {"num_predict": 150, "num_predict_per_row": 25},
+        "analysis_of_data": {"num_predict": 350},
+        "summary": {"num_predict": 200, "stop": ["```", "\n\n\n"]},
+        "validate_summary": {"num_predict": 250},
+    },
+    # Per model, for every stage ("*") or single stages. Reasoning models spend part of
+    # num_predict on their <think> trace, which may contain code fences and blank lines.
+    "models": {
+        "deepseek-r1:8b": {"*": {"num_predict": 1500, "stop": []}},
+    },
+}
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+
+def load_budgets(path=None):
+    """DEFAULT_BUDGETS, with stages and models overridden by a JSON file of the same layout (STAGE_BUDGETS_PATH)."""
+    budgets = copy.deepcopy(DEFAULT_BUDGETS)
+    path = path or os.getenv("STAGE_BUDGETS_PATH")
+    if path:
+        with open(path, encoding="utf-8") as f:
+            overrides = json.load(f)
+        budgets["stages"].update(overrides.get("stages", {}))
+        budgets["models"].update(overrides.get("models", {}))
+    return budgets
+
+
+_budgets = None
+
+
+def stage_budget(model, stage):
+    """Budget of the model and stage, model entries win. Empty with STAGE_BUDGETS=0."""
+    global _budgets
+    if os.getenv("STAGE_BUDGETS", "1") != "1" or stage is None:
+        return {}
+    if _budgets is None:
+        _budgets = load_budgets()
+
+    model_budgets = _budgets["models"].get(model, {})
+    return {**_budgets["stages"].get(stage, {}), **model_budgets.get("*", {}), **model_budgets.get(stage, {})}
+
+
+def stage_options(model, stage, options=None, rows=None):
+    """
+    `options` with the output budget and stop sequences of the model and stage added,
+    for a data block of `rows` rows. Options passed by the caller win. STAGE_BUDGETS=0
+    leaves them unchanged.
+    """
+    budget = stage_budget(model, stage)
+    if not budget:
+        return options
+
+    per_row = budget.pop("num_predict_per_row", 0)
+    if per_row and rows and "num_predict" in budget:
+        budget["num_predict"] += per_row * rows
+    if not budget.get("stop"):
+        budget.pop("stop", None)
+    return {**budget, **(options or {})}
+
+
+def strip_reasoning(text):
+    """(text without <think> blocks, the removed reasoning). An unclosed block runs to the end of the text."""
+    traces = []
+
+    def remove(match):
+        traces.append(match.group(1))
+        return ""
+
+    answer = re.sub(r"<think>(.*?)(?:</think>|$)", remove, text, flags=re.DOTALL)
+    return answer, "".join(traces)
+
+
+class ReasoningFilter:
+    """
+    Token callback that passes streamed tokens on to `on_token` without the <think> blocks.
+
+    Tags can be split across tokens, so text that could be the start of a tag is
+    held back until the next token decides it. The removed reasoning is kept in
+    `reasoning`. Call `close()` at the end of the stream to pass on the rest.
+    """
+
+    def __init__(self, on_token):
+        self.on_token = on_token
+        self.reasoning = ""
+        self._buffer = ""
+        self._thinking = False
+        self._answer_started = False
+
+    def __call__(self, token):
+        self._buffer += token
+        while self._buffer:
+            tag = THINK_CLOSE if self._thinking else THINK_OPEN
+            index = self._buffer.find(tag)
+            if index >= 0:
+                self._emit(self._buffer[:index])
+                self._buffer = self._buffer[index + len(tag):]
+                self._thinking = not self._thinking
+                continue
+            # Keep a possible partial tag at the end of the buffer
+            keep = next((n for n in range(len(tag) - 1, 0, -1) if self._buffer.endswith(tag[:n])), 0)
+            self._emit(self._buffer[:len(self._buffer) - keep])
+            self._buffer = self._buffer[len(self._buffer) - keep:]
+            break
+
+    def _emit(self, text):
+        if not text:
+            return
+        if self._thinking:
+            self.reasoning += text
+            return
+        if not self._answer_started:
+            # Whitespace between the trace and the answer is not part of the answer
+            text = text.lstrip()
+            self._answer_started = bool(text)
+        if text:
+            self.on_token(text)
+
+    def close(self):
+        self._emit(self._buffer)
+        self._buffer = ""
@@ -0,0 +1,165 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from ollama_client import ManagedOllamaClient, request_timeout
+from usage_ledger import get_ledger
+
+
+def host_error(error):
+    """
+    True when `error` means the host is gone: no connection could be made or it was lost.
+    A read timeout is not, the host may only be busy with a long generation.
+    """
+    import httpx
+
+    return isinstance(error, (ConnectionError, httpx.ConnectTimeout, httpx.NetworkError))
+
+
+class OllamaHost:
+    """
+    One Ollama server of the pool with its own client, health and count of requests in flight.
+    Health checks use a client of their own with the short `health_timeout`, so a host that
+    does not answer is known to be down within seconds, whatever the request timeout.
+    """
+
+    def __init__(self, url, keep_alive="30m", timeout=None, health_timeout=2.0):
+        import ollama
+
+        self.url = url
+        self.client = ManagedOllamaClient(host=url, keep_alive=keep_alive, unload_previous=False, timeout=timeout)
+        self.health_client = ollama.Client(host=url, timeout=health_timeout)
+        self.healthy = True
+        self.outstanding = 0
+        self.checked_at = None
+
+    def check(self):
+        """Lists the models of the server, a host that does not answer is marked unhealthy."""
+        try:
+            self.health_client.list()
+            self.healthy = True
+        except Exception as error:
+            self.healthy = False
+            logging.warning('----- Ollama host %s unhealthy: %s -----', self.url, error)
+        self.checked_at = time.monotonic()
+        return self.healthy
+
+
+class HostPool:
+    """
+    Ollama servers that requests are spread over.
+
+    A request goes to the healthy host with the fewest requests in flight, then the fewest
+    pinned areas. The stages of one area are pinned to the host that served the area first,
+    so its model and the cached prompt prefix (role, context and rules) are reused there;
+    an area only moves when its host has more than `pin_slack` requests in flight beyond
+    the least busy host, or goes down.
+
+    The hosts are checked side by side when the pool is created. Unhealthy hosts are checked
+    again every `check_interval` seconds by a background thread, never on the request path.
+    """
+
+    def __init__(self, urls, keep_alive="30m", timeout=None, check_interval=30.0, pin_slack=1, health_timeout=2.0):
+        self.hosts = [OllamaHost(url, keep_alive, timeout, health_timeout) for url in urls]
+        self.check_interval = check_interval
+        self.pin_slack = pin_slack
+        self.pins = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._check(self.hosts)
+        threading.Thread(target=self._watch, name="ollama-health", daemon=True).start()
+
+    def _check(self, hosts):
+        if not hosts:
+            return []
+        with ThreadPoolExecutor(max_workers=len(hosts), thread_name_prefix="ollama-health") as executor:
+            return list(executor.map(lambda host: host.check(), hosts))
+
+    def _watch(self):
+        while not self._stopped.wait(min(self.check_interval, 1.0)):
+            now = time.monotonic()
+            due = [host for host in self.hosts if not host.healthy and now - host.checked_at >= self.check_interval]
+            for host, healthy in zip(due, self._check(due)):
+                if healthy:
+                    logging.info('----- Ollama host %s is back -----', host.url)
+
+    def close(self):
+        """Stops the background health checks."""
+        self._stopped.set()
+
+    def choose(self, affinity=None, exclude=()):
+        """Host for the next request of `affinity` (e.g. the area), None when no healthy host is left."""
+        with self._lock:
+            candidates = [host for host in self.hosts if host.healthy and host not in exclude]
+            if not candidates:
+                return None
+            # Ties go to the host with the fewest pinned areas, so areas spread over the hosts
+            pinned_areas = {host: sum(1 for pinned in self.pins.values() if pinned is host) for host in candidates}
+            least = min(candidates, key=lambda host: (host.outstanding, pinned_areas[host]))
+            pinned = self.pins.get(affinity)
+            if pinned in candidates and pinned.outstanding <= least.outstanding + self.pin_slack:
+                host = pinned
+            else:
+                host = least
+                if affinity is not None and pinned not in candidates:
+                    self.pins[affinity] = host
+            host.outstanding += 1
+            return host
+
+    def release(self, host):
+        with self._lock:
+            host.outstanding -= 1
+
+    @contextmanager
+    def acquire(self, affinity=None, exclude=()):
+        host = self.choose(affinity, exclude)
+        try:
+            yield host
+        finally:
+            if host is not None:
+                self.release(host)
+
+    def mark_down(self, host, error):
+        host.healthy = False
+        host.checked_at = time.monotonic()
+        with self._lock:
+            # Areas pinned to the host are pinned again by their next request
+            self.pins = {affinity: pinned for affinity, pinned in self.pins.items() if pinned is not host}
+        logging.warning('----- Ollama host %s down (%s), failing over -----', host.url, error)
+
+    def status(self):
+        return {host.url: {"healthy": host.healthy, "outstanding": host.outstanding,
+                           "pinned": sum(1 for pinned in self.pins.values() if pinned is host)}
+                for host in self.hosts}
+
+
+def area_affinity():
+    """The area of the current thread in the usage ledger, which every workflow sets before its stages."""
+    ledger = get_ledger()
+    if ledger.business_area is None:
+        return None
+    return ledger.business_area, ledger.product_area
+
+
+def pool_hosts():
+    """OLLAMA_HOSTS, e.g. "http://gpu1:11434,http://gpu2:11434"; empty when the workflows use one host."""
+    hosts = os.getenv("OLLAMA_HOSTS", "")
+    return [host.strip() for host in hosts.split(",") if host.strip()]
+
+
+def pool_from_env():
+    """
+    HostPool over OLLAMA_HOSTS with requests timing out after LLM_DEADLINE (OLLAMA_HEALTH_INTERVAL
+    in seconds, default 30, OLLAMA_HEALTH_TIMEOUT, default 2, OLLAMA_PIN_SLACK, default 1).
+    """
+    return HostPool(
+        pool_hosts(),
+        keep_alive=os.getenv("OLLAMA_KEEP_ALIVE", "30m"),
+        timeout=request_timeout(),
+        check_interval=float(os.getenv("OLLAMA_HEALTH_INTERVAL", "30")),
+        pin_slack=int(os.getenv("OLLAMA_PIN_SLACK", "1")),
+        health_timeout=float(os.getenv("OLLAMA_HEALTH_TIMEOUT", "2")),
+    )
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+
+class JobJournal:
+    """
+    Persistent record of finished report units.
+
+    A unit is one (dataset, business area, product area, stage) result of a report,
+    the script producing it, so two writers over the same data never share results.
+    Every result is appended to a JSON lines file and flushed to disk as soon as it
+    is produced, so a run that crashes or is interrupted can be restarted and
+    continues with the first unit that has not finished yet.
+
+    The dataset is identified by the fingerprint of the source file. Results can
+    also carry the fingerprint of the area's aggregated input frame; a new export
+    then reuses the last result of every area whose input did not change, as long
+    as it was produced with the same `config` (see fingerprints.config_fingerprint).
+    """
+
+    def __init__(self, report, path="job_journal.jsonl", config=None):
+        self.report = report
+        self.path = path
+        self.config = config
+        self._results = {}
+        # (business area, product area, stage) -> (input fingerprint, result) of the latest entry
+        self._latest = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def key(dataset, business_area, product_area, stage):
+        return (str(dataset), business_area or "", product_area or "", stage)
+
+    def input_fingerprint(self, fingerprint):
+        """Fingerprint of the input combined with the config, so other prompts or settings never reuse a result."""
+        if not fingerprint or not self.config:
+            return fingerprint
+        return hashlib.sha1(f"{fingerprint}|{self.config}".encode("utf-8")).hexdigest()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Last line of a run that was killed while writing
+                    continue
+                if entry.get("Report") != self.report:
+                    continue
+                key = (entry["Dataset"], entry["Business Area"], entry["Product Area"], entry["Stage"])
+                self._results[key] = entry["Result"]
+                if entry.get("Input Fingerprint"):
+                    self._latest[key[1:]] = (entry["Input Fingerprint"], entry["Result"])
+
+    def done(self, dataset, business_area, product_area, stage):
+        return self.key(dataset, business_area, product_area, stage) in self._results
+
+    def get(self, dataset, business_area, product_area, stage, default=None):
+        return self._results.get(self.key(dataset, business_area, product_area, stage), default)
+
+    def reusable(self, dataset, business_area, product_area, stage, fingerprint=None):
+        """True when `step` would return a stored result instead of computing one."""
+        key = self.key(dataset, business_area, product_area, stage)
+        fingerprint = self.input_fingerprint(fingerprint)
+        latest = self._latest.get(key[1:])
+        return key in self._results or bool(fingerprint and latest is not None and latest[0] == fingerprint)
+
+    def record(self, dataset, business_area, product_area, stage, result, fingerprint=None):
+        key = self.key(dataset, business_area, product_area, stage)
+        fingerprint = self.input_fingerprint(fingerprint)
+        entry = {
+            "Timestamp": datetime.now().isoformat(timespec="seconds"),
+            "Report": self.report,
+            "Dataset": key[0],
+            "Business Area": key[1],
+            "Product Area": key[2],
+            "Stage": stage,
+            "Input Fingerprint": fingerprint,
+            "Result": result,
+        }
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._results[key] = result
+            if fingerprint:
+                self._latest[key[1:]] = (fingerprint, result)
+        return result
+
+    def step(self, dataset, business_area, product_area, stage, compute, fingerprint=None):
+        """
+        Result of a unit from the journal, or from `compute()` which is then recorded.
+
+        With an input `fingerprint`, the latest result of the same area and stage is
+        reused when it was produced from the same input, whatever dataset it came from.
+        """
+        key = self.key(dataset, business_area, product_area, stage)
+        unit = "/".join(part for part in key[1:] if part)
+        if key in self._results:
+            logging.info('----- Resuming %s from journal -----', unit)
+            return self._results[key]
+
+        latest = self._latest.get(key[1:])
+        if fingerprint and latest is not None and latest[0] == self.input_fingerprint(fingerprint):
+            logging.info('----- Input of %s unchanged, reusing last result -----', unit)
+            result = latest[1]
+        else:
+            result = compute()
+        return self.record(dataset, business_area, product_area, stage, result, fingerprint)
+
+    def reset(self):
+        """Forgets every finished unit of the report so the next run starts from scratch."""
+        self._results = {}
+        self._latest = {}
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            kept = [line for line in f if f'"Report": {json.dumps(self.report)}' not in line]
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.writelines(kept)
+
+
+_journals = {}
+
+
+def get_journal(report, config=None):
+    """
+    Journal of one report, shared by the process (JOB_JOURNAL_PATH, default job_journal.jsonl).
+    RESUME=0 clears the report's units so every one is produced again.
+    """
+    if report not in _journals:
+        journal = JobJournal(report, os.getenv("JOB_JOURNAL_PATH", "job_journal.jsonl"), config)
+        if os.getenv("RESUME", "1") != "1":
+            journal.reset()
+        _journals[report] = journal
+    return _journals[report]
@@ -0,0 +1,564 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, wait, FIRST_COMPLETED
+
+from streaming import (
+    _build_metrics, log_metrics, stream_ollama_chat, complete_ollama_chat,
+    stream_openai_chat, complete_openai_chat,
+)
+from usage_ledger import get_ledger
+from ollama_client import get_client, request_timeout
+from host_pool import area_affinity, host_error, pool_hosts, pool_from_env
+from generation_budgets import stage_options, strip_reasoning, ReasoningFilter
+from prompt_serialization import estimate_tokens
+from runtime_options import context_tokens, runtime_options
+
+
+class LLMBackend:
+    """
+    Interface shared by the Ollama workflows and the OpenAI summary writers.
+
+    `chat` returns the content and a metrics dict (see streaming._build_metrics).
+    With `stream` set, tokens are passed to `on_token` as they are produced.
+    """
+
+    name = "base"
+
+    def chat(self, model, messages, options=None, stream=False, on_token=None):
+        raise NotImplementedError
+
+    def warm_up(self, model):
+        """Loads `model` before the first real call where the backend supports it, returns the load time."""
+        return 0.0
+
+
+class OllamaBackend(LLMBackend):
+    name = "ollama"
+
+    def __init__(self, client=None):
+        # None uses the shared ManagedOllamaClient
+        self.client = client
+
+    def chat(self, model, messages, options=None, stream=False, on_token=None):
+        if stream:
+            return stream_ollama_chat(model, messages, options, on_token, self.client)
+        return complete_ollama_chat(model, messages, options, self.client)
+
+    def warm_up(self, model):
+        return (self.client or get_client()).warm_up(model)
+
+
+class PooledOllamaBackend(LLMBackend):
+    """
+    Ollama backend over the servers of a host_pool.HostPool, with the stages of an area
+    pinned to one host. A request that fails because its host is gone is sent to the next
+    healthy host, unless tokens of it were already streamed to the caller.
+    """
+
+    name = "ollama"
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def chat(self, model, messages, options=None, stream=False, on_token=None):
+        affinity = area_affinity()
+        tried = []
+        while True:
+            streamed = []
+
+            def forward(token):
+                streamed.append(token)
+                on_token(token)
+
+            with self.pool.acquire(affinity, exclude=tried) as host:
+                if host is None:
+                    raise ConnectionError(f"No healthy Ollama host left of {len(self.pool.hosts)}")
+                try:
+                    if stream:
+                        content, metrics = stream_ollama_chat(model, messages, options,
+                                                              forward if on_token is not None else None, host.client)
+                    else:
+                        content, metrics = complete_ollama_chat(model, messages, options, host.client)
+                except Exception as error:
+                    if not host_error(error):
+                        raise
+                    self.pool.mark_down(host, error)
+                    if streamed:
+                        raise
+                    tried.append(host)
+                    continue
+            metrics["host"] = host.url
+            return content, metrics
+
+    def warm_up(self, model):
+        """Loads `model` on every healthy host side by side, returns the longest load time."""
+        hosts = [host for host in self.pool.hosts if host.healthy]
+        if not hosts:
+            return 0.0
+        with ThreadPoolExecutor(max_workers=len(hosts), thread_name_prefix="warm-up") as executor:
+            return max(executor.map(lambda host: self._warm_up(host, model), hosts))
+
+    def _warm_up(self, host, model):
+        try:
+            return host.client.warm_up(model)
+        except Exception as error:
+            if not host_error(error):
+                raise
+            self.pool.mark_down(host, error)
+            return 0.0
+
+
+class OpenAIBackend(LLMBackend):
+    """
+    `options` are passed as keyword arguments to chat.completions.create (temperature, max_tokens, ...).
+    Without a `client`, one is created with API_KEY on the first call. `timeout` is the
+    request timeout in seconds (None keeps the default of the openai package).
+    """
+
+    name = "openai"
+
+    def __init__(self, client=None, timeout=None):
+        self._client = client if client is None or timeout is None else client.with_options(timeout=timeout)
+        self.timeout = timeout
+
+    @property
+    def client(self):
+        if self._client is None:
+            # The openai package takes about half a second to import, so only when it is used
+            from openai import OpenAI
+            timeout = {"timeout": self.timeout} if self.timeout is not None else {}
+            self._client = OpenAI(api_key=os.getenv("API_KEY"), **timeout)
+        return self._client
+
+    def chat(self, model, messages, options=None, stream=False, on_token=None):
+        options = options or {}
+        if stream:
+            return stream_openai_chat(self.client, model, messages, on_token, **options)
+        return complete_openai_chat(self.client, model, messages, **options)
+
+
+class FakeBackend(LLMBackend):
+    """
+    In-process backend for runs without a model server.
+
+    `responses` is a fixed string or a callable (model, messages) -> str, `latency`
+    a number of seconds or a callable returning one, and the first `failures`
+    calls raise ConnectionError.
+    """
+
+    name = "fake"
+
+    def __init__(self, responses="[Product Line] up in all regions.", latency=0.0, failures=0):
+        self.responses = responses
+        self.latency = latency
+        self.failures = failures
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def chat(self, model, messages, options=None, stream=False, on_token=None):
+        with self._lock:
+            self.calls += 1
+            if self.failures > 0:
+                self.failures -= 1
+                raise ConnectionError("fake backend failure")
+
+        start = time.perf_counter()
+        content = self.responses(model, messages) if callable(self.responses) else self.responses
+        if options and ("format" in options or "response_format" in options):
+            # Summaries asked for in JSON (structured_output) get the reply as their only sentence
+            content = json.dumps({"sentences": [{"text": content, "product_lines": [], "regions": ["all"],
+                                                 "direction": "up"}]})
+        delay = self.latency() if callable(self.latency) else self.latency
+        tokens = content.split(" ")
+
+        first_token_at = None
+        for i, token in enumerate(tokens):
+            time.sleep(delay / len(tokens))
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            if stream and on_token is not None:
+                on_token(token if i == len(tokens) - 1 else token + " ")
+
+        prompt_tokens = sum(len(m["content"].split()) for m in messages)
+        return content, _build_metrics(start, first_token_at, time.perf_counter(), len(tokens), prompt_tokens)
+
+
+def _exchange_key(model, messages, options):
+    payload = json.dumps([model, messages, options or {}], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _system_prompt(messages):
+    return next((m["content"] for m in messages if m["role"] == "system"), "")
+
+
+class RecordingBackend(LLMBackend):
+    """Passes every call to `backend` and appends the exchange to a cassette file (JSON lines)."""
+
+    def __init__(self, backend, cassette):
+        self.backend = backend
+        self.cassette = cassette
+        self.name = backend.name
+        self._lock = threading.Lock()
+
+    def chat(self, model, messages, options=None, stream=False, on_token=None):
+        content, metrics = self.backend.chat(model, messages, options, stream, on_token)
+        entry = {
+            "Key": _exchange_key(model, messages, options),
+            "Backend": self.backend.name,
+            "Model": model,
+            "Messages": messages,
+            "Options": options or {},
+            "Content": content,
+            "Metrics": metrics,
+        }
+        with self._lock, open(self.cassette, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+        return content, metrics
+
+    def warm_up(self, model):
+        return self.backend.warm_up(model)
+
+
+def latency_sampler(spec, rng=None):
+    """
+    Callable (recorded metrics) -> seconds for a simulated latency distribution:
+
+    - "recorded": the latency measured when the exchange was recorded
+    - "scale:F": the recorded latency times F
+    - "fixed:S", "uniform:A,B", "normal:MEAN,SD", "lognormal:MEDIAN,SIGMA" in seconds
+    """
+    rng = rng or random.Random()
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",")] if args else []
+
+    if kind == "recorded":
+        return lambda metrics: metrics.get("total_latency") or 0.0
+    if kind == "scale":
+        return lambda metrics: (metrics.get("total_latency") or 0.0) * values[0]
+    if kind == "fixed":
+        return lambda metrics: values[0]
+    if kind == "uniform":
+        return lambda metrics: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda metrics: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda metrics: rng.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class ReplayBackend(LLMBackend):
+    """
+    Answers calls from a cassette written by RecordingBackend, without any model server.
+
+    Calls are matched on model, messages and options. Prompts that changed since the
+    recording (other data, other serialization) fall back to the exchanges recorded
+    for the same model and system prompt, in turn. The response is delayed by a
+    latency drawn from `latency` (see latency_sampler) and streamed word by word,
+    with the recorded share of time to first token.
+    """
+
+    name = "replay"
+
+    def __init__(self, cassette, latency="recorded", seed=None):
+        self.cassette = cassette
+        self.sample = latency_sampler(latency, random.Random(seed))
+        self._exact = defaultdict(list)
+        self._similar = defaultdict(list)
+        self._served = defaultdict(int)
+        self._lock = threading.Lock()
+
+        with open(cassette, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self._exact[entry["Key"]].append(entry)
+                self._similar[(entry["Model"], _system_prompt(entry["Messages"]))].append(entry)
+
+    def _lookup(self, model, messages, options):
+        lookups = [(self._exact, _exchange_key(model, messages, options)),
+                   (self._similar, (model, _system_prompt(messages)))]
+        for index, key in lookups:
+            entries = index.get(key)
+            if entries:
+                with self._lock:
+                    entry = entries[self._served[key] % len(entries)]
+                    self._served[key] += 1
+                return entry
+        raise KeyError(f"No exchange for {model} with this system prompt in {self.cassette}")
+
+    def chat(self, model, messages, options=None, stream=False, on_token=None):
+        start = time.perf_counter()
+        entry = self._lookup(model, messages, options)
+        recorded = entry["Metrics"]
+        content = entry["Content"]
+
+        delay = self.sample(recorded)
+        recorded_total = recorded.get("total_latency") or 0.0
+        first_share = (recorded.get("time_to_first_token") or 0.0) / recorded_total if recorded_total else 0.0
+        tokens = content.split(" ")
+
+        time.sleep(delay * first_share)
+        first_token_at = time.perf_counter()
+        for i, token in enumerate(tokens):
+            if stream and on_token is not None:
+                on_token(token if i == len(tokens) - 1 else token + " ")
+            time.sleep(delay * (1 - first_share) / len(tokens))
+
+        return content, _build_metrics(start, first_token_at, time.perf_counter(),
+                                       recorded.get("completion_tokens") or len(tokens),
+                                       recorded.get("prompt_tokens"))
+
+
+class CallPolicy:
+    """
+    Deadline, retries and hedging for one backend.
+
+    - `deadline`: seconds one attempt may take before it is abandoned (None = no limit)
+    - `max_retries`: extra attempts after a failure or timeout, with exponential
+      backoff and full jitter (a random wait between 0 and backoff * 2**attempt)
+    - `hedge_percentile`: when an attempt is still running after this percentile of
+      the recorded latencies for the same model and stage, a duplicate request is
+      sent and whichever finishes first is used (None = no hedging)
+    """
+
+    def __init__(self, deadline=300.0, max_retries=2, backoff=1.0, hedge_percentile=None, hedge_min_samples=5):
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+
+    @classmethod
+    def from_env(cls):
+        """LLM_DEADLINE (0 disables), LLM_MAX_RETRIES, LLM_HEDGE_PERCENTILE (e.g. 95, unset disables)."""
+        hedge = os.getenv("LLM_HEDGE_PERCENTILE")
+        return cls(
+            deadline=request_timeout(),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+            hedge_percentile=float(hedge) if hedge else None,
+        )
+
+
+def transient_error(error):
+    """True for failures a retry can fix: timeouts, lost connections and 5xx answers of the server."""
+    import httpx
+
+    if isinstance(error, (TimeoutError, ConnectionError, httpx.TransportError)):
+        return True
+    # ollama.ResponseError and the openai status errors carry the HTTP status
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status >= 500
+    openai = sys.modules.get("openai")
+    return openai is not None and isinstance(error, openai.APIConnectionError)
+
+
+class ReliableBackend(LLMBackend):
+    """
+    Wraps a backend with the deadline, retry and hedging rules of a CallPolicy.
+
+    Calls run on a pool of `max_workers` threads of this backend. A call may wait up to the
+    deadline for a thread, and the deadline of the call counts from when a thread starts it;
+    a call past its deadline is stopped by the request timeout of the client (see request_timeout).
+    """
+
+    def __init__(self, backend, policy=None, history=50, max_workers=8):
+        self.backend = backend
+        self.policy = policy or CallPolicy()
+        self.name = backend.name
+        self._latencies = defaultdict(lambda: deque(maxlen=history))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+
+    def hedge_delay(self, key):
+        """Latency percentile after which a duplicate request is sent, None while there is too little history."""
+        if self.policy.hedge_percentile is None:
+            return None
+        latencies = sorted(self._latencies[key])
+        if len(latencies) < self.policy.hedge_min_samples:
+            return None
+        index = min(len(latencies) - 1, int(len(latencies) * self.policy.hedge_percentile / 100))
+        return latencies[index]
+
+    def _submit(self, model, messages, options, stream, on_token):
+        """Future of one backend call, and an event set when a thread starts it."""
+        started = threading.Event()
+
+        def call():
+            started.set()
+            return self.backend.chat(model, messages, options, stream, on_token)
+
+        return self._executor.submit(call), started
+
+    def _attempt(self, key, model, messages, options, stream, on_token):
+        active = threading.Event()
+        active.set()
+
+        def guarded_token(token):
+            # Tokens of an abandoned attempt must not reach the report
+            if active.is_set():
+                on_token(token)
+
+        future, started = self._submit(model, messages, options, stream,
+                                       guarded_token if on_token is not None else None)
+        futures = [future]
+        deadline = self.policy.deadline
+        # A call still waiting for a thread after the deadline is dropped
+        if not started.wait(deadline) and future.cancel():
+            raise TimeoutError(f"{self.name} call to {model} waited {deadline}s for a worker")
+        start = time.perf_counter()
+
+        # Two streams would interleave their tokens, so streamed calls are never hedged
+        delay = self.hedge_delay(key) if on_token is None else None
+
+        try:
+            if delay is not None and (deadline is None or delay < deadline):
+                done, _ = wait(futures, timeout=delay)
+                if not done:
+                    logging.info('----- Hedging %s after %.2fs -----', key, delay)
+                    futures.append(self._submit(model, messages, options, False, None)[0])
+
+            # The first successful call wins; a failure only counts once every call failed
+            pending, error = set(futures), None
+            while pending:
+                remaining = None if deadline is None else deadline - (time.perf_counter() - start)
+                if remaining is not None and remaining <= 0:
+                    break
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for finished in done:
+                    if finished.exception() is None:
+                        content, metrics = finished.result()
+                        metrics["hedged"] = len(futures) > 1
+                        return content, metrics
+                    error = error or finished.exception()
+            if not pending and error is not None:
+                raise error
+            raise TimeoutError(f"{self.name} call to {model} exceeded {deadline}s")
+        finally:
+            active.clear()
+            # A hedge still waiting for a thread is dropped, running calls end with their request timeout
+            for pending_future in futures:
+                pending_future.cancel()
+
+    def warm_up(self, model):
+        return self.backend.warm_up(model)
+
+    def chat(self, model, messages, options=None, stream=False, on_token=None, stage=None):
+        key = (model, stage)
+        attempts = self.policy.max_retries + 1
+        streamed = []
+
+        def forward(token):
+            streamed.append(token)
+            on_token(token)
+
+        for attempt in range(attempts):
+            try:
+                content, metrics = self._attempt(key, model, messages, options, stream,
+                                                 forward if on_token is not None else None)
+                self._latencies[key].append(metrics["total_latency"])
+                metrics["attempts"] = attempt + 1
+                return content, metrics
+            except Exception as error:
+                # A retry after streamed tokens would repeat the text in the report
+                if attempt == attempts - 1 or not transient_error(error) or streamed:
+                    raise
+                wait_s = random.uniform(0, self.policy.backoff * 2 ** attempt)
+                logging.warning('----- %s attempt %s failed (%s), retrying in %.1fs -----',
+                                stage or model, attempt + 1, error, wait_s)
+                time.sleep(wait_s)
+
+
+_backends = {}
+
+
+def get_backend(kind, client=None):
+    """
+    Shared backend for "ollama" or "openai", wrapped in the CallPolicy from the environment.
+
+    LLM_BACKEND=fake replaces both with the in-process FakeBackend. LLM_BACKEND=record
+    appends every exchange to the cassette LLM_CASSETTE (default cassette.jsonl), and
+    LLM_BACKEND=replay answers from it with the latency LLM_REPLAY_LATENCY (default
+    "recorded", see latency_sampler). With OLLAMA_HOSTS set, Ollama calls are spread over
+    those servers (see host_pool). LLM_WORKERS (default 8) is the number of calls
+    of a backend that run at once, hedges included.
+    """
+    if kind not in _backends:
+        mode = os.getenv("LLM_BACKEND")
+        cassette = os.getenv("LLM_CASSETTE", "cassette.jsonl")
+        if mode == "fake":
+            backend = FakeBackend()
+        elif mode == "replay":
+            backend = ReplayBackend(cassette, os.getenv("LLM_REPLAY_LATENCY", "recorded"))
+        elif kind == "ollama" and client is None and pool_hosts():
+            backend = PooledOllamaBackend(pool_from_env())
+        elif kind == "ollama":
+            backend = OllamaBackend(client)
+        elif kind == "openai":
+            backend = OpenAIBackend(client, timeout=request_timeout())
+        else:
+            raise ValueError(f"Unknown backend: {kind}")
+        if mode == "record":
+            backend = RecordingBackend(backend, cassette)
+        workers = int(os.getenv("LLM_WORKERS", "8"))
+        _backends[kind] = ReliableBackend(backend, CallPolicy.from_env(), max_workers=workers)
+    return _backends[kind]
+
+
+def ollama_chat(model, messages, options=None, stream=False, on_token=None, stage=None, rows=None):
+    """
+    Single entry point for the Local workflows.
+
+    Blocks until the full completion arrives unless `stream` is set, in which case
+    tokens are consumed as they are produced. Both modes return (content, metrics).
+
+    The output budget and stop sequences of the stage (for a data block of `rows` rows),
+    the tuned runtime options of the model and a num_ctx sized for the prompt are added to
+    `options` (see generation_budgets and runtime_options), and <think> blocks of reasoning
+    models are removed from the content and from the streamed tokens before they reach the caller.
+    """
+    backend = get_backend("ollama")
+    options = runtime_options(model, messages, stage_options(model, stage, options, rows))
+    reasoning_filter = ReasoningFilter(on_token) if on_token is not None else None
+    content, metrics = backend.chat(model, messages, options, stream, reasoning_filter, stage)
+    if reasoning_filter is not None:
+        reasoning_filter.close()
+
+    content, reasoning = strip_reasoning(content)
+    metrics["reasoning_tokens"] = estimate_tokens(reasoning) if reasoning else 0
+    metrics["token_budget"] = (options or {}).get("num_predict")
+
+    if stage is not None:
+        log_metrics(stage, metrics)
+        if metrics["reasoning_tokens"]:
+            logging.info('----- Removed ~%s reasoning tokens from %s -----', metrics["reasoning_tokens"], stage)
+        num_ctx = (options or {}).get("num_ctx") or context_tokens()
+        if (metrics.get("prompt_tokens") or 0) >= num_ctx:
+            logging.warning('----- %s prompt filled the context of %s tokens and was probably truncated -----',
+                            stage, num_ctx)
+        if metrics.get("done_reason") == "length":
+            logging.warning('----- %s stopped at its budget of %s tokens -----', stage, metrics["token_budget"])
+        get_ledger().record_metrics(backend.name, model, stage, metrics)
+
+    return content.strip(), metrics
+
+
+def openai_chat(model, messages, stream=False, on_token=None, stage=None, client=None, **kwargs):
+    """Single entry point for the OpenAI summary writers, mirrors `ollama_chat`."""
+    backend = get_backend("openai", client)
+    content, metrics = backend.chat(model, messages, kwargs, stream, on_token, stage)
+
+    if stage is not None:
+        log_metrics(stage, metrics)
+        get_ledger().record_metrics(backend.name, model, stage, metrics)
+
+    return content, metrics
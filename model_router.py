@@ -0,0 +1,121 @@
+import json
+import logging
+import os
+from collections import defaultdict
+
+from prompt_serialization import estimate_tokens
+from usage_ledger import get_ledger
+
+
+DEFAULT_MODEL = "llama3.1:8b"
+
+# First matching rule wins. A rule matches when every limit it sets holds:
+# stage, areas (business or product area codes), max_rows, max_tokens and
+# max_latency (mean recorded seconds per call of its model for that stage).
+# With several `models` the one with the lowest recorded latency is used.
+DEFAULT_RULES = [
+    {"stage": "natural_language", "max_rows": 40, "max_tokens": 1500, "models": ["qwen2.5:3b", "llama3.2"]},
+    {"stage": "analysis_of_data", "max_tokens": 1200, "models": ["qwen2.5:7b"], "max_latency": 60},
+    {"stage": "validate_summary", "max_rows": 40, "models": ["qwen2.5:7b"], "max_latency": 60},
+    {"stage": "summary", "models": [DEFAULT_MODEL]},
+]
+
+
+class ModelRouter:
+    """
+    Chooses the model per stage and area from input size, stage type and recorded latency.
+
+    Latency comes from the usage ledger: the history of earlier runs is read once
+    and every call of this run is added as it is recorded.
+    """
+
+    def __init__(self, rules=None, default_model=DEFAULT_MODEL, ledger=None):
+        self.rules = DEFAULT_RULES if rules is None else rules
+        self.default_model = default_model
+        self._latency_sum = defaultdict(float)
+        self._latency_calls = defaultdict(int)
+
+        if ledger is not None:
+            history = ledger.load()
+            if not history.empty:
+                grouped = history.groupby(["Model", "Stage"])["Latency s"]
+                for (model, stage), total in grouped.sum().items():
+                    self._latency_sum[(model, stage)] += total
+                for (model, stage), calls in grouped.size().items():
+                    self._latency_calls[(model, stage)] += calls
+            ledger.listeners.append(self.observe)
+
+    def observe(self, row):
+        """Ledger listener, keeps the mean latency per model and stage current."""
+        key = (row["Model"], row["Stage"])
+        self._latency_sum[key] += row["Latency s"]
+        self._latency_calls[key] += 1
+
+    def mean_latency(self, model, stage):
+        calls = self._latency_calls[(model, stage)]
+        return self._latency_sum[(model, stage)] / calls if calls else None
+
+    def _matches(self, rule, stage, rows, tokens, areas):
+        if "stage" in rule and rule["stage"] != stage:
+            return False
+        if "areas" in rule and not set(rule["areas"]) & set(areas):
+            return False
+        if "max_rows" in rule and (rows is None or rows > rule["max_rows"]):
+            return False
+        if "max_tokens" in rule and (tokens is None or tokens > rule["max_tokens"]):
+            return False
+        return True
+
+    def route(self, stage, rows=None, tokens=None, business_area=None, product_area=None):
+        areas = [area for area in (business_area, product_area) if area]
+
+        for rule in self.rules:
+            if not self._matches(rule, stage, rows, tokens, areas):
+                continue
+
+            candidates = []
+            for model in rule.get("models", [self.default_model]):
+                latency = self.mean_latency(model, stage)
+                if "max_latency" in rule and latency is not None and latency > rule["max_latency"]:
+                    continue
+                candidates.append((latency if latency is not None else float("inf"), model))
+            if not candidates:
+                continue
+
+            # Lowest recorded latency, models without history keep the order of the rule
+            measured = [c for c in candidates if c[0] != float("inf")]
+            model = min(measured)[1] if measured else candidates[0][1]
+            logging.info('----- Routing %s (rows=%s, tokens=%s) to %s -----', stage, rows, tokens, model)
+            return model
+
+        return self.default_model
+
+
+_router = None
+
+
+def get_router():
+    """
+    Router shared by the process. Without MODEL_ROUTING=1 every stage uses the default
+    model; MODEL_ROUTING_RULES points to a JSON file replacing DEFAULT_RULES.
+    """
+    global _router
+    if _router is None:
+        if os.getenv("MODEL_ROUTING", "0") != "1":
+            _router = ModelRouter(rules=[])
+        else:
+            rules = None
+            rules_path = os.getenv("MODEL_ROUTING_RULES")
+            if rules_path:
+                with open(rules_path, encoding="utf-8") as f:
+                    rules = json.load(f)
+            _router = ModelRouter(rules=rules, ledger=get_ledger())
+    return _router
+
+
+def route_model(stage, prompt=None, rows=None):
+    """Model for a stage of the area currently set on the usage ledger."""
+    ledger = get_ledger()
+    tokens = estimate_tokens(prompt) if prompt is not None else None
+    return get_router().route(stage, rows=rows, tokens=tokens,
+                              business_area=ledger.business_area, product_area=ledger.product_area)
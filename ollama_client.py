@@ -0,0 +1,89 @@
+import logging
+import os
+import time
+
+from usage_ledger import get_ledger
+from runtime_options import warm_up_options
+
+
+class ManagedOllamaClient:
+    """
+    One ollama.Client (one HTTP connection pool) shared by every stage.
+
+    The active model is pinned in memory with `keep_alive` and loaded by a
+    warm-up request before the first real stage, so model load time is paid
+    once and reported separately from generation time. When another model is
+    requested the previous one is released unless `unload_previous` is False,
+    which keeps every warmed model loaded (used with model routing).
+    """
+
+    def __init__(self, host=None, keep_alive="30m", unload_previous=True, timeout=None):
+        import ollama
+
+        self.client = ollama.Client(host=host, timeout=timeout)
+        self.host = host
+        self.keep_alive = keep_alive
+        self.unload_previous = unload_previous
+        self.active_model = None
+        self.loaded = set()
+        self.load_times = {}
+
+    def warm_up(self, model):
+        """Loads `model` with an empty request and returns the load time in seconds."""
+        if model in self.loaded:
+            self.active_model = model
+            return 0.0
+
+        if self.active_model is not None and self.unload_previous:
+            # keep_alive=0 frees the memory of the previous model right away
+            self.client.generate(model=self.active_model, prompt="", keep_alive=0)
+            self.loaded.discard(self.active_model)
+
+        start = time.perf_counter()
+        # Loaded with the tuned options and the smallest context, as the first requests use them
+        response = self.client.generate(model=model, prompt="", keep_alive=self.keep_alive,
+                                        options=warm_up_options(model))
+        wall_time = time.perf_counter() - start
+
+        load_duration = response.get('load_duration')
+        load_time = load_duration / 1e9 if load_duration is not None else wall_time
+        self.active_model = model
+        self.loaded.add(model)
+        self.load_times[model] = load_time
+
+        logging.info('----- Warm-up %s ----- load=%.2fs (keep_alive=%s)', model, load_time, self.keep_alive)
+        get_ledger().record("ollama", model, "warm_up", 0, 0, wall_time, load_time=load_time, host=self.host)
+
+        return load_time
+
+    def chat(self, model, messages, options=None, stream=False, **kwargs):
+        """Same signature as ollama.chat, on the pooled connection and with the model pinned."""
+        if model != self.active_model:
+            self.warm_up(model)
+
+        return self.client.chat(model=model, messages=messages, options=options, stream=stream,
+                                keep_alive=self.keep_alive, **kwargs)
+
+
+_client = None
+
+
+def request_timeout():
+    """LLM_DEADLINE in seconds (default 300, 0 for none), also the HTTP timeout of every LLM request."""
+    return float(os.getenv("LLM_DEADLINE", "300")) or None
+
+
+def get_client():
+    """
+    Client shared by the process (OLLAMA_HOST, OLLAMA_KEEP_ALIVE, default 30m), with
+    requests timing out after LLM_DEADLINE. With MODEL_ROUTING=1 the routed models stay loaded side by side.
+    """
+    global _client
+    if _client is None:
+        _client = ManagedOllamaClient(
+            host=os.getenv("OLLAMA_HOST"),
+            keep_alive=os.getenv("OLLAMA_KEEP_ALIVE", "30m"),
+            unload_previous=os.getenv("MODEL_ROUTING", "0") != "1",
+            timeout=request_timeout(),
+        )
+    return _client
@@ -0,0 +1,43 @@
+def format_pre_analysis(facts):
+    """
+    Renders the facts from DataHandler.computed_pre_analysis as the text the
+    `summary` stage expects, replacing the natural_language and analysis_of_data LLM calls.
+    No numbers are included, only directions and magnitudes.
+    """
+    directions = facts["directions"]
+    if directions.empty:
+        return "No changes in the data."
+
+    lines = ["Changes per product line:"]
+    for product_line, group in directions.groupby("Product Line", sort=False):
+        changes = ", ".join(
+            f"{change_type.lower()} in {region}"
+            for region, change_type in zip(group["Region"], group["Change Type"])
+        )
+        lines.append(f"- {product_line}: {changes}")
+
+    lines.append("")
+    lines.append("Consistency across regions:")
+    for _, row in facts["consistency"].iterrows():
+        if row["Consistency"] == "mixed":
+            pl_directions = directions[directions["Product Line"] == row["Product Line"]]
+            up = ", ".join(pl_directions.loc[pl_directions["Direction"] == "up", "Region"])
+            down = ", ".join(pl_directions.loc[pl_directions["Direction"] == "down", "Region"])
+            lines.append(f"- {row['Product Line']} mixed: up in {up or 'no region'}, down in {down or 'no region'}.")
+        elif row["Consistency"] == "single region":
+            region = directions.loc[directions["Product Line"] == row["Product Line"], "Region"].iloc[0]
+            direction = directions.loc[directions["Product Line"] == row["Product Line"], "Direction"].iloc[0]
+            lines.append(f"- {row['Product Line']} {direction} in {region} only.")
+        else:
+            lines.append(f"- {row['Product Line']} {row['Consistency']}.")
+
+    for title, drivers in [("Main positive drivers:", facts["top_positive"]),
+                           ("Main negative drivers:", facts["top_negative"])]:
+        lines.append("")
+        lines.append(title)
+        if drivers.empty:
+            lines.append("- None")
+        for _, row in drivers.iterrows():
+            lines.append(f"- {row['Product Line']} in {row['Region']} ({row['Change Type'].lower()})")
+
+    return "\n".join(lines)
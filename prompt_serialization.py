@@ -0,0 +1,146 @@
+import re
+
+# pandas and numpy are imported where they are used, so importing estimate_tokens stays cheap
+
+
+BUCKET_LABELS = ["---", "--", "-", "0", "+", "++", "+++"]
+
+
+_encoding = None
+
+
+def estimate_tokens(text):
+    """
+    Estimated number of prompt tokens for a text.
+
+    Uses tiktoken when it is installed and its encoding can be loaded, otherwise
+    counts words, 3-digit groups, punctuation, newlines and runs of padding
+    separately, which is close to what BPE tokenizers produce.
+    """
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+
+    if _encoding:
+        return len(_encoding.encode(text))
+    return len(re.findall(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]|\n|[^\S\n]{2,}", text))
+
+
+def _format_number(value, decimals):
+    import pandas as pd
+
+    if pd.isna(value):
+        return ""
+    rounded = round(float(value), decimals)
+    if decimals == 0:
+        return str(int(rounded))
+    return f"{rounded:.{decimals}f}".rstrip("0").rstrip(".")
+
+
+def _compact_number(value):
+    """Two significant figures with a k/M suffix, e.g. 40081.37 -> 40k, -1063.5 -> -1.1k."""
+    import pandas as pd
+
+    if pd.isna(value):
+        return ""
+    value = float(value)
+    for divisor, suffix in [(1e6, "M"), (1e3, "k")]:
+        if abs(value) >= divisor:
+            return f"{float(f'{value / divisor:.2g}'):g}{suffix}"
+    return f"{float(f'{value:.2g}'):g}"
+
+
+def bucket_values(values):
+    """Signed magnitude buckets (--- to +++) relative to the largest absolute value in the block."""
+    import numpy as np
+    import pandas as pd
+
+    values = pd.Series(values, dtype=float)
+    scale = values.abs().max()
+    if not scale:
+        return pd.Series(["0"] * len(values), index=values.index)
+
+    # Thirds of the largest absolute value: small, medium, large
+    levels = np.ceil(values.abs() / scale * 3).clip(0, 3).astype(int) * np.sign(values).astype(int)
+    return levels.map(lambda level: BUCKET_LABELS[level + 3])
+
+
+def _format_frame(df, values, decimals):
+    import pandas as pd
+
+    formatted = pd.DataFrame(index=df.index)
+    for col in df.columns:
+        if pd.api.types.is_numeric_dtype(df[col]):
+            if values == "bucket" and col == "Total Difference":
+                formatted[col] = bucket_values(df[col])
+            elif values == "bucket" or col.endswith("%"):
+                formatted[col] = df[col].map(lambda v: _format_number(v, decimals))
+            else:
+                formatted[col] = df[col].map(_compact_number)
+        else:
+            formatted[col] = df[col].astype(str)
+    return formatted
+
+
+def compact_rows(df, sep="|", values="round", decimals=1):
+    """One delimiter-separated line per row with a single header line, no padding."""
+    formatted = _format_frame(df, values, decimals)
+    lines = [sep.join(formatted.columns)]
+    lines.extend(sep.join(row) for row in formatted.itertuples(index=False, name=None))
+    return "\n".join(lines)
+
+
+def compact_pivot(df, value_col="Total Difference", sep="|", values="round", decimals=1):
+    """Product Line x Region pivot of one value column, empty cells for missing combinations."""
+    pivot = df.pivot_table(index="Product Line", columns="Region", values=value_col, aggfunc="sum", sort=False)
+    formatted = _format_frame(pivot, values, decimals).reindex(columns=pivot.columns)
+    if values == "bucket" and value_col == "Total Difference":
+        # Bucket against the whole block, not per Region column
+        stacked = bucket_values(pivot.stack())
+        formatted = stacked.unstack().reindex(index=pivot.index, columns=pivot.columns)
+    formatted = formatted.fillna("")
+    lines = [sep.join(["Product Line \\ Region"] + [str(c) for c in formatted.columns])]
+    lines.extend(sep.join([str(pl)] + list(row)) for pl, row in zip(formatted.index, formatted.itertuples(index=False, name=None)))
+    return "\n".join(lines)
+
+
+def serialize_block(df, prompt_format="table", sep="|", decimals=1, pivot=False):
+    """
+    Serializes a data block for a prompt.
+
+    - "table": DataFrame.to_string(index=False), the original format
+    - "compact": delimiter-separated rows with rounded values (k/M suffixes)
+    - "bucket": as compact, but 'Total Difference' as magnitude buckets (--- to +++)
+
+    With `pivot` the block is written as a Product Line x Region pivot of
+    'Total Difference', which repeats no names and suits sparse areas but drops
+    the other columns. pivot="auto" only pivots when that is shorter.
+    """
+    if prompt_format == "table" or df.empty:
+        return df.to_string(index=False)
+
+    values = "bucket" if prompt_format == "bucket" else "round"
+    text = compact_rows(df, sep, values, decimals)
+    if pivot and {"Product Line", "Region", "Total Difference"} <= set(df.columns):
+        pivoted = compact_pivot(df, "Total Difference", sep, values, decimals)
+        if pivot != "auto" or estimate_tokens(pivoted) < estimate_tokens(text):
+            text = pivoted
+    return text
+
+
+def token_report(df, prompt_format="compact", **kwargs):
+    """Estimated token counts of the original table and the compact serialization of a block."""
+    table = df.to_string(index=False)
+    compact = serialize_block(df, prompt_format, **kwargs)
+    table_tokens = estimate_tokens(table)
+    compact_tokens = estimate_tokens(compact)
+    return {
+        "table_tokens": table_tokens,
+        "compact_tokens": compact_tokens,
+        "saved_tokens": table_tokens - compact_tokens,
+        "saved_pct": round((1 - compact_tokens / table_tokens) * 100, 1) if table_tokens else 0.0,
+    }
@@ -0,0 +1,183 @@
+"""
+Runs every requested report variant over each dataset in one process, loading each file once.
+
+    python run_reports.py
+    python run_reports.py --variant ollama-strict --variant openai-free --workers 3
+    python run_reports.py --net-sales data/netsales.csv --dataset net_sales --area ACTH:ACAT,ACCA --area LISC
+    python run_reports.py --render --variant openai-strict
+    python run_reports.py --list-areas
+    python run_reports.py --long-format --net-sales data/netsales_monthly.csv --rolling 1
+    python run_reports.py --long-format --compare 2024-01:2025-01 --compare 2024-12:2025-01
+
+Variants:
+    ollama-strict  Local workflows (netsales_workflow, orderintake_workflow, lifescience for LISC)
+    openai-strict  OpenAI/summary_writer
+    openai-free    OpenAI/free_summary_writer
+
+Every (variant, dataset, business area) is one job; --workers jobs run side by side.
+Outputs, journal, summary store and usage ledger are the same as when the scripts run on their own.
+--long-format reads the datasets as long-format exports with a [Period] column: the file is
+read once and every comparison (--compare BASE:TARGET, or --rolling N for every period against
+the one N periods before, default 1) is reported and stored under its own period.
+--render only re-renders the report files of the variants from the summary store, without
+loading data or calling a model.
+"""
+import argparse
+import importlib
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "Local"), os.path.join(ROOT, "OpenAI")]
+
+# Data handling and the variant modules are imported when a run needs them,
+# so --help, --list-areas and --render start without pandas or the LLM clients
+
+
+BUSINESS_AREAS = {
+    "ACTH": ['ACAT', 'ACCA', 'ACCC', 'ACCP', 'ACG3', 'ACTC', 'ACVI'],
+    "SWIC": ['ARJO', 'SWA3', 'SWIN', 'SWIW', 'SWWP'],
+    "LISC": None
+}
+
+DATASETS = {"net_sales": "NET_SALES_PATH", "order_intake": "ORDER_INTAKE_PATH"}
+
+VARIANTS = ["ollama-strict", "openai-strict", "openai-free"]
+
+# Local workflow per dataset, business areas without product areas use lifescience
+LOCAL_WORKFLOWS = {"net_sales": "netsales_workflow", "order_intake": "orderintake_workflow"}
+
+
+def parse_area(text):
+    """'ACTH:ACAT,ACCA' -> ('ACTH', ['ACAT', 'ACCA']), 'ACTH' -> ('ACTH', all its product areas)"""
+    business_area, _, product_areas = text.partition(":")
+    if product_areas:
+        return business_area, product_areas.split(",")
+    return business_area, BUSINESS_AREAS.get(business_area)
+
+
+def report_modules(variant, summary_type):
+    """Modules writing the reports of a variant for one dataset."""
+    if variant == "ollama-strict":
+        return [LOCAL_WORKFLOWS[summary_type]] + (["lifescience"] if summary_type == "net_sales" else [])
+    return ["summary_writer" if variant == "openai-strict" else "free_summary_writer"]
+
+
+def render(summary_types, variants):
+    for module in dict.fromkeys(name for summary_type in summary_types for variant in variants
+                                for name in report_modules(variant, summary_type)):
+        importlib.import_module(module).export_report()
+        logging.info('----- Rendered %s from the summary store -----', module)
+
+
+def parse_comparison(text):
+    """'2024-12:2025-01' -> ('2024-12', '2025-01')"""
+    base, _, target = text.partition(":")
+    if not base or not target:
+        raise argparse.ArgumentTypeError(f"expected BASE:TARGET, got {text!r}")
+    return base, target
+
+
+def jobs(variant, summary_type, path, dataset, areas):
+    """(name, callable) per business area of a variant; the variant modules are only imported when requested."""
+    label = f"{summary_type} {dataset.period}" if dataset.period else summary_type
+    if variant == "ollama-strict":
+        for business_area, product_areas in areas.items():
+            if product_areas is None:
+                if summary_type != "net_sales":
+                    logging.warning('----- No Local workflow for %s %s, skipped -----', summary_type, business_area)
+                    continue
+                module = importlib.import_module("lifescience")
+                yield f"{variant} {label} {business_area}", lambda m=module, ba=business_area: m.compilation(dataset, ba)
+            else:
+                module = importlib.import_module(LOCAL_WORKFLOWS[summary_type])
+                yield (f"{variant} {label} {business_area}",
+                       lambda m=module, ba=business_area, pas=product_areas: m.compilation(dataset, pas, ba))
+    else:
+        module = importlib.import_module("summary_writer" if variant == "openai-strict" else "free_summary_writer")
+        # One job per business area, each writes its areas to the store and re-renders the exports
+        for business_area, product_areas in areas.items():
+            yield (f"{variant} {label} {business_area}",
+                   lambda m=module, ba=business_area, pas=product_areas:
+                   m.create_summary(path, summary_type, dataset, {ba: pas}))
+
+
+def load(path, long_format=False, comparisons=None, rolling=1):
+    """DataHandlers of a dataset, one per compared pair of periods for long-format exports."""
+    from data_processing import DataHandler, MultiPeriodDataHandler
+
+    if not long_format:
+        return [DataHandler(path)]
+
+    periods = MultiPeriodDataHandler(path)
+    pairs = comparisons or periods.rolling_pairs(rolling)
+    missing = sorted({period for pair in pairs for period in pair} - set(periods.periods))
+    if missing:
+        raise ValueError(f"Periods {', '.join(missing)} not in {path} ({', '.join(periods.periods)})")
+    logging.info('----- %s: %s periods, %s comparisons -----', path, len(periods.periods), len(pairs))
+    return [periods.compare(base, target) for base, target in pairs]
+
+
+def run(paths, variants, areas, workers=1, long_format=False, comparisons=None, rolling=1):
+    # Each file is read and cleaned once, every variant works on the same DataHandlers
+    datasets = {summary_type: load(path, long_format, comparisons, rolling) for summary_type, path in paths.items()}
+
+    work = [job for summary_type, path in paths.items() for dataset in datasets[summary_type]
+            for variant in variants for job in jobs(variant, summary_type, path, dataset, areas)]
+
+    def timed(name, job):
+        start = time.perf_counter()
+        job()
+        logging.info('----- %s finished in %.1fs -----', name, time.perf_counter() - start)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(timed, name, job) for name, job in work]
+        for future in futures:
+            future.result()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--net-sales", default=None, help="net sales export (default NET_SALES_PATH)")
+    parser.add_argument("--order-intake", default=None, help="order intake export (default ORDER_INTAKE_PATH)")
+    parser.add_argument("--dataset", action="append", choices=sorted(DATASETS),
+                        help="datasets to report on, repeatable (default every dataset with a path)")
+    parser.add_argument("--variant", action="append", choices=VARIANTS, help="repeatable (default all)")
+    parser.add_argument("--area", action="append", type=parse_area,
+                        help="BUSINESS_AREA or BUSINESS_AREA:PA,PA, repeatable (default every area)")
+    parser.add_argument("--workers", type=int, default=1, help="jobs running side by side")
+    parser.add_argument("--long-format", action="store_true", help="the datasets are long-format exports with "
+                                                                       "a [Period] column")
+    parser.add_argument("--compare", action="append", type=parse_comparison,
+                        help="BASE:TARGET periods of a long-format export, repeatable")
+    parser.add_argument("--rolling", type=int, default=1, help="compare every period against the one N periods "
+                                                               "before when no --compare is given (default 1)")
+    parser.add_argument("--render", action="store_true", help="only re-render the report files from the summary store")
+    parser.add_argument("--list-areas", action="store_true", help="print the business and product areas and exit")
+    args = parser.parse_args()
+
+    if args.list_areas:
+        for business_area, product_areas in BUSINESS_AREAS.items():
+            print(f"{business_area}: {', '.join(product_areas) if product_areas else '(whole business area)'}")
+        sys.exit()
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    # Room for a call and its hedge per job on the LLM backends (see llm_backends.get_backend)
+    os.environ.setdefault("LLM_WORKERS", str(max(8, 2 * args.workers)))
+
+    given = {"net_sales": args.net_sales, "order_intake": args.order_intake}
+    paths = {summary_type: given[summary_type] or os.getenv(var) for summary_type, var in DATASETS.items()}
+    paths = {summary_type: path for summary_type, path in paths.items()
+             if path and (args.dataset is None or summary_type in args.dataset)}
+
+    if args.render:
+        render(args.dataset or list(DATASETS), args.variant or VARIANTS)
+    else:
+        run(paths, args.variant or VARIANTS, dict(args.area) if args.area else BUSINESS_AREAS, args.workers,
+            args.long_format, args.compare, args.rolling)
@@ -0,0 +1,77 @@
+import json
+import os
+
+from prompt_serialization import estimate_tokens
+
+
+# Context sizes a request can get. Ollama reloads the model when num_ctx changes,
+# so requests are rounded up to a few sizes instead of getting exactly what they need.
+DEFAULT_NUM_CTX_BUCKETS = [2048, 4096, 8192]
+
+# Estimates can be off for other tokenizers, and chat templates add tokens of their own
+CONTEXT_MARGIN = 1.15
+TEMPLATE_TOKENS = 32
+
+
+def num_ctx_buckets():
+    """OLLAMA_NUM_CTX_BUCKETS, e.g. "2048,4096,8192"."""
+    buckets = os.getenv("OLLAMA_NUM_CTX_BUCKETS")
+    return sorted(int(b) for b in buckets.split(",")) if buckets else DEFAULT_NUM_CTX_BUCKETS
+
+
+def dynamic_context():
+    """OLLAMA_DYNAMIC_CTX=0 keeps the context of the server (OLLAMA_NUM_CTX)."""
+    return os.getenv("OLLAMA_DYNAMIC_CTX", "1") == "1" and not os.getenv("OLLAMA_NUM_CTX")
+
+
+def context_tokens():
+    """Largest context a request can get, what prompts have to fit in."""
+    if dynamic_context():
+        return num_ctx_buckets()[-1]
+    return int(os.getenv("OLLAMA_NUM_CTX", 2048))
+
+
+def num_ctx_for(messages, num_predict=None):
+    """Smallest bucket holding the estimated prompt plus the output budget, the largest when none does."""
+    prompt_tokens = sum(estimate_tokens(m["content"]) + 4 for m in messages)
+    needed = int(prompt_tokens * CONTEXT_MARGIN) + TEMPLATE_TOKENS + (num_predict or 0)
+    buckets = num_ctx_buckets()
+    return next((bucket for bucket in buckets if bucket >= needed), buckets[-1])
+
+
+_tuned = None
+
+
+def tuned_options(model):
+    """
+    num_thread, num_batch, ... stored by benchmarks/ollama_tuning_benchmark.py
+    (OLLAMA_TUNING_PATH, default ollama_tuning.json) for `model`, or for every model ("*").
+    """
+    global _tuned
+    if _tuned is None:
+        path = os.getenv("OLLAMA_TUNING_PATH", "ollama_tuning.json")
+        _tuned = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                _tuned = json.load(f)
+    return {**_tuned.get("*", {}).get("options", {}), **_tuned.get(model, {}).get("options", {})}
+
+
+def runtime_options(model, messages, options=None):
+    """
+    `options` with the tuned runtime options of the model and a num_ctx sized for the
+    request added, options passed by the caller win.
+    """
+    options = dict(options or {})
+    sized = {}
+    if dynamic_context() and "num_ctx" not in options:
+        sized["num_ctx"] = num_ctx_for(messages, options.get("num_predict"))
+    return {**tuned_options(model), **sized, **options}
+
+
+def warm_up_options(model):
+    """Options the model is loaded with before the first request, the smallest context bucket."""
+    options = tuned_options(model)
+    if dynamic_context():
+        options["num_ctx"] = num_ctx_buckets()[0]
+    return options
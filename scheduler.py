@@ -0,0 +1,51 @@
+import logging
+import os
+import time
+
+
+class RunDeadline:
+    """Wall-clock budget of a run in seconds, counted from when the deadline is created (None = no limit)."""
+
+    def __init__(self, seconds=None):
+        self.seconds = seconds
+        self.start = time.monotonic()
+
+    def remaining(self):
+        if self.seconds is None:
+            return None
+        return self.seconds - (time.monotonic() - self.start)
+
+    def expired(self):
+        return self.seconds is not None and self.remaining() <= 0
+
+
+_deadline = None
+
+
+def get_deadline():
+    """
+    Deadline shared by the process, started by the first area of the run. RUN_DEADLINE
+    in seconds; areas started after it get the template summary instead of an LLM call.
+    """
+    global _deadline
+    if _deadline is None:
+        seconds = os.getenv("RUN_DEADLINE")
+        _deadline = RunDeadline(float(seconds) if seconds else None)
+    return _deadline
+
+
+def impact_order(dataset, business_area, product_areas):
+    """
+    Product areas of a business area, biggest absolute Total Difference first, so the areas
+    that move the business most are summarised before a deadline. Duplicates are dropped.
+    WORK_ORDER=list keeps the order of the list.
+    """
+    product_areas = list(dict.fromkeys(product_areas))
+    if os.getenv("WORK_ORDER", "impact") == "list":
+        return product_areas
+
+    impact = dataset.drivers_per_product_area(business_area).set_index("Product Area")["Total Difference"].abs()
+    # Areas without data keep their place at the end
+    ordered = sorted(product_areas, key=lambda product_area: -impact.get(product_area, 0.0))
+    logging.info('----- Impact order %s: %s -----', business_area, ", ".join(ordered))
+    return ordered
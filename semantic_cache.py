@@ -0,0 +1,78 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from fingerprints import shape_fingerprint
+
+
+class SemanticCache:
+    """
+    Summaries keyed on the qualitative shape of the frame they were written from.
+
+    The key is the report, the summary type and the shape fingerprint of the area (see
+    fingerprints.shape_fingerprint), so a rerun with other numbers but the same overall
+    direction and pattern of product lines, regions, change types and ranks reuses the
+    summary without an LLM call. It sits behind the job journal, which only reuses results of identical input.
+    """
+
+    def __init__(self, path="semantic_cache.db"):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS summaries (report TEXT, summary_type TEXT, shape TEXT, "
+                "summary TEXT, model TEXT, hits INTEGER DEFAULT 0, updated TEXT, "
+                "PRIMARY KEY (report, summary_type, shape))"
+            )
+
+    def get(self, report, summary_type, df):
+        """(summary, model) stored for a frame of the same shape, None when there is none."""
+        shape = shape_fingerprint(df)
+        with self._lock, self.conn:
+            row = self.conn.execute(
+                "SELECT summary, model FROM summaries WHERE report = ? AND summary_type = ? AND shape = ?",
+                (report, summary_type, shape),
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute(
+                "UPDATE summaries SET hits = hits + 1 WHERE report = ? AND summary_type = ? AND shape = ?",
+                (report, summary_type, shape),
+            )
+        return row[0], row[1]
+
+    def put(self, report, summary_type, df, summary, model):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO summaries (report, summary_type, shape, summary, model, updated) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (report, summary_type, shape) DO UPDATE SET "
+                "summary = excluded.summary, model = excluded.model, updated = excluded.updated",
+                (report, summary_type, shape_fingerprint(df), summary, model,
+                 datetime.now().isoformat(timespec="seconds")),
+            )
+
+
+class DisabledCache:
+    """Stand-in used with SEMANTIC_CACHE=0, never has a summary."""
+
+    def get(self, report, summary_type, df):
+        return None
+
+    def put(self, report, summary_type, df, summary, model):
+        pass
+
+
+_cache = None
+
+
+def get_cache():
+    """Cache shared by the process (SEMANTIC_CACHE_PATH, default semantic_cache.db), SEMANTIC_CACHE=0 disables it."""
+    global _cache
+    if _cache is None:
+        if os.getenv("SEMANTIC_CACHE", "1") != "1":
+            _cache = DisabledCache()
+        else:
+            _cache = SemanticCache(os.getenv("SEMANTIC_CACHE_PATH", "semantic_cache.db"))
+    return _cache
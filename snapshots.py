@@ -0,0 +1,74 @@
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime
+
+
+def _pyarrow():
+    """pyarrow when it is installed, snapshots are skipped without it."""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def enabled():
+    """AGGREGATE_SNAPSHOTS=0 disables the snapshots; they also need pyarrow."""
+    if os.getenv("AGGREGATE_SNAPSHOTS", "1") != "1":
+        return False
+    if _pyarrow() is None:
+        logging.debug('----- pyarrow not installed, no aggregate snapshots -----')
+        return False
+    return True
+
+
+def snapshot_path(source_fingerprint, config):
+    """
+    Snapshot of an export under AGGREGATE_SNAPSHOT_DIR (default snapshots), keyed by the
+    fingerprint of the file and of the cleaning configuration it was computed with.
+    """
+    config_key = hashlib.sha1(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+    directory = os.getenv("AGGREGATE_SNAPSHOT_DIR", "snapshots")
+    return os.path.join(directory, f"{source_fingerprint[:16]}-{config_key[:12]}.arrow")
+
+
+def write_snapshot(path, frame, metadata):
+    """Writes `frame` with the JSON `metadata` as an Arrow IPC file. Returns False when the frame cannot be stored."""
+    pa = _pyarrow()
+    try:
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as error:
+        # e.g. a key column mixing codes with the 0 that fillna put in empty cells
+        logging.warning('----- Aggregates not snapshotted: %s -----', error)
+        return False
+
+    metadata = {**metadata, "created": datetime.now().isoformat(timespec="seconds")}
+    table = table.replace_schema_metadata({"snapshot": json.dumps(metadata)})
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Written next to the snapshot and renamed, so a process reading it never sees half a file
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(temporary, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(temporary, path)
+    return True
+
+
+def read_snapshot(path):
+    """
+    (Arrow table, metadata) of a snapshot, None when there is none. The table is memory-mapped:
+    nothing is read or copied until rows of it are converted, e.g. with table.slice(...).to_pandas().
+    """
+    if not os.path.exists(path):
+        return None
+    pa = _pyarrow()
+    try:
+        table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        metadata = json.loads(table.schema.metadata[b"snapshot"])
+    except (pa.ArrowInvalid, OSError, KeyError, ValueError) as error:
+        logging.warning('----- Snapshot %s unreadable (%s), recomputing -----', path, error)
+        return None
+    return table, metadata
@@ -0,0 +1,189 @@
+import logging
+import time
+
+from mapping import productline_mapping
+from ollama_client import get_client
+
+
+def _build_metrics(start, first_token_at, end, completion_tokens, prompt_tokens=None):
+    """Turns raw timestamps of one call into latency metrics (seconds)."""
+    total_latency = end - start
+    time_to_first_token = (first_token_at - start) if first_token_at is not None else total_latency
+    generation_time = end - first_token_at if first_token_at is not None else 0.0
+
+    return {
+        "time_to_first_token": round(time_to_first_token, 4),
+        "generation_time": round(generation_time, 4),
+        "total_latency": round(total_latency, 4),
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "tokens_per_second": round(completion_tokens / generation_time, 2) if generation_time > 0 else 0.0,
+    }
+
+
+def log_metrics(stage, metrics):
+    logging.info(
+        '----- Timing %s ----- load=%.2fs ttft=%.2fs total=%.2fs tokens=%s tok/s=%.1f',
+        stage, metrics.get("load_time", 0.0), metrics["time_to_first_token"], metrics["total_latency"],
+        metrics["completion_tokens"], metrics["tokens_per_second"]
+    )
+
+
+def _split_format(options):
+    """
+    (options, format): the JSON schema of a structured response travels in `options` through
+    the backends and is sent as the `format` of the request (see structured_output).
+    """
+    if not options or "format" not in options:
+        return options, None
+    options = dict(options)
+    return options, options.pop("format")
+
+
+def stream_ollama_chat(model, messages, options=None, on_token=None, client=None):
+    """
+    Streams an Ollama chat completion.
+
+    Every content chunk is passed to `on_token` as soon as it arrives.
+    Returns the full content and the metrics of the call.
+    """
+    if client is None:
+        client = get_client()
+
+    start = time.perf_counter()
+    first_token_at = None
+    parts = []
+    eval_count = None
+    prompt_eval_count = None
+    load_duration = None
+    done_reason = None
+
+    options, response_format = _split_format(options)
+    for chunk in client.chat(model=model, messages=messages, options=options, stream=True, format=response_format):
+        token = chunk['message']['content']
+        if token:
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            parts.append(token)
+            if on_token is not None:
+                on_token(token)
+        if chunk.get('done'):
+            eval_count = chunk.get('eval_count')
+            prompt_eval_count = chunk.get('prompt_eval_count')
+            load_duration = chunk.get('load_duration')
+            done_reason = chunk.get('done_reason')
+
+    end = time.perf_counter()
+    completion_tokens = eval_count if eval_count is not None else len(parts)
+
+    metrics = _build_metrics(start, first_token_at, end, completion_tokens, prompt_eval_count)
+    metrics["load_time"] = round((load_duration or 0) / 1e9, 4)
+    # "length" when generation stopped at num_predict
+    metrics["done_reason"] = done_reason
+
+    return "".join(parts), metrics
+
+
+def complete_ollama_chat(model, messages, options=None, client=None):
+    """Blocking Ollama chat completion, returns the content and the metrics of the call."""
+    if client is None:
+        client = get_client()
+
+    start = time.perf_counter()
+    options, response_format = _split_format(options)
+    response = client.chat(model=model, messages=messages, options=options, format=response_format)
+    end = time.perf_counter()
+
+    content = response['message']['content']
+    completion_tokens = response.get('eval_count') or 0
+    # Without streaming the first token is only seen together with the last one
+    metrics = _build_metrics(start, end, end, completion_tokens, response.get('prompt_eval_count'))
+    eval_duration = response.get('eval_duration')
+    if eval_duration:
+        metrics["tokens_per_second"] = round(completion_tokens / (eval_duration / 1e9), 2)
+    metrics["load_time"] = round((response.get('load_duration') or 0) / 1e9, 4)
+    metrics["done_reason"] = response.get('done_reason')
+
+    return content, metrics
+
+
+def stream_openai_chat(client, model, messages, on_token=None, **kwargs):
+    """
+    Streams an OpenAI chat completion.
+
+    Returns the content and the metrics of the call, with the token counts
+    taken from the usage reported in the final chunk.
+    """
+    start = time.perf_counter()
+    first_token_at = None
+    parts = []
+    usage = None
+
+    stream = client.chat.completions.create(
+        model=model,
+        messages=messages,
+        stream=True,
+        stream_options={"include_usage": True},
+        **kwargs
+    )
+
+    for chunk in stream:
+        if chunk.usage is not None:
+            usage = chunk.usage
+        if not chunk.choices:
+            continue
+        token = chunk.choices[0].delta.content
+        if token:
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            parts.append(token)
+            if on_token is not None:
+                on_token(token)
+
+    end = time.perf_counter()
+    completion_tokens = usage.completion_tokens if usage is not None else len(parts)
+    prompt_tokens = usage.prompt_tokens if usage is not None else None
+
+    return "".join(parts), _build_metrics(start, first_token_at, end, completion_tokens, prompt_tokens)
+
+
+def complete_openai_chat(client, model, messages, **kwargs):
+    """Blocking OpenAI chat completion, returns the content and the metrics of the call."""
+    start = time.perf_counter()
+    response = client.chat.completions.create(model=model, messages=messages, **kwargs)
+    end = time.perf_counter()
+
+    content = response.choices[0].message.content
+    usage = response.usage
+    metrics = _build_metrics(start, end, end, usage.completion_tokens, usage.prompt_tokens)
+    metrics["tokens_per_second"] = round(usage.completion_tokens / (end - start), 2) if end > start else 0.0
+
+    return content, metrics
+
+
+class MappedStreamWriter:
+    """
+    Writes streamed tokens to an open report file as they arrive.
+
+    Product line codes can be split across tokens, so text is only mapped and
+    written once a word boundary has been seen. Call `close()` to flush the rest.
+    """
+
+    def __init__(self, file, mapper=productline_mapping):
+        self.file = file
+        self.mapper = mapper
+        self._buffer = ""
+
+    def __call__(self, token):
+        self._buffer += token
+        cut = max(self._buffer.rfind(' '), self._buffer.rfind('\n'))
+        if cut >= 0:
+            self.file.write(self.mapper(self._buffer[:cut + 1]))
+            self.file.flush()
+            self._buffer = self._buffer[cut + 1:]
+
+    def close(self):
+        if self._buffer:
+            self.file.write(self.mapper(self._buffer))
+            self._buffer = ""
+        self.file.flush()
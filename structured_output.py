@@ -0,0 +1,109 @@
+import json
+import logging
+import os
+import re
+
+
+MAX_SENTENCES = 4
+# Output budget of a JSON summary, the same as the text budget of the summary stage
+JSON_NUM_PREDICT = 200
+
+# One entry per summary sentence with what it states, so the report needs no sentence
+# splitting and the validation no parsing of prose. "regions" is ["all"] for "in all regions"
+# and empty for a product line as a whole.
+SUMMARY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "sentences": {
+            "type": "array",
+            "maxItems": MAX_SENTENCES,
+            "items": {
+                "type": "object",
+                "properties": {
+                    "text": {"type": "string"},
+                    "product_lines": {"type": "array", "items": {"type": "string"}},
+                    "regions": {"type": "array", "items": {"type": "string"}},
+                    "direction": {"type": "string", "enum": ["up", "down"]},
+                },
+                "required": ["text", "product_lines", "regions", "direction"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["sentences"],
+    "additionalProperties": False,
+}
+
+JSON_INSTRUCTIONS = """
+Answer in JSON: {"sentences": [{"text": ..., "product_lines": [...], "regions": [...], "direction": "up" or "down"}]}
+with one entry per summary sentence, at most 4. "product_lines" and "regions" list what the sentence mentions,
+exactly as written in the data; use ["all"] as regions for "in all regions" and [] for a product line as a whole.
+"""
+
+
+def structured_output():
+    """SUMMARY_FORMAT=json asks for the summary as JSON with one entry per sentence (default text)."""
+    return os.getenv("SUMMARY_FORMAT", "text") == "json"
+
+
+def json_options(options):
+    """
+    Ollama `options` of a summary asked for in JSON: the schema travels as "format" (see
+    streaming), with the output budget of a text summary.
+    """
+    return {**options, "format": SUMMARY_SCHEMA, "num_predict": JSON_NUM_PREDICT}
+
+
+def openai_response_format():
+    """`response_format` of an OpenAI chat completion for the summary (structured outputs)."""
+    return {"type": "json_schema", "json_schema": {"name": "summary", "strict": True, "schema": SUMMARY_SCHEMA}}
+
+
+def parse_sentences(content):
+    """
+    The sentence entries of a JSON summary, None when `content` is not one
+    (e.g. a model or backend that ignored the format).
+    """
+    text = re.sub(r"^```(?:json)?\s*|\s*```$", "", content.strip())
+    try:
+        sentences = json.loads(text)["sentences"]
+    except (ValueError, KeyError, TypeError):
+        logging.warning('----- Summary is not in the JSON format, kept as text -----')
+        return None
+    if not isinstance(sentences, list):
+        return None
+
+    parsed = []
+    for sentence in sentences:
+        if not isinstance(sentence, dict) or not str(sentence.get("text", "")).strip():
+            continue
+        parsed.append({
+            "text": str(sentence["text"]).strip(),
+            "product_lines": [str(pl) for pl in sentence.get("product_lines") or []],
+            "regions": [str(region) for region in sentence.get("regions") or []],
+            "direction": sentence.get("direction"),
+        })
+    if len(parsed) > MAX_SENTENCES:
+        logging.warning('----- Summary has %s sentences, the limit is %s -----', len(parsed), MAX_SENTENCES)
+    return parsed
+
+
+def summary_text(sentences):
+    """The summary as stored and reported, one sentence per line."""
+    return "\n".join(sentence["text"] for sentence in sentences)
+
+
+def split_sentences(summary, from_json=False):
+    """Sentences of a stored summary. Summaries written from JSON (`from_json`) have one per line."""
+    summary = summary.strip()
+    if from_json:
+        return [line.strip() for line in summary.splitlines() if line.strip()]
+    return re.split(r'(?<=[.!?])\s+', summary)
+
+
+def parse_summary(content):
+    """(summary text, sentence entries) of a completion asked for in JSON, (content, None) when it is not JSON."""
+    sentences = parse_sentences(content)
+    if not sentences:
+        return content.strip(), None
+    return summary_text(sentences), sentences
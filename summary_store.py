@@ -0,0 +1,158 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+
+KEY_COLUMNS = ["Report", "Dataset", "Period", "Business Area", "Product Area", "Summary Type", "Model"]
+
+# New columns go at the end, stores created before get them added in that order
+STORE_COLUMNS = KEY_COLUMNS + [
+    "Summary", "Validation", "Source Fingerprint",
+    "Input Tokens", "Output Tokens", "Total Tokens", "Estimated Cost ($)", "Updated", "Summary Format",
+]
+
+
+def _sql_name(column):
+    return column.lower().replace(" ($)", "").replace(" ", "_")
+
+
+def default_period():
+    """Reporting period of a run, REPORT_PERIOD or the current month."""
+    return os.getenv("REPORT_PERIOD") or f"{datetime.now():%Y-%m}"
+
+
+class SummaryStore:
+    """
+    SQLite store of generated summaries.
+
+    One row per report (the script writing it), dataset, period, business area,
+    product area, summary type and model. Writing the same key again replaces the
+    row, so reruns never pile up duplicates, and the TXT/CSV reports are rendered
+    from the store instead of being appended to.
+    """
+
+    def __init__(self, path="summaries.db"):
+        self.path = path
+        # One connection shared by the threads of the process, used under the lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.RLock()
+        definitions = {
+            col: f"{_sql_name(col)} {'REAL' if col == 'Estimated Cost ($)' else 'INTEGER' if 'Tokens' in col else 'TEXT'}"
+                 + (" NOT NULL DEFAULT ''" if col in KEY_COLUMNS else "")
+            for col in STORE_COLUMNS
+        }
+        key = ", ".join(_sql_name(col) for col in KEY_COLUMNS)
+        with self.conn:
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS summaries ({', '.join(definitions.values())}, PRIMARY KEY ({key}))")
+            existing = {row[1] for row in self.conn.execute("PRAGMA table_info(summaries)")}
+            for col in STORE_COLUMNS:
+                if _sql_name(col) not in existing:
+                    self.conn.execute(f"ALTER TABLE summaries ADD COLUMN {definitions[col]}")
+            # Latest summary of an area without scanning the table
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS summaries_area "
+                "ON summaries (report, business_area, product_area, summary_type, updated)"
+            )
+
+    def upsert(self, report, dataset, period, business_area, product_area, summary_type, model, summary,
+               validation=None, source_fingerprint=None, input_tokens=None, output_tokens=None,
+               estimated_cost=None, summary_format=None):
+        row = {
+            "Report": report,
+            "Dataset": os.path.basename(str(dataset)),
+            "Period": period,
+            "Business Area": business_area or "",
+            "Product Area": product_area or "",
+            "Summary Type": summary_type,
+            "Model": model or "",
+            "Summary": summary,
+            "Validation": validation,
+            "Source Fingerprint": source_fingerprint,
+            "Input Tokens": input_tokens,
+            "Output Tokens": output_tokens,
+            "Total Tokens": (input_tokens or 0) + (output_tokens or 0) if input_tokens is not None else None,
+            "Estimated Cost ($)": estimated_cost,
+            "Updated": datetime.now().isoformat(timespec="seconds"),
+            # "json" when the summary was written from JSON sentences, one per line
+            "Summary Format": summary_format or "",
+        }
+        names = [_sql_name(col) for col in STORE_COLUMNS]
+        updates = ", ".join(f"{name} = excluded.{name}" for name, col in zip(names, STORE_COLUMNS)
+                            if col not in KEY_COLUMNS)
+        key = ", ".join(_sql_name(col) for col in KEY_COLUMNS)
+        with self._lock, self.conn:
+            self.conn.execute(
+                f"INSERT INTO summaries ({', '.join(names)}) VALUES ({', '.join('?' * len(names))}) "
+                f"ON CONFLICT ({key}) DO UPDATE SET {updates}",
+                [row[col] for col in STORE_COLUMNS],
+            )
+        return row
+
+    def latest(self, report, business_area, product_area=None, summary_type=None):
+        """Most recently written summary of one area as a dict, None when there is none."""
+        query = "SELECT * FROM summaries WHERE report = ? AND business_area = ? AND product_area = ?"
+        params = [report, business_area or "", product_area or ""]
+        if summary_type is not None:
+            query += " AND summary_type = ?"
+            params.append(summary_type)
+        with self._lock:
+            values = self.conn.execute(query + " ORDER BY updated DESC LIMIT 1", params).fetchone()
+        return dict(zip(STORE_COLUMNS, values)) if values else None
+
+    def query(self, latest_only=True, **filters):
+        """
+        Summaries matching the filters (keyword per column, e.g. report=, period=, summary_type=).
+
+        With `latest_only`, an area that was written by several datasets or models
+        in the same period is returned once, with its most recent summary.
+        """
+        import pandas as pd
+
+        where = " AND ".join(f"{name} = ?" for name in filters)
+        sql = "SELECT * FROM summaries" + (f" WHERE {where}" if where else "") + " ORDER BY updated, rowid"
+        with self._lock:
+            df = pd.read_sql_query(sql, self.conn, params=list(filters.values()))
+        df.columns = STORE_COLUMNS
+        if latest_only:
+            df = df.drop_duplicates(subset=["Report", "Period", "Business Area", "Product Area", "Summary Type"],
+                                    keep="last")
+        return df.sort_values(by=["Period", "Summary Type", "Business Area", "Product Area"]).reset_index(drop=True)
+
+    def export_csv(self, path, render=None, **filters):
+        """Renders the matching summaries, reshaped by `render(df) -> df`, as a CSV report replacing the previous export."""
+        with self._lock:
+            df = self.query(**filters)
+            if render is not None:
+                df = render(df)
+            df.to_csv(path, index=False, sep=';', encoding='utf-8-sig')
+        return df
+
+    def export_txt(self, path, render, **filters):
+        """Renders the matching summaries with `render(df) -> str` as a text report, replacing the previous export."""
+        # Under the lock so a slower export never overwrites a newer one
+        with self._lock:
+            df = self.query(**filters)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(render(df))
+        return df
+
+
+_store = None
+
+
+def get_store():
+    """Store shared by the process (SUMMARY_STORE_PATH, default summaries.db)."""
+    global _store
+    if _store is None:
+        _store = SummaryStore(os.getenv("SUMMARY_STORE_PATH", "summaries.db"))
+    return _store
+
+
+if __name__ == "__main__":
+    import pandas as pd
+
+    pd.set_option("display.width", 200)
+    pd.set_option("display.max_colwidth", 80)
+    print(get_store().query()[["Report", "Period", "Business Area", "Product Area", "Summary Type", "Model",
+                               "Summary"]].to_string(index=False))
@@ -0,0 +1,71 @@
+# Areas with at most this many Product Line x Region rows are written from the template
+TEMPLATE_MAX_ROWS = 3
+# The top row counts as "main" driver/detractor when it is this much larger than the next one
+MAIN_DRIVER_RATIO = 1.5
+
+
+def is_trivial(df, max_rows=TEMPLATE_MAX_ROWS):
+    """True when an area has only a handful of rows or every row moved in the same direction."""
+    if df.empty or "Total Difference" not in df.columns:
+        return False
+    changes = df.loc[df["Total Difference"] != 0, "Total Difference"]
+    if changes.empty:
+        return True
+    return len(df) <= max_rows or (changes > 0).all() or (changes < 0).all()
+
+
+def _region_sentence(product_line, region, up):
+    return f"Increase from {product_line} in {region}." if up else f"{product_line} decreasing in {region}."
+
+
+def template_summary(df, max_sentences=4):
+    """
+    Writes a summary in the house style of PROMPT_TEMPLATES without calling an LLM:
+    "All product lines up.", "[Product Line] in [Region] as main growth driver.",
+    "[Product Line] up in all regions.", "[Product Line] in [Region] as main detractor,
+    partly offset by [Product Line] in [Region]." Every product line is mentioned once.
+    """
+    df = df[df["Total Difference"] != 0]
+    if df.empty:
+        return "No changes across product lines and regions."
+
+    df = df.assign(_abs=df["Total Difference"].abs()).sort_values(by="_abs", ascending=False)
+    sentences = []
+    mentioned = set()
+
+    all_up = (df["Total Difference"] > 0).all()
+    all_down = (df["Total Difference"] < 0).all()
+    if df["Product Line"].nunique() > 1 and (all_up or all_down):
+        sentences.append("All product lines up." if all_up else "All product lines down.")
+
+    # Main driver only when the largest movement stands out from the next one
+    top = df.iloc[0]
+    top_up = top["Total Difference"] > 0
+    stands_out = len(df) == 1 or top["_abs"] >= MAIN_DRIVER_RATIO * df.iloc[1]["_abs"]
+    if stands_out:
+        sentence = f"{top['Product Line']} in {top['Region']} as {'main growth driver' if top_up else 'main detractor'}"
+        opposite = df[(df["Total Difference"] > 0) != top_up]
+        opposite = opposite[opposite["Product Line"] != top["Product Line"]]
+        if not opposite.empty:
+            offset = opposite.iloc[0]
+            sentence += f", partly offset by {offset['Product Line']} in {offset['Region']}"
+            mentioned.add(offset["Product Line"])
+        sentences.append(sentence + ".")
+        mentioned.add(top["Product Line"])
+
+    # Remaining product lines, largest movement first
+    for product_line, rows in df.groupby("Product Line", sort=False):
+        if len(sentences) >= max_sentences:
+            break
+        if product_line in mentioned:
+            continue
+        mentioned.add(product_line)
+
+        if len(rows) > 1 and ((rows["Total Difference"] > 0).all() or (rows["Total Difference"] < 0).all()):
+            direction = "up" if rows["Total Difference"].iloc[0] > 0 else "down"
+            sentences.append(f"{product_line} {direction} in all regions.")
+        else:
+            row = rows.iloc[0]
+            sentences.append(_region_sentence(product_line, row["Region"], row["Total Difference"] > 0))
+
+    return " ".join(sentences[:max_sentences])
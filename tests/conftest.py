@@ -0,0 +1,15 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "Local"), os.path.join(ROOT, "OpenAI"), os.path.join(ROOT, "benchmarks")]
+
+# Nothing the tests run writes next to the code
+STATE = tempfile.mkdtemp(prefix="report-tests-")
+os.environ.setdefault("USAGE_LEDGER_PATH", os.devnull)
+os.environ.setdefault("JOB_JOURNAL_PATH", os.path.join(STATE, "job_journal.jsonl"))
+os.environ.setdefault("SEMANTIC_CACHE_PATH", os.path.join(STATE, "semantic_cache.db"))
+os.environ.setdefault("SUMMARY_STORE_PATH", os.path.join(STATE, "summaries.db"))
+os.environ.setdefault("AGGREGATE_SNAPSHOT_DIR", os.path.join(STATE, "snapshots"))
+os.environ.setdefault("AGGREGATE_SNAPSHOTS", "0")
@@ -0,0 +1,66 @@
+import pandas as pd
+
+from chunking import reduce_texts, split_frame
+from prompt_serialization import estimate_tokens
+
+
+def render(frame):
+    return "\n".join(f"{row['Product Line']} {row['Region']} {row['Total Difference']}" for _, row in frame.iterrows())
+
+
+def frame(product_lines=4, regions=3):
+    return pd.DataFrame([
+        {"Product Line": f"PL{pl}", "Region": f"Region{region}", "Total Difference": 1000 * pl + region}
+        for pl in range(product_lines) for region in range(regions)
+    ])
+
+
+def test_chunks_fit_the_budget_and_keep_product_lines_together():
+    df = frame()
+    budget = estimate_tokens(render(df[df["Product Line"].isin(["PL0", "PL1"])]))
+    chunks = split_frame(df, render, budget)
+
+    assert len(chunks) > 1
+    assert all(estimate_tokens(render(chunk)) <= budget for chunk in chunks)
+    assert pd.concat(chunks).equals(df)
+    for pl in df["Product Line"].unique():
+        assert sum(pl in set(chunk["Product Line"]) for chunk in chunks) == 1
+
+
+def test_product_line_too_large_on_its_own_is_split_by_region():
+    df = frame(product_lines=1, regions=6)
+    budget = estimate_tokens(render(df.iloc[:2]))
+    chunks = split_frame(df, render, budget)
+
+    assert len(chunks) >= 3
+    assert all(estimate_tokens(render(chunk)) <= budget for chunk in chunks)
+    assert pd.concat(chunks).equals(df)
+
+
+def test_output_tokens_per_row_count_against_the_budget():
+    df = frame()
+    budget = estimate_tokens(render(df))
+    assert len(split_frame(df, render, budget)) == 1
+    assert len(split_frame(df, render, budget, row_tokens=25)) > 1
+
+
+def test_chunk_results_are_merged_until_they_fit():
+    texts = [f"Result {i}: PL{i} rose in Europe." for i in range(8)]
+    calls = []
+
+    def combine(index, group):
+        calls.append(len(group))
+        return group[0]
+
+    joined = reduce_texts(texts, combine, estimate_tokens("\n\n".join(texts[:3])))
+    assert estimate_tokens(joined) <= estimate_tokens("\n\n".join(texts[:3]))
+    assert calls and all(size > 1 for size in calls)
+
+
+def test_results_that_fit_are_joined_without_merging():
+    texts = ["PL1 rose.", "PL2 fell."]
+
+    def combine(index, group):
+        raise AssertionError("no merge expected")
+
+    assert reduce_texts(texts, combine, 1000) == "PL1 rose.\n\nPL2 fell."
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_processing import BUSINESS_AREA, COUNTRY, PRODUCT_AREA, PRODUCT_LINE, REGION, DataHandler
+from query_memory_benchmark import PRODUCT_AREA_QUERIES, measure, synthetic_export
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    return DataHandler.from_frame(synthetic_export(300, 1800))
+
+
+def substituted(df):
+    """Region substitution of the original row-wise implementation."""
+    df = df.copy()
+    if df.empty:
+        return df
+    country = df[COUNTRY].astype(str).str.strip().str.lower()
+    df[REGION] = df.apply(lambda row: 'China' if country[row.name] in ['china', 'cn']
+                          else 'US' if country[row.name] in ['usa', 'us'] else row[REGION], axis=1)
+    return df
+
+
+def grouped(df, keys, names, order):
+    result = (df.groupby(keys)['[Difference]'].sum().reset_index()
+              .rename(columns={**names, '[Difference]': "Total Difference"}))
+    return result.sort_values(by=order, ascending=False)
+
+
+def with_contribution(df, column):
+    total = df["Total Difference"].sum()
+    df[column] = df["Total Difference"] / total * (-100 if total < 0 else 100)
+    return df
+
+
+NAMES = {PRODUCT_AREA: "Product Area", PRODUCT_LINE: "Product Line", REGION: "Region"}
+
+
+def unpruned(df, query, business_area, product_area=None):
+    """The query as it was computed on a mask over the whole dataset."""
+    rows = df[df[BUSINESS_AREA] == business_area]
+    if product_area is not None:
+        rows = rows[rows[PRODUCT_AREA] == product_area]
+    if query == "drivers_per_product_area":
+        return grouped(rows, [PRODUCT_AREA], NAMES, "Total Difference")
+    if query == "drivers_per_product_area_regions":
+        return grouped(rows, [PRODUCT_AREA, REGION], NAMES, "Total Difference")
+    if query == "drivers_in_product_area_region":
+        return grouped(rows, [PRODUCT_LINE, REGION], NAMES, "Total Difference")
+    if query == "drivers_in_product_area_region_relative":
+        return with_contribution(grouped(substituted(rows), [PRODUCT_LINE, REGION], NAMES, "Product Line"),
+                                 "Product Area Contribution %")
+    if query == "drivers_in_business_area_region_relative2":
+        return with_contribution(grouped(substituted(rows), [PRODUCT_LINE, REGION], NAMES, "Product Line"),
+                                 "Business Area Contribution %")
+    raise ValueError(query)
+
+
+@pytest.mark.parametrize("query", ["drivers_per_product_area", "drivers_per_product_area_regions",
+                                   "drivers_in_business_area_region_relative2"])
+@pytest.mark.parametrize("business_area", ["ACTH", "SWIC", "NONE"])
+def test_business_area_queries_match_the_unpruned_path(dataset, query, business_area):
+    expected = unpruned(dataset.df, query, business_area)
+    pd.testing.assert_frame_equal(getattr(dataset, query)(business_area), expected, check_exact=True,
+                                  check_dtype=len(expected) > 0, check_index_type=len(expected) > 0)
+
+
+@pytest.mark.parametrize("query", ["drivers_in_product_area_region", "drivers_in_product_area_region_relative"])
+@pytest.mark.parametrize("area", [("ACTH", "ACAT"), ("ACTH", "ACVI"), ("SWIC", "ARJO")])
+def test_product_area_queries_match_the_unpruned_path(dataset, query, area):
+    pd.testing.assert_frame_equal(getattr(dataset, query)(*area), unpruned(dataset.df, query, *area),
+                                  check_exact=True)
+
+
+def test_row_filters_match_the_unpruned_path(dataset):
+    df = dataset.df
+    pd.testing.assert_frame_equal(dataset.filter_by_business_area("ACTH"), df[df[BUSINESS_AREA] == "ACTH"])
+    pd.testing.assert_frame_equal(dataset.filter_by_product_area("ARJO"), df[df[PRODUCT_AREA] == "ARJO"])
+    pd.testing.assert_frame_equal(dataset.region_substitute("ACTH", "ACAT"),
+                                  substituted(df[(df[BUSINESS_AREA] == "ACTH") & (df[PRODUCT_AREA] == "ACAT")]))
+
+
+def test_queries_do_not_modify_the_dataset(dataset):
+    before = dataset.df.copy()
+    rows = dataset.region_substitute("ACTH", columns=["[Difference]"])
+    rows["[Difference]"] = np.nan
+    dataset.preprocess_orderintake_by_product_area("ACTH", "ACAT")
+    pd.testing.assert_frame_equal(dataset.df, before)
+
+
+def test_product_area_peak_does_not_grow_with_the_business_area():
+    small, _ = measure(2000, 2000)
+    large, _ = measure(2000, 20000)
+    for query in PRODUCT_AREA_QUERIES:
+        assert large[query][0] <= 1.25 * small[query][0], query
+        assert large[query][0] < 512 * 1024, query
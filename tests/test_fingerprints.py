@@ -0,0 +1,20 @@
+import pandas as pd
+
+from fingerprints import shape_fingerprint
+
+
+def area(differences):
+    return pd.DataFrame({
+        "Product Line": ["PL1", "PL2", "PL3"],
+        "Region": ["Europe", "Europe", "Asia"],
+        "Total Difference": differences,
+    })
+
+
+def test_rescaled_area_has_the_same_shape():
+    assert shape_fingerprint(area([10, -6, -3])) == shape_fingerprint(area([1000, -600, -300]))
+
+
+def test_direction_of_the_overall_change_is_part_of_the_shape():
+    # Same ranks and change types, but the area grows in one and shrinks in the other
+    assert shape_fingerprint(area([10, -6, -3])) != shape_fingerprint(area([10, -6, -5]))
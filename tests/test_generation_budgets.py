@@ -0,0 +1,18 @@
+from generation_budgets import stage_options
+
+
+def test_natural_language_budget_grows_with_the_rows_of_the_block():
+    small = stage_options("llama3.1:8b", "natural_language", rows=4)["num_predict"]
+    large = stage_options("llama3.1:8b", "natural_language", rows=40)["num_predict"]
+    assert large - small == 36 * 25
+    assert "num_predict_per_row" not in stage_options("llama3.1:8b", "natural_language", rows=4)
+
+
+def test_options_of_the_caller_win_over_the_budget():
+    options = stage_options("llama3.1:8b", "natural_language", {"num_predict": 64}, rows=40)
+    assert options["num_predict"] == 64
+
+
+def test_budgets_can_be_turned_off(monkeypatch):
+    monkeypatch.setenv("STAGE_BUDGETS", "0")
+    assert stage_options("llama3.1:8b", "natural_language", {"temperature": 0}, rows=40) == {"temperature": 0}
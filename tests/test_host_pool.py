@@ -0,0 +1,77 @@
+import socket
+import time
+
+import httpx
+import pytest
+
+from host_pool import HostPool
+from llm_backends import PooledOllamaBackend
+from ollama_standin import StandInServer
+from usage_ledger import get_ledger
+
+
+@pytest.fixture
+def blackholes():
+    """URLs of two ports that accept connections but never answer."""
+    listeners = [socket.socket() for _ in range(2)]
+    for listener in listeners:
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(16)
+    yield [f"http://127.0.0.1:{listener.getsockname()[1]}" for listener in listeners]
+    for listener in listeners:
+        listener.close()
+
+
+@pytest.fixture
+def server():
+    server = StandInServer(11921, load_time=0.0).start()
+    yield server
+    server.stop()
+
+
+def test_unreachable_host_does_not_stall_startup_or_requests(blackholes, server):
+    start = time.perf_counter()
+    pool = HostPool(blackholes + [server.url], check_interval=0.1, health_timeout=0.5)
+    try:
+        # Both dead hosts are checked side by side, within one health timeout
+        assert time.perf_counter() - start < 1.5
+        assert [host.healthy for host in pool.hosts] == [False, False, True]
+
+        # Their rechecks are due all the time, but run in the background
+        start = time.perf_counter()
+        for _ in range(20):
+            with pool.acquire(("ACTH", "ACAT")) as host:
+                assert host.url == server.url
+        assert time.perf_counter() - start < 0.1
+    finally:
+        pool.close()
+
+
+def test_host_is_used_again_once_it_answers(server):
+    pool = HostPool([server.url], check_interval=0.1, health_timeout=0.5)
+    try:
+        pool.mark_down(pool.hosts[0], ConnectionError("gone"))
+        assert pool.choose() is None
+
+        deadline = time.monotonic() + 3
+        while not pool.hosts[0].healthy and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert pool.choose() is pool.hosts[0]
+    finally:
+        pool.close()
+
+
+def test_read_timeout_keeps_the_host_and_its_pins():
+    # A slow generation, the request times out while the host is still answering
+    server = StandInServer(11922, eval_rate=2.0, load_time=0.0).start()
+    pool = HostPool([server.url], timeout=0.5, check_interval=60)
+    get_ledger().set_area("ACTH", "ACAT")
+    try:
+        with pytest.raises(httpx.ReadTimeout):
+            PooledOllamaBackend(pool).chat("llama3.1:8b", [{"role": "user", "content": "Summarise the product area."}])
+        assert pool.hosts[0].healthy
+        assert pool.pins == {("ACTH", "ACAT"): pool.hosts[0]}
+    finally:
+        get_ledger().set_area(None, None)
+        pool.close()
+        server.stop()
@@ -0,0 +1,19 @@
+from job_journal import JobJournal
+
+
+def test_unchanged_input_reuses_the_result_of_another_export(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    JobJournal("report", path, config="a").record("export-1", "ACTH", "ACAT", "summary", "up", fingerprint="input")
+
+    journal = JobJournal("report", path, config="a")
+    assert journal.reusable("export-2", "ACTH", "ACAT", "summary", "input")
+    assert journal.step("export-2", "ACTH", "ACAT", "summary", lambda: "new", fingerprint="input") == "up"
+
+
+def test_result_of_another_config_is_not_reused(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    JobJournal("report", path, config="a").record("export-1", "ACTH", "ACAT", "summary", "up", fingerprint="input")
+
+    journal = JobJournal("report", path, config="b")
+    assert not journal.reusable("export-2", "ACTH", "ACAT", "summary", "input")
+    assert journal.step("export-2", "ACTH", "ACAT", "summary", lambda: "new", fingerprint="input") == "new"
@@ -0,0 +1,93 @@
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from llm_backends import CallPolicy, FakeBackend, OllamaBackend, ReliableBackend
+from ollama_client import ManagedOllamaClient
+
+MESSAGES = [{"role": "user", "content": "Summarise the product area."}]
+
+
+class FailingBackend(FakeBackend):
+    """Raises `error` on every call, after streaming `partial` when given."""
+
+    def __init__(self, error, partial=None):
+        super().__init__()
+        self.error = error
+        self.partial = partial
+
+    def chat(self, model, messages, options=None, stream=False, on_token=None):
+        self.calls += 1
+        if self.partial and on_token is not None:
+            on_token(self.partial)
+        raise self.error
+
+
+@pytest.fixture
+def blackhole():
+    """URL of a port that accepts connections but never answers."""
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(16)
+    yield f"http://127.0.0.1:{listener.getsockname()[1]}"
+    listener.close()
+
+
+def test_timed_out_call_frees_its_worker(blackhole):
+    client = ManagedOllamaClient(host=blackhole, timeout=0.5)
+    backend = ReliableBackend(OllamaBackend(client), CallPolicy(deadline=0.5, max_retries=0), max_workers=1)
+    with pytest.raises(Exception):
+        backend.chat("llama3.1:8b", MESSAGES)
+
+    # The server never answers; the request timeout ends the call and frees the only worker
+    start = time.perf_counter()
+    backend._executor.submit(lambda: None).result(timeout=2)
+    assert time.perf_counter() - start < 2
+
+
+def test_waiting_for_a_worker_does_not_use_up_the_deadline():
+    # The second four calls wait 0.4s for a thread and finish 0.8s after they were made
+    backend = ReliableBackend(FakeBackend(latency=0.4), CallPolicy(deadline=0.7, max_retries=0), max_workers=4)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: backend.chat("model", MESSAGES), range(8)))
+    assert len(results) == 8
+    assert backend.backend.calls == 8
+
+
+def test_call_waiting_too_long_for_a_worker_times_out():
+    backend = ReliableBackend(FakeBackend(latency=2.0), CallPolicy(deadline=0.3, max_retries=0), max_workers=1)
+    with pytest.raises(TimeoutError):
+        backend.chat("model", MESSAGES)
+
+    start = time.perf_counter()
+    with pytest.raises(TimeoutError):
+        backend.chat("model", MESSAGES)
+    assert time.perf_counter() - start < 1.0
+    # The queued call was dropped, not run after the first one
+    time.sleep(2.0)
+    assert backend.backend.calls == 1
+
+
+def test_bad_requests_are_not_retried():
+    backend = ReliableBackend(FailingBackend(ValueError("model not found")), CallPolicy(max_retries=2, backoff=0))
+    with pytest.raises(ValueError):
+        backend.chat("model", MESSAGES)
+    assert backend.backend.calls == 1
+
+
+def test_lost_connections_are_retried():
+    backend = ReliableBackend(FakeBackend(failures=2), CallPolicy(max_retries=2, backoff=0))
+    _, metrics = backend.chat("model", MESSAGES)
+    assert metrics["attempts"] == 3
+
+
+def test_streamed_call_is_not_retried_after_a_token():
+    backend = ReliableBackend(FailingBackend(ConnectionError("cut off"), partial="Sales "),
+                              CallPolicy(max_retries=2, backoff=0))
+    tokens = []
+    with pytest.raises(ConnectionError):
+        backend.chat("model", MESSAGES, stream=True, on_token=tokens.append)
+    assert backend.backend.calls == 1
+    assert tokens == ["Sales "]
@@ -0,0 +1,80 @@
+import pytest
+
+import job_journal
+import llm_backends
+import netsales_workflow
+import scheduler
+from data_processing import DataHandler
+from job_journal import JobJournal
+from llm_backends import FakeBackend, ReliableBackend
+from query_memory_benchmark import synthetic_export
+from scheduler import RunDeadline, impact_order
+from semantic_cache import SemanticCache
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    return DataHandler.from_frame(synthetic_export(400, 2400), source_fingerprint="export")
+
+
+@pytest.fixture
+def workflow(tmp_path, monkeypatch):
+    """netsales_workflow with its own journal, an empty semantic cache and a counting fake backend."""
+    backend = FakeBackend()
+    monkeypatch.setitem(llm_backends._backends, "ollama", ReliableBackend(backend))
+    monkeypatch.setattr(netsales_workflow, "template_fast_path", False)
+    monkeypatch.setitem(job_journal._journals, "netsales_workflow",
+                        JobJournal("netsales_workflow", str(tmp_path / "journal.jsonl")))
+    cache = SemanticCache(str(tmp_path / "cache.db"))
+    monkeypatch.setattr(netsales_workflow, "get_cache", lambda: cache)
+    return netsales_workflow, backend
+
+
+def test_biggest_areas_come_first_and_duplicates_once(dataset):
+    product_areas = ['ACAT', 'ACCA', 'ACCC', 'ACCP', 'ACCP', 'ACG3', 'ACTC', 'ACVI']
+    impact = dataset.drivers_per_product_area("ACTH").set_index("Product Area")["Total Difference"].abs()
+
+    ordered = impact_order(dataset, "ACTH", product_areas)
+    assert sorted(ordered) == sorted(set(product_areas))
+    assert [impact[pa] for pa in ordered] == sorted(impact[pa] for pa in ordered)[::-1]
+
+
+def test_areas_without_data_go_last(dataset):
+    assert impact_order(dataset, "ACTH", ['XXXX', 'ACAT', 'ACCA'])[-1] == 'XXXX'
+
+
+def test_list_order_is_kept_on_request(dataset, monkeypatch):
+    monkeypatch.setenv("WORK_ORDER", "list")
+    assert impact_order(dataset, "ACTH", ['ACVI', 'ACAT', 'ACVI', 'ACCA']) == ['ACVI', 'ACAT', 'ACCA']
+
+
+def test_deadline_without_limit_never_expires():
+    assert RunDeadline().remaining() is None
+    assert not RunDeadline().expired()
+    assert RunDeadline(0).expired()
+
+
+def test_areas_after_the_deadline_get_the_template_without_llm_calls(workflow, dataset, monkeypatch):
+    module, backend = workflow
+    monkeypatch.setattr(scheduler, "_deadline", RunDeadline(0))
+
+    summary_result, _, model = module.all_prompts_together(dataset, "ACTH", "ACCA")
+    assert model == "template"
+    assert summary_result
+    assert backend.calls == 0
+
+    # Nothing was journaled, the next run summarises the area with the LLM
+    monkeypatch.setattr(scheduler, "_deadline", RunDeadline())
+    _, _, model = module.all_prompts_together(dataset, "ACTH", "ACCA")
+    assert model != "template"
+    assert backend.calls > 0
+
+
+def test_finished_areas_are_resumed_after_the_deadline(workflow, dataset, monkeypatch):
+    module, backend = workflow
+    first = module.all_prompts_together(dataset, "ACTH", "ACAT")
+
+    monkeypatch.setattr(scheduler, "_deadline", RunDeadline(0))
+    calls = backend.calls
+    assert module.all_prompts_together(dataset, "ACTH", "ACAT") == first
+    assert backend.calls == calls
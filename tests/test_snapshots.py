@@ -0,0 +1,53 @@
+import pandas as pd
+import pytest
+
+from data_processing import DataHandler
+from query_memory_benchmark import synthetic_export
+
+pa = pytest.importorskip("pyarrow")
+
+QUERIES = [
+    ("drivers_per_product_area", ("ACTH",)),
+    ("drivers_per_product_area_regions", ("ACTH",)),
+    ("drivers_in_business_area_region_relative", ("SWIC",)),
+    ("drivers_in_product_area_region", ("ACTH", "ACAT")),
+    ("preprocess_orderintake_by_product_area", ("ACTH", "ACVI")),
+]
+
+
+@pytest.fixture
+def export(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGGREGATE_SNAPSHOTS", "1")
+    monkeypatch.setenv("AGGREGATE_SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+    path = tmp_path / "export.csv"
+    synthetic_export(300, 1800).to_csv(path, sep=';', index=False)
+    return str(path)
+
+
+def test_snapshot_answers_like_the_export(export):
+    computed = DataHandler(export)
+    assert computed._df is not None
+
+    allocated = pa.total_allocated_bytes()
+    snapshot = DataHandler(export)
+    # Memory-mapped: opening it neither parses the export nor copies the aggregates
+    assert snapshot._df is None
+    assert pa.total_allocated_bytes() == allocated
+
+    for name, args in QUERIES:
+        pd.testing.assert_frame_equal(getattr(snapshot, name)(*args), getattr(computed, name)(*args), check_exact=True)
+    assert snapshot._df is None
+    assert snapshot._aggregates is None
+    assert (snapshot.cper_total, snapshot.mper_total) == (computed.cper_total, computed.mper_total)
+
+
+def test_transform_data_rescales_snapshot_aggregates_and_rows(export, monkeypatch):
+    computed = DataHandler(export).copy()
+    snapshot = DataHandler(export).copy()
+    for handler in (computed, snapshot):
+        monkeypatch.setattr("numpy.random.uniform", lambda *args: 5.0)
+        handler.transform_data(['[Difference]'])
+
+    pd.testing.assert_frame_equal(snapshot.drivers_in_product_area_region("ACTH", "ACAT"),
+                                  computed.drivers_in_product_area_region("ACTH", "ACAT"))
+    pd.testing.assert_frame_equal(snapshot.df, computed.df)
@@ -0,0 +1,33 @@
+import sqlite3
+
+from structured_output import split_sentences
+from summary_store import SummaryStore
+
+
+def test_free_text_summary_is_split_on_sentences_not_lines():
+    summary = "Sales of [ACAT] rose in Europe,\nled by PL1. [ACCA] fell in Asia."
+    assert split_sentences(summary) == ["Sales of [ACAT] rose in Europe,\nled by PL1.", "[ACCA] fell in Asia."]
+
+
+def test_json_summary_is_split_on_lines():
+    summary = "[ACAT] rose in Europe, e.g. PL1\n[ACCA] fell in Asia."
+    assert split_sentences(summary, from_json=True) == ["[ACAT] rose in Europe, e.g. PL1", "[ACCA] fell in Asia."]
+
+
+def test_store_keeps_the_summary_format(tmp_path):
+    store = SummaryStore(str(tmp_path / "summaries.db"))
+    store.upsert("summary_writer", "netsales.csv", "2026-10", "ACTH", "ACAT", "net_sales", "gpt-4o",
+                 "[ACAT] rose.\n[ACCA] fell.", summary_format="json")
+    assert store.latest("summary_writer", "ACTH", "ACAT")["Summary Format"] == "json"
+
+
+def test_store_written_before_the_format_column_is_upgraded(tmp_path):
+    path = str(tmp_path / "summaries.db")
+    SummaryStore(path).conn.close()
+    with sqlite3.connect(path) as conn:
+        conn.execute("ALTER TABLE summaries DROP COLUMN summary_format")
+
+    store = SummaryStore(path)
+    store.upsert("summary_writer", "netsales.csv", "2026-10", "ACTH", "ACAT", "net_sales", "gpt-4o",
+                 "[ACAT] rose.", summary_format="text")
+    assert store.query(report="summary_writer")["Summary Format"].tolist() == ["text"]
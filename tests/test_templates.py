@@ -0,0 +1,45 @@
+import pandas as pd
+
+from templates import is_trivial, template_summary
+
+
+def area(rows):
+    return pd.DataFrame(rows, columns=["Product Line", "Region", "Total Difference"])
+
+
+def test_small_or_one_directional_areas_are_trivial():
+    assert is_trivial(area([("PL1", "Europe", 10), ("PL2", "Asia", -5)]))
+    assert is_trivial(area([("PL1", "Europe", 10), ("PL1", "Asia", 5), ("PL2", "Asia", 3), ("PL3", "Americas", 1)]))
+    assert is_trivial(area([("PL1", "Europe", 0)]))
+
+
+def test_mixed_areas_and_empty_frames_are_not_trivial():
+    assert not is_trivial(area([("PL1", "Europe", 10), ("PL1", "Asia", -5), ("PL2", "Asia", 3), ("PL3", "Americas", 1)]))
+    assert not is_trivial(area([]))
+    assert not is_trivial(pd.DataFrame({"Product Line": ["PL1"]}))
+
+
+def test_all_up_with_a_main_driver():
+    summary = template_summary(area([("PL1", "Europe", 100), ("PL2", "Asia", 20), ("PL2", "Americas", 10)]))
+    assert summary == "All product lines up. PL1 in Europe as main growth driver. PL2 up in all regions."
+
+
+def test_main_detractor_partly_offset():
+    summary = template_summary(area([("PL1", "Europe", -100), ("PL2", "Asia", 20), ("PL3", "Americas", -10)]))
+    assert summary == "PL1 in Europe as main detractor, partly offset by PL2 in Asia. PL3 decreasing in Americas."
+
+
+def test_no_main_driver_when_the_top_rows_are_close():
+    summary = template_summary(area([("PL1", "Europe", 100), ("PL2", "Asia", -90)]))
+    assert summary == "Increase from PL1 in Europe. PL2 decreasing in Asia."
+
+
+def test_every_product_line_once_and_at_most_four_sentences():
+    rows = [(f"PL{i}", "Europe", (-1) ** i * (10 - i)) for i in range(8)]
+    summary = template_summary(area(rows))
+    assert summary.count(". ") + 1 == 4
+    assert all(summary.count(f"PL{i} ") <= 1 for i in range(8))
+
+
+def test_area_without_changes():
+    assert template_summary(area([("PL1", "Europe", 0)])) == "No changes across product lines and regions."
@@ -0,0 +1,61 @@
+import pandas as pd
+
+from validation import extract_claims, fast_validate
+
+NAMES = {"HL01": "Heart Lung", "HL02": "Heart Lung Service", "VS01": "Vascular Stents"}
+
+
+def area():
+    return pd.DataFrame({
+        "Product Line": ["HL01", "HL01", "HL02", "VS01", "VS01"],
+        "Region": ["Europe", "US", "Europe", "Europe", "US"],
+        "Total Difference": [100.0, 40.0, -30.0, -20.0, 15.0],
+    })
+
+
+def claims(summary):
+    found, unparsed = extract_claims(summary, area(), NAMES)
+    return [(claim["Product Line"], claim["Region"], claim["Direction"]) for claim in found], unparsed
+
+
+def test_claims_are_read_per_clause_and_offset_reverses_the_direction():
+    assert claims("Heart Lung in Europe as main growth driver, partly offset by HL02 in Europe.") == (
+        [("HL01", "Europe", "up"), ("HL02", "Europe", "down")], [])
+
+
+def test_longest_mapped_name_wins_and_codes_match_as_well():
+    assert claims("Heart Lung Service decreasing in Europe. HL01 up in all regions.") == (
+        [("HL02", "Europe", "down"), ("HL01", "ALL", "up")], [])
+
+
+def test_short_region_labels_match_case_sensitively():
+    assert claims("VS01 rose in the US.") == ([("VS01", "US", "up")], [])
+    assert claims("VS01 rose for us.") == ([("VS01", None, "up")], [])
+
+
+def test_sentences_without_product_line_or_direction_are_unparsed():
+    assert claims("Sales were mixed in Europe.") == ([], ["Sales were mixed in Europe."])
+    assert claims("HL01 rose and fell in Europe.") == ([], ["HL01 rose and fell in Europe."])
+
+
+def test_summary_matching_the_data_passes_without_the_llm():
+    result = fast_validate("HL01 up in all regions. VS01 decreasing in Europe.", area(), NAMES)
+    assert result["passed"] and not result["needs_llm"]
+    assert "2 claims checked" in result["report"]
+
+
+def test_wrong_direction_escalates_to_the_llm():
+    result = fast_validate("VS01 up in all regions.", area(), NAMES)
+    assert result["needs_llm"]
+    assert result["report"] == ("Validation Warning: VS01 across all regions is reported as an increase, "
+                                "but data shows mixed directions.")
+
+
+def test_structured_sentences_are_checked_from_their_fields():
+    sentences = [{"text": "Heart Lung up in all regions.", "product_lines": ["Heart Lung"], "regions": ["all"],
+                  "direction": "up"},
+                 {"text": "HL02 down in Asia.", "product_lines": ["HL02"], "regions": ["Asia"], "direction": "down"}]
+    result = fast_validate("", area(), NAMES, sentences=sentences)
+    assert [(claim["Product Line"], claim["Region"]) for claim in result["claims"]] == [("HL01", "ALL")]
+    assert result["unparsed"] == ["HL02 down in Asia."]
+    assert result["needs_llm"]
@@ -0,0 +1,83 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import job_journal
+import llm_backends
+import netsales_workflow
+from data_processing import DataHandler
+from job_journal import JobJournal
+from llm_backends import FakeBackend, ReliableBackend
+from query_memory_benchmark import synthetic_export
+from semantic_cache import SemanticCache
+
+
+@pytest.fixture
+def workflow(tmp_path, monkeypatch):
+    """netsales_workflow with its own journal, semantic cache and a counting fake backend."""
+    backend = FakeBackend()
+    monkeypatch.setitem(llm_backends._backends, "ollama", ReliableBackend(backend))
+    monkeypatch.setattr(netsales_workflow, "template_fast_path", False)
+    monkeypatch.setitem(job_journal._journals, "netsales_workflow",
+                        JobJournal("netsales_workflow", str(tmp_path / "journal.jsonl")))
+    cache = SemanticCache(str(tmp_path / "cache.db"))
+    monkeypatch.setattr(netsales_workflow, "get_cache", lambda: cache)
+
+    def restart():
+        """The journal as a new process reads it."""
+        job_journal._journals["netsales_workflow"] = JobJournal("netsales_workflow", str(tmp_path / "journal.jsonl"))
+
+    return netsales_workflow, backend, cache, restart
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    return DataHandler.from_frame(synthetic_export(400, 2400), source_fingerprint="export")
+
+
+def test_rerun_of_a_finished_area_makes_no_llm_calls(workflow, dataset):
+    module, backend, _, restart = workflow
+    first = module.all_prompts_together(dataset, "ACTH", "ACAT")
+    assert backend.calls > 0
+
+    restart()
+    calls = backend.calls
+    assert module.all_prompts_together(dataset, "ACTH", "ACAT") == first
+    assert backend.calls == calls
+
+
+def test_rerun_of_a_semantic_cache_hit_makes_no_llm_calls(workflow, dataset):
+    module, backend, cache, restart = workflow
+    data = dataset.preprocess_orderintake_by_product_area("ACTH", "ACCA")
+    cache.put("netsales_workflow", "net_sales", data, "[ACCA] up in all regions.", "llama3.1:8b")
+
+    first = module.all_prompts_together(dataset, "ACTH", "ACCA")
+    assert first[0] == "[ACCA] up in all regions."
+
+    restart()
+    calls = backend.calls
+    assert module.all_prompts_together(dataset, "ACTH", "ACCA") == first
+    assert backend.calls == calls
+
+
+def test_summary_journaled_as_plain_text_is_resumed(workflow, dataset):
+    module, _, _, restart = workflow
+    # Journals written before the model was stored hold the summary text alone
+    job_journal.get_journal("netsales_workflow").record("export", "ACTH", "ACAT", "summary", "[ACAT] up in all regions.")
+
+    restart()
+    summary_result, _, model = module.all_prompts_together(dataset, "ACTH", "ACAT")
+    assert summary_result == "[ACAT] up in all regions."
+    assert model is None
+
+
+def test_importing_a_workflow_leaves_the_journal_alone(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    JobJournal("netsales_workflow", str(path)).record("export", "ACTH", "ACAT", "summary", "up")
+
+    env = {**os.environ, "JOB_JOURNAL_PATH": str(path), "RESUME": "0"}
+    subprocess.run([sys.executable, "-c", "import netsales_workflow"], env=env, check=True,
+                   cwd=os.path.dirname(netsales_workflow.__file__))
+    assert JobJournal("netsales_workflow", str(path)).done("export", "ACTH", "ACAT", "summary")
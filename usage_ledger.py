@@ -0,0 +1,206 @@
+import csv
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+
+# USD per 1K tokens. Local Ollama models cost nothing per token.
+DEFAULT_PRICE_TABLE = {
+    "gpt-4o": {"input_per_1k": 0.005, "output_per_1k": 0.015},
+    "gpt-4o-mini": {"input_per_1k": 0.00015, "output_per_1k": 0.0006},
+}
+
+LEDGER_COLUMNS = [
+    "Run", "Timestamp", "Backend", "Model", "Stage", "Business Area", "Product Area",
+    "Prompt Tokens", "Completion Tokens", "Latency s", "Load s", "Time To First Token s", "Cost ($)",
+    "Reasoning Tokens", "Token Budget", "Stopped At Budget", "Host",
+]
+
+
+def load_price_table(path=None):
+    """Default prices, overridden per model by a JSON file (LLM_PRICE_TABLE)."""
+    prices = {model: dict(price) for model, price in DEFAULT_PRICE_TABLE.items()}
+    path = path or os.getenv("LLM_PRICE_TABLE")
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            prices.update(json.load(f))
+    return prices
+
+
+class UsageLedger:
+    """
+    Records backend, model, stage, area, tokens, latency and cost of every LLM call.
+
+    Rows are appended to a CSV file as they are recorded so the ledger persists
+    across runs, and every row carries the id of the run that produced it.
+    """
+
+    def __init__(self, path="usage_ledger.csv", price_table=None, run_id=None):
+        self.path = path
+        self.price_table = price_table if price_table is not None else load_price_table()
+        self.run_id = run_id or f"{datetime.now():%Y%m%dT%H%M%S}-{os.getpid()}"
+        # Areas are set per thread so reports running side by side keep their own
+        self._area = threading.local()
+        self._lock = threading.Lock()
+        # Called with every recorded row, e.g. by the model router
+        self.listeners = []
+
+    @property
+    def business_area(self):
+        return getattr(self._area, "business_area", None)
+
+    @property
+    def product_area(self):
+        return getattr(self._area, "product_area", None)
+
+    def set_area(self, business_area, product_area=None):
+        """Area that the following calls of the current thread belong to."""
+        self._area.business_area = business_area
+        self._area.product_area = product_area
+
+    def cost(self, model, prompt_tokens, completion_tokens):
+        price = self.price_table.get(model)
+        if price is None:
+            return 0.0
+        return (prompt_tokens / 1000 * price["input_per_1k"]) + (completion_tokens / 1000 * price["output_per_1k"])
+
+    def record(self, backend, model, stage, prompt_tokens, completion_tokens, latency,
+               time_to_first_token=None, business_area=None, product_area=None, load_time=None,
+               reasoning_tokens=None, token_budget=None, stopped_at_budget=None, host=None):
+        prompt_tokens = prompt_tokens or 0
+        completion_tokens = completion_tokens or 0
+        row = {
+            "Run": self.run_id,
+            "Timestamp": datetime.now().isoformat(timespec="seconds"),
+            "Backend": backend,
+            "Model": model,
+            "Stage": stage,
+            "Business Area": business_area or self.business_area or "",
+            "Product Area": product_area or self.product_area or "",
+            "Prompt Tokens": prompt_tokens,
+            "Completion Tokens": completion_tokens,
+            "Latency s": round(latency, 4),
+            "Load s": round(load_time, 4) if load_time is not None else "",
+            "Time To First Token s": round(time_to_first_token, 4) if time_to_first_token is not None else "",
+            "Cost ($)": round(self.cost(model, prompt_tokens, completion_tokens), 6),
+            "Reasoning Tokens": reasoning_tokens or 0,
+            "Token Budget": token_budget if token_budget is not None else "",
+            "Stopped At Budget": int(bool(stopped_at_budget)),
+            "Host": host or "",
+        }
+
+        with self._lock:
+            new_file = not os.path.exists(self.path)
+            with open(self.path, "a", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=LEDGER_COLUMNS, delimiter=';')
+                if new_file:
+                    writer.writeheader()
+                writer.writerow(row)
+
+        for listener in self.listeners:
+            listener(row)
+
+        return row
+
+    def record_metrics(self, backend, model, stage, metrics):
+        """Records a call from the metrics dict returned by the streaming helpers."""
+        return self.record(backend, model, stage, metrics.get("prompt_tokens"), metrics.get("completion_tokens"),
+                           metrics["total_latency"], metrics.get("time_to_first_token"),
+                           load_time=metrics.get("load_time"), reasoning_tokens=metrics.get("reasoning_tokens"),
+                           token_budget=metrics.get("token_budget"),
+                           stopped_at_budget=metrics.get("done_reason") == "length", host=metrics.get("host"))
+
+    def load(self):
+        import pandas as pd
+
+        if not os.path.exists(self.path):
+            return pd.DataFrame(columns=LEDGER_COLUMNS)
+        return pd.read_csv(self.path, sep=';')
+
+    def summarise(self, by=("Run", "Stage"), current_run_only=False):
+        """Calls, tokens, latency and cost grouped by run and stage (or any other ledger columns)."""
+        df = self.load()
+        if current_run_only:
+            df = df[df["Run"] == self.run_id]
+
+        aggregations = {"Calls": ("Model", "size")}
+        for col in ["Prompt Tokens", "Completion Tokens", "Reasoning Tokens", "Stopped At Budget", "Latency s",
+                    "Load s", "Cost ($)"]:
+            if col in df.columns:
+                aggregations[col] = (col, "sum")
+
+        summary = df.groupby(list(by)).agg(**aggregations).reset_index()
+        total_latency = summary["Latency s"].sum()
+        summary["Share of Time %"] = (summary["Latency s"] / total_latency * 100).round(1) if total_latency else 0.0
+        return summary
+
+    def budget_savings(self):
+        """
+        Output tokens saved per model and stage by the generation budgets: the mean completion
+        tokens of calls without a budget minus the mean with one, times the calls with one.
+        Reasoning tokens are the <think> traces generated and kept out of the reports.
+        """
+        import pandas as pd
+
+        df = self.load()
+        if "Token Budget" not in df.columns:
+            return pd.DataFrame()
+        df = df[df["Stage"] != "warm_up"]
+
+        rows = []
+        for (model, stage), group in df.groupby(["Model", "Stage"]):
+            with_budget = group[group["Token Budget"].notna()]
+            without_budget = group[group["Token Budget"].isna()]
+            if with_budget.empty:
+                continue
+            saved = None
+            if not without_budget.empty:
+                saved = (without_budget["Completion Tokens"].mean() - with_budget["Completion Tokens"].mean()) \
+                    * len(with_budget)
+            rows.append({
+                "Model": model,
+                "Stage": stage,
+                "Calls": len(with_budget),
+                "Mean Tokens Without Budget": without_budget["Completion Tokens"].mean(),
+                "Mean Tokens With Budget": with_budget["Completion Tokens"].mean(),
+                "Tokens Saved": saved,
+                "Reasoning Tokens": with_budget["Reasoning Tokens"].sum(),
+                "Stopped At Budget": int(with_budget["Stopped At Budget"].sum()),
+            })
+        return pd.DataFrame(rows)
+
+    def log_run_summary(self):
+        summary = self.summarise(by=("Stage",), current_run_only=True)
+        if not summary.empty:
+            logging.info('----- Usage for run %s -----\n%s', self.run_id, summary.to_string(index=False))
+        savings = self.budget_savings()
+        if not savings.empty:
+            logging.info('----- Generation budgets -----\n%s', savings.round(1).to_string(index=False))
+        return summary
+
+
+_ledger = None
+
+
+def get_ledger():
+    """Ledger shared by every LLM call of the process (USAGE_LEDGER_PATH, default usage_ledger.csv)."""
+    global _ledger
+    if _ledger is None:
+        _ledger = UsageLedger(os.getenv("USAGE_LEDGER_PATH", "usage_ledger.csv"))
+    return _ledger
+
+
+if __name__ == "__main__":
+    import pandas as pd
+
+    ledger = get_ledger()
+    pd.set_option("display.width", 200)
+    print(ledger.summarise(by=("Run", "Stage")).to_string(index=False))
+    print()
+    savings = ledger.budget_savings()
+    if not savings.empty:
+        print(savings.round(1).to_string(index=False))
+        print()
+    print(ledger.summarise(by=("Stage",)).to_string(index=False))
@@ -0,0 +1,217 @@
+import re
+
+from mapping import mapping
+from structured_output import MAX_SENTENCES
+
+
+UP_WORDS = [
+    "up", "increase", "increased", "increases", "increasing", "growth", "grew", "grow", "growing",
+    "rise", "rising", "rose", "higher", "gain", "gains", "improved", "improvement", "positive",
+]
+DOWN_WORDS = [
+    "down", "decrease", "decreased", "decreases", "decreasing", "decline", "declined", "declines",
+    "declining", "drop", "dropped", "lower", "fall", "falling", "fell", "detractor", "negative",
+    "weaker", "reduction",
+]
+
+UP_PATTERN = re.compile(r'\b(' + '|'.join(UP_WORDS) + r')\b', re.IGNORECASE)
+DOWN_PATTERN = re.compile(r'\b(' + '|'.join(DOWN_WORDS) + r')\b', re.IGNORECASE)
+ALL_REGIONS_PATTERN = re.compile(r'\b(all|every|each)\s+regions?\b', re.IGNORECASE)
+ALL_PRODUCT_LINES_PATTERN = re.compile(r'\ball\s+product\s*lines\b', re.IGNORECASE)
+OFFSET_PATTERN = re.compile(r'\boffset\b', re.IGNORECASE)
+CLAUSE_SPLIT_PATTERN = re.compile(r',|;|\bwhile\b|\bwhereas\b|\bbut\b', re.IGNORECASE)
+
+
+def _name_pattern(names):
+    """Whole-name pattern, longest names first so 'CC Service' wins over 'Service'."""
+    names = sorted(set(names), key=len, reverse=True)
+    return re.compile(r'(?<!\w)(' + '|'.join(re.escape(name) for name in names) + r')(?!\w)', re.IGNORECASE)
+
+
+def _product_line_names(product_lines, dictionary_mapping=mapping):
+    """Maps every way a product line can be written in a summary (code or mapped name) to its value in the data."""
+    names = {}
+    for product_line in product_lines:
+        product_line = str(product_line)
+        names[product_line.lower()] = product_line
+        mapped = dictionary_mapping.get(product_line)
+        if mapped:
+            names[mapped.strip(' ,').lower()] = product_line
+    return names
+
+
+def _find_regions(clause, regions):
+    found = []
+    for region in regions:
+        # Short upper-case labels like "US" must match case-sensitively, otherwise "us" in prose matches
+        flags = 0 if len(region) <= 3 and region.isupper() else re.IGNORECASE
+        if re.search(r'(?<!\w)' + re.escape(region) + r'(?!\w)', clause, flags):
+            found.append(region)
+    return found
+
+
+def _direction(clause):
+    up = bool(UP_PATTERN.search(clause))
+    down = bool(DOWN_PATTERN.search(clause))
+    if up and not down:
+        return "up"
+    if down and not up:
+        return "down"
+    if up and down:
+        return "ambiguous"
+    return None
+
+
+def extract_claims(summary, raw_data, dictionary_mapping=mapping):
+    """
+    Extracts (product line, region, direction) claims from a summary.
+
+    `region` is None for claims about a product line as a whole and "ALL" for
+    "in all regions". Returns the claims and the sentences that could not be parsed.
+    """
+    product_lines = raw_data["Product Line"].astype(str).unique()
+    regions = [str(region) for region in raw_data["Region"].unique()]
+    names = _product_line_names(product_lines, dictionary_mapping)
+    pl_pattern = _name_pattern(names.keys())
+
+    claims = []
+    unparsed = []
+
+    for sentence in re.split(r'(?<=[.!?])\s+|\n+', summary.strip()):
+        sentence = sentence.strip(" -*•\t")
+        if not sentence:
+            continue
+
+        previous_pls, previous_direction = [], None
+        for clause in CLAUSE_SPLIT_PATTERN.split(sentence):
+            pls = list(dict.fromkeys(names[m.lower()] for m in pl_pattern.findall(clause)))
+            if ALL_PRODUCT_LINES_PATTERN.search(clause):
+                pls = list(product_lines)
+            clause_regions = ["ALL"] if ALL_REGIONS_PATTERN.search(clause) else _find_regions(clause, regions)
+            direction = _direction(clause)
+
+            if not pls and not clause_regions and direction is None:
+                continue  # filler such as "mainly" or linking words
+
+            if direction is None and OFFSET_PATTERN.search(clause) and previous_direction in ("up", "down"):
+                # "... partly offset by [Product Line] in [Region]" states the opposite direction
+                direction = "down" if previous_direction == "up" else "up"
+
+            pls = pls or previous_pls
+            direction = direction or previous_direction
+
+            if not pls or direction in (None, "ambiguous"):
+                unparsed.append(sentence)
+                break
+
+            for product_line in pls:
+                for region in clause_regions or [None]:
+                    claims.append({"Product Line": product_line, "Region": region,
+                                   "Direction": direction, "Sentence": sentence})
+
+            previous_pls, previous_direction = pls, direction
+
+    return claims, unparsed
+
+
+def structured_claims(sentences, raw_data, dictionary_mapping=mapping):
+    """
+    Claims of a summary written as JSON (see structured_output), read from the fields of
+    every sentence instead of its text. Sentences naming a product line or region that is
+    not in the data are returned as unparsed.
+    """
+    names = _product_line_names(raw_data["Product Line"].astype(str).unique(), dictionary_mapping)
+    regions = {str(region).lower(): str(region) for region in raw_data["Region"].unique()}
+
+    claims = []
+    unparsed = []
+    for sentence in sentences:
+        pls = [names.get(pl.strip().lower()) for pl in sentence["product_lines"]]
+        if ALL_PRODUCT_LINES_PATTERN.search(sentence["text"]) and not sentence["product_lines"]:
+            pls = list(names.values())
+        sentence_regions = [
+            "ALL" if region.strip().lower() in ("all", "all regions") else regions.get(region.strip().lower())
+            for region in sentence["regions"]
+        ]
+        if not pls or None in pls or None in sentence_regions or sentence["direction"] not in ("up", "down"):
+            unparsed.append(sentence["text"])
+            continue
+
+        for product_line in dict.fromkeys(pls):
+            for region in sentence_regions or [None]:
+                claims.append({"Product Line": product_line, "Region": region,
+                               "Direction": sentence["direction"], "Sentence": sentence["text"]})
+
+    return claims, unparsed
+
+
+def _check_claim(claim, raw_data):
+    """Returns None when the claim holds, otherwise the direction(s) the data shows."""
+    rows = raw_data[raw_data["Product Line"].astype(str) == claim["Product Line"]]
+    if claim["Region"] not in (None, "ALL"):
+        rows = rows[rows["Region"].astype(str) == claim["Region"]]
+    if rows.empty:
+        return "no data"
+
+    if claim["Region"] == "ALL":
+        signs = rows["Total Difference"]
+        holds = (signs > 0).all() if claim["Direction"] == "up" else (signs < 0).all()
+        return None if holds else "mixed directions"
+
+    total = rows["Total Difference"].sum()
+    actual = "up" if total > 0 else "down" if total < 0 else "flat"
+    return None if actual == claim["Direction"] else actual
+
+
+def fast_validate(summary, raw_data, dictionary_mapping=mapping, sentences=None):
+    """
+    Deterministic validation of a summary against the DataHandler frame.
+
+    Every (product line, region, direction) claim is checked against the sign of
+    'Total Difference'. `needs_llm` is set when a sentence could not be parsed or a
+    claim does not match, in which case the LLM validator should be asked instead.
+    With the `sentences` of a JSON summary the claims come from their fields, and a
+    summary over the sentence limit is reported as well.
+    """
+    if raw_data.empty or not {"Product Line", "Region", "Total Difference"} <= set(raw_data.columns):
+        return {"passed": False, "needs_llm": True, "claims": [], "mismatches": [], "unparsed": [],
+                "report": "Validation Skipped: no data to check against."}
+
+    if sentences is not None:
+        claims, unparsed = structured_claims(sentences, raw_data, dictionary_mapping)
+    else:
+        claims, unparsed = extract_claims(summary, raw_data, dictionary_mapping)
+
+    mismatches = []
+    for claim in claims:
+        actual = _check_claim(claim, raw_data)
+        if actual is not None:
+            mismatches.append({**claim, "Actual": actual})
+
+    lines = []
+    for mismatch in mismatches:
+        where = "across all regions" if mismatch["Region"] == "ALL" else (
+            f"in {mismatch['Region']}" if mismatch["Region"] else "overall")
+        reported = "an increase" if mismatch["Direction"] == "up" else "a decrease"
+        lines.append(f"Validation Warning: {mismatch['Product Line']} {where} is reported as {reported}, "
+                     f"but data shows {mismatch['Actual']}.")
+    for sentence in unparsed:
+        lines.append(f"Validation Unparsed: \"{sentence}\"")
+    if sentences is not None and len(sentences) > MAX_SENTENCES:
+        # The LLM validator cannot shorten the summary, so this alone does not escalate
+        lines.append(f"Validation Warning: {len(sentences)} sentences, the limit is {MAX_SENTENCES}.")
+
+    passed = not mismatches and not unparsed and bool(claims)
+    if passed:
+        lines.append(f"Validation Passed: No inconsistencies ({len(claims)} claims checked).")
+    elif not claims and not unparsed:
+        lines.append("Validation Unparsed: no claims found in the summary.")
+
+    return {
+        "passed": passed,
+        "needs_llm": not passed,
+        "claims": claims,
+        "mismatches": mismatches,
+        "unparsed": unparsed,
+        "report": "\n".join(lines),
+    }